@@ -1,12 +1,610 @@
+from contextlib import contextmanager
+
 import frappe
-from frappe.utils.nestedset import get_descendants_of
+
+from spp import (
+    audit_export, bom_explosion, employee_directory, idempotency, instrumentation, kpi, lot_journal,
+    lot_validation, rejection_rollup, stock_adjustments, traceability, uom, valuation, workstations,
+)
+
+
+PROCESS_LOT_JOB_TTL = 24 * 60 * 60
 
 
 @frappe.whitelist()
 def process_lot(data):
+    """
+    Process one lot: sub lot, resource tags, inspection entry and Sub Lot
+    Process record. The response carries the names of the created documents;
+    set `fullResponse` in the payload to also get the full Sub Lot Process
+    document.
+    """
     if isinstance(data, str):
         data = frappe.parse_json(data)
-    
+
+    # Scanner retries: hand back the stored result before doing any work
+    idempotency_key = idempotency.get_key(data)
+    if idempotency_key:
+        claimed, stored_result = idempotency.claim(idempotency_key)
+        if not claimed:
+            return stored_result
+
+    try:
+        # Async mode: validate the payload, queue the work and return right away.
+        # The result is pushed through the `spp_process_lot` realtime event and
+        # can be polled with `get_process_lot_status`.
+        if data.get("async"):
+            result = _enqueue_process_lot(data, idempotency_key)
+        else:
+            result = _run_process_lot(data)
+    except Exception:
+        idempotency.release(idempotency_key)
+        raise
+
+    idempotency.complete(idempotency_key, result)
+    return result
+
+@frappe.whitelist()
+def get_process_lot_status(job_id):
+    """
+    Status of a `process_lot` call queued in async mode.
+
+    Args:
+        job_id (str): The job id returned when the lot was queued
+
+    Returns:
+        dict: job_id, state (queued / running / finished) and, once finished,
+            the same result `process_lot` returns synchronously
+    """
+    job = frappe.cache.get_value(f"spp:process_lot_job:{job_id}")
+
+    if not job or (job.get("user") != frappe.session.user and "System Manager" not in frappe.get_roles()):
+        return {"job_id": job_id, "state": "unknown", "message": "No such job, or its result has expired"}
+
+    return job
+
+def _enqueue_process_lot(data, idempotency_key=None):
+    """
+    Queue a `process_lot` payload on a background worker.
+
+    Returns:
+        dict: status "queued" with the job id, or status "failed" if the
+            payload is obviously incomplete
+    """
+    error = _validate_lot_payload(data)
+    if error:
+        return {"status": "failed", "message": error}
+
+    job_id = frappe.generate_hash(length=16)
+    _set_process_lot_job(job_id, "queued")
+
+    frappe.enqueue(
+        "spp.api._process_lot_job",
+        queue=frappe.conf.get("spp_process_lot_queue") or "default",
+        timeout=600,
+        enqueue_after_commit=True,
+        lot_job_id=job_id,
+        data=data,
+        idempotency_key=idempotency_key,
+    )
+
+    return {
+        "status": "queued",
+        "message": f"Lot {(data.get('batchInfo') or {}).get('sppBatchId')} queued for processing",
+        "job_id": job_id
+    }
+
+def _process_lot_job(lot_job_id, data, idempotency_key=None):
+    """
+    Background job for async `process_lot`: run the pipeline, store the result
+    and push it to the user who queued it.
+
+    `lot_job_id` is our own id rather than the RQ job id, which
+    `frappe.enqueue` reserves for itself.
+    """
+    job_id = lot_job_id
+    _set_process_lot_job(job_id, "running")
+
+    try:
+        result = _run_process_lot(data)
+    except Exception as e:
+        # Drop the lot's partial writes, which the job would otherwise commit
+        frappe.db.rollback()
+        lot_journal.error(
+            "Process Lot Error - Background Job",
+            f"Error in process_lot job {job_id}: {str(e)}\n{frappe.get_traceback()}",
+            reference=(data.get("batchInfo") or {}).get("sppBatchId")
+        )
+        result = {"status": "failed", "message": f"Error processing lot: {str(e)}"}
+        failed = True
+    else:
+        failed = False
+
+    idempotency.complete(idempotency_key, result)
+
+    # Report the job finished only once its documents are visible, and failed
+    # if the job's transaction rolls back instead
+    frappe.db.after_commit.add(lambda: _finish_process_lot_job(job_id, result))
+    frappe.db.after_rollback.add(
+        lambda: _finish_process_lot_job(job_id, {"status": "failed", "message": "Lot processing was rolled back"})
+    )
+
+    if failed:
+        # Only the failure is left in the transaction: record it on its own
+        frappe.db.commit()
+
+def _finish_process_lot_job(job_id, result):
+    job = _set_process_lot_job(job_id, "finished", result)
+    frappe.publish_realtime("spp_process_lot", job, user=frappe.session.user)
+
+def _set_process_lot_job(job_id, state, result=None):
+    job = {"job_id": job_id, "state": state, "user": frappe.session.user, "result": result}
+    frappe.cache.set_value(f"spp:process_lot_job:{job_id}", job, expires_in_sec=PROCESS_LOT_JOB_TTL)
+    return job
+
+def _validate_lot_payload(data):
+    """
+    Cheap structural checks done before a payload is queued, so obviously
+    broken payloads are rejected while the station is still waiting.
+
+    Returns:
+        str: Error message, or None if the payload looks complete
+    """
+    if not (data.get("batchInfo") or {}).get("sppBatchId"):
+        return "Missing batch ID"
+
+    inspection_info = data.get("inspectionInfo") or {}
+    try:
+        float(inspection_info.get("inspectionQuantity", "0"))
+    except (TypeError, ValueError):
+        return f"Invalid inspection quantity: {inspection_info.get('inspectionQuantity')}"
+
+    operations = data.get("operationDetails") or []
+    if not isinstance(operations, list) or not operations:
+        return "At least one operation detail is required"
+
+    return None
+
+def _run_process_lot(data):
+    """
+    Run `process_lot` for one payload with stage timings. Journal events are
+    written by `lot_journal.flush_pending` once the request or job is over.
+    """
+    with instrumentation.span("process_lot", reference=(data.get("batchInfo") or {}).get("sppBatchId")) as timings:
+        result = _process_lot(data)
+
+    # Stage timings are only returned when explicitly asked for
+    if data.get("debug"):
+        result["timings"] = timings.as_dict()
+
+    return result
+
+@frappe.whitelist()
+def process_lots(lots, debug=False):
+    """
+    Process many lots in one call.
+
+    Each entry is a `process_lot` payload. The KG conversion factors of the
+    items in the payloads, the workstations and the employee names are
+    fetched for the whole batch up front, and every lot runs inside its own
+    savepoint, so a lot that fails is rolled back without affecting the
+    others.
+
+    Args:
+        lots (list): List of `process_lot` payloads
+        debug (bool): Include the stage timings of each lot in its result
+
+    Returns:
+        dict: Batch summary with one `process_lot` result per lot, in order
+    """
+    if isinstance(lots, str):
+        lots = frappe.parse_json(lots)
+
+    if not isinstance(lots, list):
+        frappe.throw("lots must be a list of process_lot payloads")
+
+    lots = [frappe.parse_json(data) if isinstance(data, str) else data for data in lots]
+
+    # Resolve every item factor, inspector, operator and workstation of the batch up front
+    uom.get_kg_conversion_factors({(data.get("batchInfo") or {}).get("itemCode") for data in lots})
+    employee_directory.get_employee_names(
+        [(data.get("inspectionInfo") or {}).get("inspectorCode") for data in lots]
+        + [op.get("employeeCode") for data in lots for op in data.get("operationDetails") or []]
+    )
+    workstations.get_workstations(op.get("operation") for data in lots for op in data.get("operationDetails") or [])
+
+    results = []
+    counts = {"success": 0, "partial": 0, "failed": 0}
+
+    # A single root span for the batch, so the timings of rolled back lots are
+    # stored after the savepoints below have been resolved
+    with instrumentation.span("process_lots"):
+        for idx, data in enumerate(lots):
+            save_point = f"spp_process_lot_{idx}"
+            batch_id = (data.get("batchInfo") or {}).get("sppBatchId")
+
+            idempotency_key = data.get("idempotencyKey")
+            if idempotency_key:
+                claimed, stored_result = idempotency.claim(idempotency_key)
+                if not claimed:
+                    counts[stored_result.get("status")] = counts.get(stored_result.get("status"), 0) + 1
+                    results.append({"sppBatchId": batch_id, **stored_result})
+                    continue
+
+            frappe.db.savepoint(save_point)
+
+            try:
+                with _isolated_response(), instrumentation.span("process_lot", reference=batch_id) as timings:
+                    result = _process_lot(data)
+            except Exception as e:
+                result = {
+                    "status": "failed",
+                    "message": f"Error processing lot: {str(e)}",
+                }
+                traceback = frappe.get_traceback()
+            else:
+                traceback = None
+
+            if result.get("status") == "failed":
+                # Discard whatever the failed lot wrote before giving up
+                frappe.db.rollback(save_point=save_point)
+                lot_journal.error(
+                    "Process Lots - Lot Rolled Back",
+                    f"Lot {batch_id} rolled back in batch: {result.get('message')}\n{traceback or ''}",
+                    reference=batch_id
+                )
+            else:
+                frappe.db.release_savepoint(save_point)
+
+            idempotency.complete(idempotency_key, result)
+
+            if frappe.utils.cint(debug):
+                result["timings"] = timings.as_dict()
+
+            counts[result.get("status")] = counts.get(result.get("status"), 0) + 1
+            results.append({"sppBatchId": batch_id, **result})
+
+    return {
+        "status": "success" if counts["success"] == len(results) else "partial",
+        "message": f"Processed {len(results)} lots: {counts['success']} succeeded, {counts['partial']} partial, {counts['failed']} failed",
+        "counts": counts,
+        "results": results
+    }
+
+@frappe.whitelist()
+def scan_batch(batch_id):
+    """
+    Resolve a scanned SPP batch number for the batch scan screen.
+
+    Looks up the finished product row of the batch and its largest stock
+    balance in one joined query. Results are cached for
+    `spp_scan_cache_ttl` seconds (site config, default 30) so a re-scan at
+    the station does not hit the database again; processing a lot of the
+    batch drops its entry (see `clear_scan_cache`).
+
+    Args:
+        batch_id (str): The scanned SPP batch number
+
+    Returns:
+        dict: item_code, batch_no, warehouse and qty, or {} if the batch is unknown
+    """
+    frappe.has_permission("Stock Entry", "read", throw=True)
+
+    if not batch_id:
+        return {}
+
+    cache_key = _get_scan_cache_key(batch_id)
+    cached = frappe.cache.get_value(cache_key)
+    if cached:
+        return cached
+
+    rows = frappe.db.sql(
+        """
+        SELECT sed.item_code, sed.batch_no, ibsb.warehouse, ibsb.qty
+        FROM `tabStock Entry Detail` sed
+        LEFT JOIN `tabItem Batch Stock Balance` ibsb
+            ON ibsb.item_code = sed.item_code AND ibsb.batch_no = sed.batch_no
+        WHERE sed.spp_batch_number = %(batch_id)s
+            AND sed.parenttype = 'Stock Entry'
+            AND sed.item_group = 'Products'
+            AND sed.is_finished_item = 1
+        ORDER BY sed.modified DESC, ibsb.qty DESC
+        LIMIT 1
+        """,
+        {"batch_id": batch_id},
+        as_dict=True,
+    )
+
+    if not rows:
+        # Unknown batches are not cached, the lot may be booked any moment
+        return {}
+
+    result = {
+        "item_code": rows[0].item_code or "",
+        "batch_no": rows[0].batch_no or "",
+        "warehouse": rows[0].warehouse or "",
+        "qty": frappe.utils.flt(rows[0].qty),
+    }
+    frappe.cache.set_value(
+        cache_key, result, expires_in_sec=frappe.utils.cint(frappe.conf.get("spp_scan_cache_ttl")) or 30
+    )
+
+    return result
+
+def clear_scan_cache(batch_id):
+    """
+    Drop the cached `scan_batch` result of a batch whose stock is changing,
+    straight away and once more after commit so a scan in between cannot put
+    the old balance back.
+    """
+    if not batch_id:
+        return
+
+    cache_key = _get_scan_cache_key(batch_id)
+    frappe.cache.delete_value(cache_key)
+    frappe.db.after_commit.add(lambda: frappe.cache.delete_value(cache_key))
+
+def _get_scan_cache_key(batch_id):
+    return f"spp:scan_batch:{batch_id}"
+
+@frappe.whitelist()
+def create_lot_resource_tagging(data):
+    """
+    Create and submit the Lot Resource Tagging of one operator/operation pair.
+
+    Args:
+        data (dict): Sub lot fields as for `create_lot_resource_taggings`,
+            plus `operation_type` and `operator_id`
+
+    Returns:
+        dict: `success`, with the document `name` or an `error`
+    """
+    data = frappe._dict(frappe.parse_json(data))
+    data.rows = [{
+        "operation_type": data.operation_type,
+        "operator_id": data.operator_id or data.scan_operator,
+    }]
+
+    result = create_lot_resource_taggings(data)
+    if not result["results"]:
+        return {"success": False, "error": result["message"]}
+
+    return result["results"][0]
+
+@frappe.whitelist()
+def create_lot_resource_taggings(data):
+    """
+    Create and submit Lot Resource Tagging documents for every operator/operation
+    pair of a sub lot in one request. Fields shared by the pairs are resolved
+    once; each pair is created under its own savepoint so one failing pair does
+    not undo the others.
+
+    Args:
+        data (dict): `scan_lot_no` (sub lot number), `batch_no`, `bom_no`,
+            `from_warehouse`, `production_item`, `available_qty`, `operations`
+            (comma separated BOM operations), `spp_batch_number`, optional
+            `qty_after_rejection_nos`, `job_card`, `moulding_lot_number`, and
+            `rows`: a list of `{operation_type, operator_id}`
+
+    Returns:
+        dict: status, message, `results` with one
+            `{success, operation, employee, name | error}` per row
+    """
+    data = frappe._dict(frappe.parse_json(data))
+    frappe.has_permission("Lot Resource Tagging", "create", throw=True)
+
+    sub_lot_no = data.scan_lot_no
+    rows = frappe.parse_json(data.rows) if isinstance(data.rows, str) else data.rows or []
+    if not sub_lot_no or not rows:
+        return {"status": "failed", "message": "scan_lot_no and rows are required", "results": []}
+
+    tag_fields = _get_resource_tag_fields(sub_lot_no, {
+        "batch_no": data.batch_no,
+        "bom_no": data.bom_no,
+        "from_warehouse": data.from_warehouse,
+        "production_item": data.production_item or data.product_ref,
+        "qty_from_item_batch": data.available_qty,
+        "spp_batch_number": data.spp_batch_number,
+        "bom_operations": [{"operation": op.strip()} for op in (data.operations or "").split(",") if op.strip()],
+    })
+    if data.posting_date:
+        tag_fields["posting_date"] = data.posting_date
+    for fieldname in ("qty_after_rejection_nos", "job_card", "moulding_lot_number"):
+        if data.get(fieldname) not in (None, ""):
+            tag_fields[fieldname] = data.get(fieldname)
+
+    results = []
+    with instrumentation.span("create_lot_resource_taggings", reference=sub_lot_no):
+        # Resolve the workstations of all rows in one pass; failed lookups
+        # are logged and retried per row below
+        workstations.get_workstations(row.get("operation_type") for row in rows)
+
+        for idx, row in enumerate(rows):
+            operation = row.get("operation_type")
+            operator_id = row.get("operator_id")
+            entry = {"operation": operation, "employee": operator_id}
+
+            if not operation or not operator_id:
+                results.append({**entry, "success": False, "error": "Missing operation type or operator ID"})
+                continue
+
+            save_point = f"spp_resource_tag_{idx}"
+            frappe.db.savepoint(save_point)
+
+            result = _create_resource_tags_for_operations(operation, sub_lot_no, operator_id, tag_fields=tag_fields)
+
+            if result.get("status") == "failed":
+                frappe.db.rollback(save_point=save_point)
+                results.append({**entry, "success": False, "error": result.get("message")})
+            else:
+                frappe.db.release_savepoint(save_point)
+                results.append({**entry, "success": True, "name": result.get("resource_tag")})
+
+    failed = sum(1 for result in results if not result["success"])
+    return {
+        "status": "failed" if failed == len(results) else "partial" if failed else "success",
+        "message": f"Created {len(results) - failed} of {len(results)} resource tags for {sub_lot_no}",
+        "results": results,
+    }
+
+@frappe.whitelist()
+def get_multi_level_bom(item_code=None, bom_no=None, qty=None):
+    """
+    Explode a BOM tree to any depth.
+
+    Args:
+        item_code (str): Item whose default BOM is exploded
+        bom_no (str): Explode this BOM instead of the item's default BOM
+        qty (float): Quantity of the root item to roll quantities up for
+
+    Returns:
+        dict: `bom_data` (root BOM and all sub-BOMs), `tree` (flattened nodes
+            with rolled-up quantities) and `cycles`
+    """
+    frappe.has_permission("BOM", "read", throw=True)
+
+    bom_no = bom_no or bom_explosion.get_cached_default_bom(item_code)
+    if not bom_no:
+        return {"bom_data": None, "tree": [], "cycles": [], "message": f"No default BOM found for {item_code}"}
+
+    return bom_explosion.get_exploded_bom(bom_no, qty)
+
+@frappe.whitelist()
+def get_lot_trace(lot):
+    """
+    Trace a lot through Sub Lot Creation, Lot Resource Tagging, Inspection
+    Entry and Stock Reconciliation.
+
+    Args:
+        lot (str): SPP batch number, sub lot number, or the name of any
+            document created for it
+
+    Returns:
+        dict: Sub Lot Process records and the documents of every step
+    """
+    frappe.has_permission("Sub Lot Process", "read", throw=True)
+
+    return traceability.get_trace(lot)
+
+@frappe.whitelist()
+def export_sub_lot_processes(from_date, to_date=None, file_format="csv"):
+    """
+    Download Sub Lot Process records with their operations, rejections and
+    ref docs flattened into one row per line, for any date range.
+
+    Args:
+        from_date (str): First day to export
+        to_date (str): Last day to export, defaults to today
+        file_format (str): "csv" or "xlsx"
+
+    Returns:
+        Response | dict: The export file, or for ranges longer than
+            `spp_audit_export_sync_days` status "queued": the file is then
+            written in the background and its URL pushed through the
+            `spp_audit_export` realtime event
+    """
+    frappe.has_permission("Sub Lot Process", "export", throw=True)
+
+    return audit_export.export(from_date, to_date, file_format)
+
+@frappe.whitelist()
+def get_rejection_summary(from_date=None, to_date=None, group_by="rejection_type", filters=None):
+    """
+    Rejected quantities from the rejection rollup.
+
+    Args:
+        from_date (str): Window start, defaults to 30 days ago
+        to_date (str): Window end, defaults to today
+        group_by (str|list): Any of posting_date, item_code, rejection_type,
+            operation, employee (comma separated or a list)
+        filters (dict): dimension -> value to restrict to
+
+    Returns:
+        list: One dict per group with the dimensions, quantity and entries
+    """
+    frappe.has_permission("Rejection Rollup", "read", throw=True)
+
+    if isinstance(group_by, str):
+        group_by = frappe.parse_json(group_by) if group_by.startswith("[") else group_by.split(",")
+    if isinstance(filters, str):
+        filters = frappe.parse_json(filters)
+
+    return rejection_rollup.get_summary(
+        from_date, to_date, [dimension.strip() for dimension in group_by], filters
+    )
+
+@frappe.whitelist()
+def get_kpis():
+    """
+    Lots processed, inspected quantity, rejection percentage and throughput
+    per operation for today, the current shift and this week. Served from
+    Redis counters, so it is cheap enough for screens polling every few
+    seconds.
+    """
+    frappe.has_permission("Sub Lot Process", "read", throw=True)
+
+    return kpi.get_kpis()
+
+@frappe.whitelist()
+def clear_workstation_cache(operations=None):
+    """
+    Drop cached operation -> workstation mappings, e.g. after changing the
+    mapping outside of the Operation / Workstation forms.
+    """
+    frappe.only_for("System Manager")
+
+    if isinstance(operations, str):
+        operations = frappe.parse_json(operations) if operations.startswith("[") else [operations]
+
+    workstations.clear_workstation_cache(operations)
+
+@frappe.whitelist()
+def post_stock_adjustments(company=None, include_failed=False):
+    """
+    Post reserved stock adjustments now instead of waiting for the scheduler,
+    e.g. at the end of a shift.
+
+    Args:
+        company (str): Only post adjustments of this company
+        include_failed (bool): Retry adjustments whose last posting failed
+
+    Returns:
+        dict: company -> name of the reconciliation posted, or the error
+    """
+    frappe.only_for(("System Manager", "Stock Manager"))
+
+    return stock_adjustments.post_pending(company, include_failed=frappe.utils.cint(include_failed))
+
+@frappe.whitelist()
+def get_stage_timings(from_datetime=None, to_datetime=None, stage=None):
+    """
+    Per-stage p50/p95/p99 wall time, queries and rows written of the lot
+    pipeline over a time window (default: the last 24 hours).
+    """
+    frappe.only_for("System Manager")
+
+    return instrumentation.get_stage_stats(from_datetime, to_datetime, stage)
+
+@contextmanager
+def _isolated_response():
+    """
+    Give each lot in a batch its own `frappe.response`.
+
+    The lot validators report through `frappe.response` and the validation
+    helpers compare it against a snapshot, so a previous lot's response would
+    otherwise leak into (or mask) the next lot's validation.
+    """
+    original_response = frappe.local.response
+    frappe.local.response = frappe._dict(docs=[])
+    try:
+        yield
+    finally:
+        frappe.local.response = original_response
+
+def _process_lot(data):
+    """
+    Run the full lot pipeline for a single `process_lot` payload.
+    """
     batch_info = data.get("batchInfo", {})
     inspection_info = data.get("inspectionInfo", {})
     operations = data.get("operationDetails", [])
@@ -15,7 +613,12 @@ def process_lot(data):
     
     # Validate lot before processing
     batch_id = batch_info.get('sppBatchId')
-    validation_result = _get_lot_validation_data(batch_id)
+    native_validation = frappe.utils.cint(frappe.conf.get("spp_native_lot_validation"))
+    if native_validation:
+        lot = _get_native_lot_validation(batch_id)
+        validation_result = lot.as_dict()
+    else:
+        validation_result = _get_lot_validation_data(batch_id)
     
     # For debugging/testing, return early if requested
     if data.get("validateOnly", False):
@@ -33,9 +636,10 @@ def process_lot(data):
             
             # Check if sub_lot creation was successful
             if not sub_lot_result:
-                frappe.log_error(
+                lot_journal.error(
+                    "Process Lot Error - Sub-lot Creation",
                     f"Sub-lot creation returned empty result for batch {batch_id}",
-                    "Process Lot Error - Sub-lot Creation"
+                    reference=batch_id
                 )
                 return {
                     "status": "failed", 
@@ -45,9 +649,10 @@ def process_lot(data):
             
             # Check if sub_lot_result has a failed status
             if sub_lot_result.get("status") == "failed":
-                frappe.log_error(
+                lot_journal.error(
+                    "Process Lot Error - Sub-lot Creation",
                     f"Sub-lot creation failed: {sub_lot_result.get('message')} for batch {batch_id}",
-                    "Process Lot Error - Sub-lot Creation"
+                    reference=batch_id
                 )
                 return {
                     "status": "failed", 
@@ -58,9 +663,10 @@ def process_lot(data):
             
             # Check if sub_lot_no exists in the result
             if not sub_lot_result.get("sub_lot_no"):
-                frappe.log_error(
+                lot_journal.error(
+                    "Process Lot Error - Missing Sub-lot Number",
                     f"No sub_lot_no found in sub_lot_result for batch {batch_id}: {sub_lot_result}",
-                    "Process Lot Error - Missing Sub-lot Number"
+                    reference=batch_id
                 )
                 return {
                     "status": "failed", 
@@ -71,19 +677,28 @@ def process_lot(data):
             
             # At this point, we have confirmed the sub-lot creation was successful
             sub_lot_no = sub_lot_result.get("sub_lot_no")
-            frappe.log_error(
+            # The sub-lot moved stock out of the scanned batch
+            clear_scan_cache(batch_id)
+            lot_journal.info(
+                "Process Lot - Sub-lot Created",
                 f"Successfully created sub-lot {sub_lot_no} for batch {batch_id}, proceeding with operations",
-                "Process Lot - Sub-lot Created"
+                reference=batch_id
             )
                 
-            # Get validation data for operations (only once)
-            operation_validation = _get_lot_res_validation_data(batch_id)
+            # Get validation data for operations (only once). The native
+            # validation already has everything except the stock balance, which
+            # the sub-lot has just changed.
+            if native_validation:
+                operation_validation = _refresh_native_lot_validation(lot)
+            else:
+                operation_validation = _get_lot_res_validation_data(batch_id)
             
             # Verify operation validation data
             if not operation_validation or operation_validation.get("status") == "failed":
-                frappe.log_error(
+                lot_journal.error(
+                    "Process Lot Error - Operation Validation",
                     f"Operation validation failed for batch {batch_id}: {operation_validation}",
-                    "Process Lot Error - Operation Validation"
+                    reference=batch_id
                 )
                 return {
                     "status": "partial", 
@@ -94,6 +709,11 @@ def process_lot(data):
             
             # Step 1: Create resource tags first
             operation_results = []
+            tag_fields = _get_resource_tag_fields(sub_lot_no, operation_validation)
+
+            # Resolve the workstations of all operations in one pass; failed
+            # lookups are logged and retried per operation below
+            workstations.get_workstations(op.get("operation") for op in operations)
             
             for operation_detail in operations:
                 operation_type = operation_detail.get("operation")
@@ -101,9 +721,10 @@ def process_lot(data):
                 
                 # Validate the operation data
                 if not operation_type or not operator_id:
-                    frappe.log_error(
+                    lot_journal.warning(
+                        "Process Operation Error",
                         f"Missing operation type or operator ID: {operation_detail}",
-                        "Process Operation Error"
+                        reference=batch_id
                     )
                     continue
                     
@@ -112,7 +733,7 @@ def process_lot(data):
                     operation_type, 
                     sub_lot_no, 
                     operator_id,
-                    operation_validation
+                    tag_fields=tag_fields
                 )
                 operation_results.append(result)
             
@@ -143,7 +764,8 @@ def process_lot(data):
                 batch_info, 
                 inspection_info, 
                 operations, 
-                rejection_details
+                rejection_details,
+                full_response=frappe.utils.cint(data.get("fullResponse"))
             )
             
             # Check if process record creation succeeded
@@ -168,9 +790,10 @@ def process_lot(data):
             }
 
         except Exception as e:
-            frappe.log_error(
+            lot_journal.error(
+                "Process Lot Error",
                 f"Error in process_lot: {str(e)}\n{frappe.get_traceback()}",
-                "Process Lot Error"
+                reference=batch_id
             )
             return {
                 "status": "failed", 
@@ -185,6 +808,7 @@ def process_lot(data):
         "validation_result": validation_result
     }
 
+@instrumentation.stage
 def create_sub_lot_entry(batch_info, inspection_info, lot_data):
     """
     Create a Sub Lot Creation entry based on lot validation and quantity comparison.
@@ -193,55 +817,76 @@ def create_sub_lot_entry(batch_info, inspection_info, lot_data):
         # Extract and validate the batch ID
         original_lot_no = batch_info.get("sppBatchId")
         if not original_lot_no:
-            frappe.log_error("Missing sppBatchId in batch_info", "Sub Lot Creation Error")
+            lot_journal.error("Sub Lot Creation Error", "Missing sppBatchId in batch_info")
             return {"status": "failed", "message": "Missing batch ID"}
             
-        frappe.log_error(f"Creating sub-lot for: {original_lot_no}", "Sub Lot Creation - Start")
+        lot_journal.debug("Sub Lot Creation - Start", f"Creating sub-lot for: {original_lot_no}", reference=original_lot_no)
         
         # Convert and compare quantities
         available_qty = float(lot_data.get("qty", 0))
         inspection_qty = float(inspection_info.get("inspectionQuantity", "0"))
         
         # Get KG conversion factor and calculate weight
-        uom_conversion_factor = _get_kg_conversion_factor(lot_data.get("item_code"))
+        uom_conversion_factor = uom.get_kg_conversion_factor(lot_data.get("item_code"))
         inspection_qty_kg = (1.0 / uom_conversion_factor) * inspection_qty
 
-        frappe.log_error(
+        lot_journal.debug(
+            "Sub Lot Creation - Quantity Conversion",
             f"Converting inspection qty {inspection_qty} to KG: {inspection_qty} * (1/{uom_conversion_factor}) = {inspection_qty_kg}",
-            "Sub Lot Creation - Quantity Conversion"
+            reference=original_lot_no
         )
 
+        # Get item and warehouse details from batch_info
+        item_code = batch_info.get("itemCode") or lot_data.get("item_code")
+        warehouse = batch_info.get("warehouse") or lot_data.get("t_warehouse")
+        batch_no = batch_info.get("batchNo") or lot_data.get("batch_no")
+
+        # Adjustments reserved by earlier lots of the batch count as available
+        coalesce = stock_adjustments.is_enabled()
+        if coalesce:
+            available_qty += stock_adjustments.get_reserved_qty(item_code, warehouse, batch_no)
+
         # Check if inspection quantity exceeds available quantity
+        reconciliation_result = None
         if inspection_qty > available_qty:
-            frappe.log_error(
+            lot_journal.warning(
+                "Sub Lot Creation - Quantity Discrepancy",
                 f"Inspection quantity {inspection_qty} exceeds available quantity {available_qty}. Performing stock reconciliation.",
-                "Sub Lot Creation - Quantity Discrepancy"
+                reference=original_lot_no
             )
             
-            # Get item and warehouse details from batch_info
-            item_code = batch_info.get("itemCode") or lot_data.get("item_code")
-            warehouse = batch_info.get("warehouse") or lot_data.get("t_warehouse")
-            batch_no = batch_info.get("batchNo") or lot_data.get("batch_no")
-            
-            # Create stock reconciliation
-            reconciliation_result = _create_stock_reconciliation(
-                item_code, 
-                warehouse, 
-                batch_no, 
-                available_qty, 
-                inspection_qty
-            )
+            if coalesce:
+                # Reserve the difference; it is posted with the next coalesced reconciliation
+                reconciliation_result = stock_adjustments.reserve(
+                    item_code,
+                    warehouse,
+                    batch_no,
+                    available_qty,
+                    inspection_qty,
+                    reference=original_lot_no
+                )
+            else:
+                # Create stock reconciliation
+                reconciliation_result = _create_stock_reconciliation(
+                    item_code, 
+                    warehouse, 
+                    batch_no, 
+                    available_qty, 
+                    inspection_qty
+                )
             
             if reconciliation_result.get("status") == "failed":
-                frappe.log_error(
+                lot_journal.error(
+                    "Sub Lot Creation - Reconciliation Failed",
                     f"Stock reconciliation failed: {reconciliation_result.get('message')}",
-                    "Sub Lot Creation - Reconciliation Failed"
+                    reference=original_lot_no
                 )
                 # Continue with creation anyway, but log the error
             else:
-                frappe.log_error(
-                    f"Stock reconciled successfully. Document: {reconciliation_result.get('reconciliation')}",
-                    "Sub Lot Creation - Reconciliation Success"
+                lot_journal.info(
+                    "Sub Lot Creation - Reconciliation Success",
+                    f"Stock reconciled successfully. Document: {reconciliation_result.get('reconciliation') or reconciliation_result.get('adjustment')}",
+                    reference=original_lot_no
                 )
                 # Update available quantity to reflect the reconciliation
                 available_qty = inspection_qty
@@ -255,16 +900,23 @@ def create_sub_lot_entry(batch_info, inspection_info, lot_data):
             inspection_qty_kg, 
             available_qty
         )
+
+        # Keep the reconciliation (or reserved adjustment) so the process
+        # record can reference it
+        if reconciliation_result and reconciliation_result.get("status") == "success":
+            sub_lot_doc["stock_reconciliation"] = reconciliation_result.get("reconciliation")
+            sub_lot_doc["stock_adjustment"] = reconciliation_result.get("adjustment")
         
         return sub_lot_doc
         
     except Exception as e:
-        frappe.log_error(
-            f"Error in create_sub_lot_entry: {str(e)}\n{frappe.get_traceback()}",
-            "Sub Lot Creation - Error"
+        lot_journal.error(
+            "Sub Lot Creation - Error",
+            f"Error in create_sub_lot_entry: {str(e)}\n{frappe.get_traceback()}"
         )
         return {"status": "failed", "message": str(e)}
 
+@instrumentation.stage
 def _create_sub_lot_document(original_lot_no, lot_data, inspection_qty, inspection_qty_kg, available_qty):
     """
     Create and submit a Sub Lot Creation document.
@@ -296,18 +948,23 @@ def _create_sub_lot_document(original_lot_no, lot_data, inspection_qty, inspecti
 
     sub_lot_doc.insert()
     
-    frappe.log_error(f"About to submit Sub Lot document {sub_lot_doc.name}", 
-                   "Sub Lot Creation - Before Submit")
+    lot_journal.debug(
+        "Sub Lot Creation - Before Submit",
+        f"About to submit Sub Lot document {sub_lot_doc.name}",
+        reference=original_lot_no
+    )
     
     # Submit will trigger the update_sublot method
     sub_lot_doc.submit()
     
-    # Reload to get the generated sub_lot_no
-    sub_lot_doc.reload()
+    # update_sublot writes the generated sub_lot_no straight to the database;
+    # read just that column instead of reloading the whole document
+    sub_lot_doc.sub_lot_no = frappe.db.get_value("Sub Lot Creation", sub_lot_doc.name, "sub_lot_no")
     
-    frappe.log_error(
+    lot_journal.info(
+        "Sub Lot Creation - Complete",
         f"Created sub lot {sub_lot_doc.sub_lot_no} with qty {inspection_qty}, {inspection_qty_kg} kg from original lot {original_lot_no}",
-        "Sub Lot Creation - Complete"
+        reference=original_lot_no
     )
     
     # Return a dictionary with details of the created sub lot
@@ -324,42 +981,7 @@ def _create_sub_lot_document(original_lot_no, lot_data, inspection_qty, inspecti
         "original_lot_no": original_lot_no
     }
 
-def _get_kg_conversion_factor(item_code):
-    """
-    Get the KG conversion factor for an item.
-    
-    Args:
-        item_code (str): The item code
-        
-    Returns:
-        float: Conversion factor for KG
-    """
-    uom_conversion_factor = 1.0
-    
-    if not item_code:
-        return uom_conversion_factor
-        
-    try:
-        item_doc = frappe.get_doc("Item", item_code)
-        # Look for KG conversion in UOM conversion table
-        for uom_row in item_doc.uoms:
-            if uom_row.uom and uom_row.uom.lower() in ["kg", "kgs", "kilogram", "kilograms"]:
-                uom_conversion_factor = float(uom_row.conversion_factor or 1.0)
-                
-                frappe.log_error(f"Found KG conversion factor: {uom_conversion_factor}", 
-                                "Sub Lot Creation - UOM Conversion")
-                break
-        
-        # If we didn't find a KG conversion, log it
-        if uom_conversion_factor == 1.0:
-            frappe.log_error(f"No KG conversion found for item {item_code}", 
-                           "Sub Lot Creation - Missing UOM Conversion")
-    except Exception as uom_error:
-        frappe.log_error(f"Error fetching UOM conversion: {str(uom_error)}", 
-                       "Sub Lot Creation - UOM Error")
-    
-    return uom_conversion_factor
-
+@instrumentation.stage
 def _get_lot_validation_data(lot_no):
     """
     Get validation data for a lot number.
@@ -380,8 +1002,11 @@ def _get_lot_validation_data(lot_no):
     
     # Check if frappe.response was modified by validate_lot
     if not hasattr(frappe, 'response') or frappe.response == original_response:
-        frappe.log_error(f"validate_lot did not modify frappe.response for {lot_no}", 
-                       "Sub Lot Creation - Validation Failed")
+        lot_journal.error(
+            "Sub Lot Creation - Validation Failed",
+            f"validate_lot did not modify frappe.response for {lot_no}",
+            reference=lot_no
+        )
         return {"status": "failed", "message": "Lot validation failed - no response data"}
     
     # Extract the response data
@@ -392,14 +1017,15 @@ def _get_lot_validation_data(lot_no):
     
     # Check if lot_data is a string instead of a dictionary
     if isinstance(lot_data, str):
-        frappe.log_error(f"lot_data is a string: {lot_data}", "Sub Lot Creation - Data Type Error")
+        lot_journal.warning("Sub Lot Creation - Data Type Error", f"lot_data is a string: {lot_data}", reference=lot_no)
         return {"status": "success", "qty": 0, "message": lot_data}
     
     # Log the successful data retrieval
-    frappe.log_error(f"Retrieved lot data for {lot_no}", "Sub Lot Creation - Data Retrieved")
+    lot_journal.debug("Sub Lot Creation - Data Retrieved", f"Retrieved lot data for {lot_no}", reference=lot_no)
     
     return lot_data
 
+@instrumentation.stage
 def _get_lot_res_validation_data(lot_no):
     """
     Get validation data for a lot number.
@@ -420,8 +1046,11 @@ def _get_lot_res_validation_data(lot_no):
     
     # Check if frappe.response was modified by validate_lot
     if not hasattr(frappe, 'response') or frappe.response == original_response:
-        frappe.log_error(f"validate_lot did not modify frappe.response for {lot_no}", 
-                       "Sub Lot Creation - Validation Failed")
+        lot_journal.error(
+            "Sub Lot Creation - Validation Failed",
+            f"validate_lot did not modify frappe.response for {lot_no}",
+            reference=lot_no
+        )
         return {"status": "failed", "message": "Lot validation failed - no response data"}
     
     # Extract the response data
@@ -429,112 +1058,149 @@ def _get_lot_res_validation_data(lot_no):
     
     # Check for failure status
     if response_data.get('status') == "failed":
-        frappe.log_error(f"validate_lot failed: {response_data.get('message')}", 
-                       "Sub Lot Creation - Validation Failed")
+        lot_journal.error(
+            "Sub Lot Creation - Validation Failed",
+            f"validate_lot failed: {response_data.get('message')}",
+            reference=lot_no
+        )
         return {"status": "failed", "message": response_data.get('message', 'Validation failed')}
     
     # Extract lot data from the response
     lot_data = response_data.get('message', {})
     
     # Log the successful data retrieval
-    frappe.log_error(f"Retrieved lot res tag  data for {lot_no}", " Lot res Creation - Data Retrieved")
+    lot_journal.debug("Lot Res Creation - Data Retrieved", f"Retrieved lot res tag  data for {lot_no}", reference=lot_no)
     
     return lot_data
 
-def _create_resource_tags_for_operations(operation, sub_lot_no, operator_id, validation_result):
+@instrumentation.stage
+def _get_native_lot_validation(lot_no):
+    """
+    Validate a lot with `spp.lot_validation` instead of the custom app.
+
+    Args:
+        lot_no (str): The lot number to validate
+
+    Returns:
+        LotValidation: Typed validation result
+    """
+    lot = lot_validation.validate_lot(lot_no)
+
+    if lot.failed:
+        lot_journal.error("Sub Lot Creation - Validation Failed", lot.message, reference=lot_no)
+    else:
+        lot_journal.debug("Sub Lot Creation - Data Retrieved", f"Retrieved lot data for {lot_no}", reference=lot_no)
+
+    return lot
+
+@instrumentation.stage
+def _refresh_native_lot_validation(lot):
+    """
+    Operation validation data for a natively validated lot.
+
+    Args:
+        lot (LotValidation): Result of `_get_native_lot_validation`
+
+    Returns:
+        dict: Validation data for the lot with a fresh stock balance
+    """
+    return lot_validation.refresh_stock(lot).as_dict()
+
+@instrumentation.stage
+def _create_resource_tags_for_operations(operation, sub_lot_no, operator_id, validation_result=None, tag_fields=None):
+    """
+    Create and submit a Lot Resource Tagging for one operator/operation pair.
+
+    Args:
+        operation (str): The operation performed
+        sub_lot_no (str): The sub lot number
+        operator_id (str): The operator employee code
+        validation_result (dict): Validation data, used when `tag_fields` is not given
+        tag_fields (dict): Fields shared by every tag of the sub lot, see
+            `_get_resource_tag_fields`
+
+    Returns:
+        dict: Result of the operation
+    """
     try:
-        # Log the incoming arguments with their types
-        frappe.log_error(
-            message=f"Creating resource tag - Operation: {operation} ({type(operation)}), Sub Lot: {sub_lot_no} ({type(sub_lot_no)}), Operator: {operator_id} ({type(operator_id)})",
-            title="Resource Tag - Arguments with Types"
+        lot_journal.debug(
+            "Resource Tag - Arguments",
+            f"Creating resource tag - Operation: {operation}, Sub Lot: {sub_lot_no}, Operator: {operator_id}",
+            reference=sub_lot_no
         )
-        
-        from shree_polymer_custom_app.shree_polymer_custom_app.doctype.lot_resource_tagging.lot_resource_tagging import check_return_workstation
-        workstation_result = check_return_workstation(operation)
-        
-        # Extract workstation from the result which is a dictionary
-        if isinstance(workstation_result, dict):
-            workstation = str(workstation_result.get("message", "")) if workstation_result.get("status") == "success" else ""
-        else:
-            workstation = str(workstation_result) if workstation_result is not None else ""
-        
-        frappe.log_error(f"Workstation resolved to: '{workstation}'", "Resource Tag - Workstation")
-        
-        # Create the document with safe type conversion
+
+        if tag_fields is None:
+            tag_fields = _get_resource_tag_fields(sub_lot_no, validation_result)
+
+        workstation = workstations.get_workstation(operation)
+
+        lot_journal.debug("Resource Tag - Workstation", f"Workstation resolved to: '{workstation}'", reference=sub_lot_no)
+
         lot_rt = frappe.new_doc("Lot Resource Tagging")
-         # Check if sub_lot_no has a dash and extract the suffix
-        suffix = ""
-        if "-" in sub_lot_no:
-            suffix = sub_lot_no.split("-", 1)[1]  # Get everything after the first dash
-        
-        # Continue with the rest of your code...
-        lot_rt.posting_date = frappe.utils.today()
-        lot_rt.scan_lot_no = str(sub_lot_no)
+        lot_rt.update(tag_fields)
         lot_rt.scan_operator = str(operator_id)
-        lot_rt.operator_id = str(operator_id) 
+        lot_rt.operator_id = str(operator_id)
         lot_rt.operation_type = str(operation)
         lot_rt.workstation = workstation
-        
-        # Get batch_no with safe type conversion
-        batch_no_val = validation_result.get("batch_no", "")
-        if batch_no_val:
-            lot_rt.batch_no = f"{batch_no_val.upper()}{'-' + suffix.upper() if suffix else ''}"
-        else:
-            lot_rt.batch_no = ""
-        
-        # Get BOM with safe type conversion
-        bom_no = validation_result.get("bom_no", "")
-        lot_rt.bom_no = str(bom_no) if bom_no else ""
-        
-        # Get warehouse with safe type conversion
-        warehouse = validation_result.get("from_warehouse", "")
-        lot_rt.warehouse = str(warehouse) if warehouse else ""
-        
-        # Get product_ref with safe type conversion
-        product_ref = validation_result.get("production_item", "")
-        lot_rt.product_ref = str(product_ref) if product_ref else ""
-        
-        # Set numeric fields with safe conversion
-        try:
-            qty = validation_result.get("qty_from_item_batch", 0)
-            lot_rt.available_qty = float(qty) if qty is not None else 0
-            lot_rt.qtynos = float(qty) if qty is not None else 0
-        except:
-            lot_rt.available_qty = 0
-            lot_rt.qtynos = 0
-        
-        # Set SPP batch number with safe type conversion
-        spp_batch = validation_result.get("spp_batch_number", "")
-        lot_rt.spp_batch_no = str(spp_batch) if spp_batch else ""
-        
-        # Create operations string with safe type conversion
-        operations_list = []
-        try:
-            bom_operations = validation_result.get("bom_operations", [])
-            if isinstance(bom_operations, list):
-                for op in bom_operations:
-                    if isinstance(op, dict) and op.get("operation"):
-                        operations_list.append(str(op.get("operation")))
-        except:
-            pass
-        lot_rt.operations = ",".join(operations_list)
-        
+
         # Using ignore flags to bypass validation issues
         lot_rt.flags.ignore_links = True
         lot_rt.flags.ignore_mandatory = True
         lot_rt.insert(ignore_permissions=True, ignore_mandatory=True)
         lot_rt.submit()
-        
+
         return {
-            "status": "success", 
-            "message": f"Resource tag created for {sub_lot_no}", 
+            "status": "success",
+            "message": f"Resource tag created for {sub_lot_no}",
             "resource_tag": lot_rt.name
         }
-        
+
     except Exception as e:
-        frappe.log_error(f"Error creating resource tag: {str(e)}\n{frappe.get_traceback()}", "Resource Tag Error")
+        lot_journal.error("Resource Tag Error", f"Error creating resource tag: {str(e)}\n{frappe.get_traceback()}", reference=sub_lot_no)
         return {"status": "failed", "message": str(e)}
 
+def _get_resource_tag_fields(sub_lot_no, validation_result):
+    """
+    Lot Resource Tagging fields that are the same for every operation of a
+    sub lot, so they are resolved once per sub lot rather than per tag.
+
+    Args:
+        sub_lot_no (str): The sub lot number
+        validation_result (dict): Validation data of the parent lot
+
+    Returns:
+        dict: Field values for the Lot Resource Tagging documents
+    """
+    sub_lot_no = str(sub_lot_no)
+
+    # Sub lots are named <lot>-<suffix>; the suffix carries over to the batch
+    suffix = sub_lot_no.split("-", 1)[1] if "-" in sub_lot_no else ""
+
+    batch_no = validation_result.get("batch_no") or ""
+    if batch_no and suffix:
+        batch_no = f"{batch_no}-{suffix}"
+
+    qty = frappe.utils.flt(validation_result.get("qty_from_item_batch"))
+
+    operations = []
+    bom_operations = validation_result.get("bom_operations") or []
+    if isinstance(bom_operations, list):
+        operations = [str(op.get("operation")) for op in bom_operations if isinstance(op, dict) and op.get("operation")]
+
+    return {
+        "posting_date": frappe.utils.today(),
+        "scan_lot_no": sub_lot_no,
+        "batch_no": batch_no.upper(),
+        "bom_no": str(validation_result.get("bom_no") or ""),
+        "warehouse": str(validation_result.get("from_warehouse") or ""),
+        "product_ref": str(validation_result.get("production_item") or ""),
+        "available_qty": qty,
+        "qtynos": qty,
+        "spp_batch_no": str(validation_result.get("spp_batch_number") or ""),
+        "operations": ",".join(operations),
+    }
+
+@instrumentation.stage
 def _create_inspection_entry(sub_lot_no, inspector_id, inspection_qty, validation_result, rejection_details=None):
     """
     Create an Inspection Entry for a sub lot.
@@ -551,9 +1217,10 @@ def _create_inspection_entry(sub_lot_no, inspector_id, inspection_qty, validatio
     """
     try:
         # Log the incoming arguments
-        frappe.log_error(
-            message=f"Creating inspection entry - Sub Lot: {sub_lot_no}, Inspector: {inspector_id}, Qty: {inspection_qty}",
-            title="Inspection Entry - Arguments"
+        lot_journal.debug(
+            "Inspection Entry - Arguments",
+            f"Creating inspection entry - Sub Lot: {sub_lot_no}, Inspector: {inspector_id}, Qty: {inspection_qty}",
+            reference=sub_lot_no
         )
         
         # Create a new Inspection Entry document
@@ -569,6 +1236,7 @@ def _create_inspection_entry(sub_lot_no, inspector_id, inspection_qty, validatio
         insp.inspection_type = "Final Visual Inspection"
         insp.scan_inspector = str(inspector_id)
         insp.inspector_code = str(inspector_id)
+        insp.inspector_name = employee_directory.get_employee_name(inspector_id) or ""
         insp.scan_production_lot = str(sub_lot_no)
         insp.lot_no = str(sub_lot_no)
         
@@ -619,7 +1287,7 @@ def _create_inspection_entry(sub_lot_no, inspector_id, inspection_qty, validatio
         insp.insert(ignore_permissions=True, ignore_mandatory=True)
         insp.submit()
         
-        frappe.log_error(f"Created inspection entry: {insp.name}", "Inspection Entry - Success")
+        lot_journal.info("Inspection Entry - Success", f"Created inspection entry: {insp.name}", reference=sub_lot_no)
         
         return {
             "status": "success", 
@@ -628,13 +1296,14 @@ def _create_inspection_entry(sub_lot_no, inspector_id, inspection_qty, validatio
         }
         
     except Exception as e:
-        frappe.log_error(f"Error creating inspection entry: {str(e)}\n{frappe.get_traceback()}", "Inspection Entry - Error")
+        lot_journal.error("Inspection Entry - Error", f"Error creating inspection entry: {str(e)}\n{frappe.get_traceback()}", reference=sub_lot_no)
         return {"status": "failed", "message": str(e)}
 
-def _create_sub_lot_process_record(sub_lot_result, operation_results, inspection_result, batch_info, inspection_info, operations, rejection_details):
+@instrumentation.stage
+def _create_sub_lot_process_record(sub_lot_result, operation_results, inspection_result, batch_info, inspection_info, operations, rejection_details, full_response=False):
     """
     Create a record in the Sub Lot Process doctype to track the entire process.
-    Returns the complete document data on success.
+    Returns the complete document data on success only if `full_response` is set.
     """
     try:
         # Create a new Sub Lot Process document
@@ -649,19 +1318,22 @@ def _create_sub_lot_process_record(sub_lot_result, operation_results, inspection
         process_doc.warehouse = sub_lot_result.get("warehouse")
         
         # Set quantities
-        process_doc.available_quantity = sub_lot_result.get("qty")
-        process_doc.inspection_quantity = inspection_info.get("inspectionQuantity")
+        process_doc.available_quantity = frappe.utils.flt(sub_lot_result.get("qty"))
+        process_doc.inspection_quantity = frappe.utils.flt(inspection_info.get("inspectionQuantity"))
         
         # Set inspector information
         inspector_code = inspection_info.get("inspectorCode")
         process_doc.inspector_code = inspector_code
         
-        # Try to get inspector name
+        # Resolve the inspector and every operator in one lookup
         try:
-            inspector_name = frappe.db.get_value("Employee", {"employee_id": inspector_code}, "employee_name")
-            process_doc.inspector_name = inspector_name
-        except:
-            process_doc.inspector_name = ""
+            employee_names = employee_directory.get_employee_names(
+                [inspector_code] + [op_detail.get("employeeCode") for op_detail in operations]
+            )
+        except Exception:
+            employee_names = {}
+
+        process_doc.inspector_name = employee_names.get(inspector_code) or ""
         
         # Add operations
         for op_detail in operations:
@@ -671,17 +1343,10 @@ def _create_sub_lot_process_record(sub_lot_result, operation_results, inspection
             if not operation_type or not employee_code:
                 continue
                 
-            # Try to get employee name
-            employee_name = ""
-            try:
-                employee_name = frappe.db.get_value("Employee", {"employee_id": employee_code}, "employee_name")
-            except:
-                pass
-                
             process_doc.append("operations", {
                 "operation": operation_type,
                 "employee_code": employee_code,
-                "employee_name": employee_name
+                "employee_name": employee_names.get(employee_code) or ""
             })
         
         # Add rejection details
@@ -689,13 +1354,14 @@ def _create_sub_lot_process_record(sub_lot_result, operation_results, inspection
             for rej in rejection_details:
                 process_doc.append("table_ilhb", {
                     "rejection_type": rej.get("rejectionType", ""),
-                    "quantity": rej.get("quantity", 0)
+                    "quantity": frappe.utils.flt(rej.get("quantity"))
                 })
         
         # Add reference documents
         # 1. Sub Lot document
         if sub_lot_result.get("name"):
             process_doc.append("table_zhga", {
+                "ref_doctype": "Sub Lot Creation",
                 "ref_doc": sub_lot_result.get("name")
             })
         
@@ -703,43 +1369,63 @@ def _create_sub_lot_process_record(sub_lot_result, operation_results, inspection
         for op_result in operation_results:
             if op_result.get("status") == "success" and op_result.get("resource_tag"):
                 process_doc.append("table_zhga", {
+                    "ref_doctype": "Lot Resource Tagging",
                     "ref_doc": op_result.get("resource_tag")
                 })
         
         # 3. Inspection entry
         if inspection_result.get("status") == "success" and inspection_result.get("inspection_entry"):
             process_doc.append("table_zhga", {
+                "ref_doctype": "Inspection Entry",
                 "ref_doc": inspection_result.get("inspection_entry")
             })
+
+        # 4. Stock reconciliation, or the adjustment reserved for the next one
+        if sub_lot_result.get("stock_reconciliation"):
+            process_doc.append("table_zhga", {
+                "ref_doctype": "Stock Reconciliation",
+                "ref_doc": sub_lot_result.get("stock_reconciliation")
+            })
+        elif sub_lot_result.get("stock_adjustment"):
+            process_doc.append("table_zhga", {
+                "ref_doctype": "Pending Stock Adjustment",
+                "ref_doc": sub_lot_result.get("stock_adjustment")
+            })
         
         # Save the document
         process_doc.insert(ignore_permissions=True)
         
-        frappe.log_error(f"Created Sub Lot Process record: {process_doc.name}", 
-                       "Sub Lot Process - Created")
-        
-        # Reload the document to ensure we have all data, including generated child IDs
-        process_doc.reload()
-        
-        # Convert to dictionary for the response
-        process_data = process_doc.as_dict()
+        lot_journal.info(
+            "Sub Lot Process - Created",
+            f"Created Sub Lot Process record: {process_doc.name}",
+            reference=batch_info.get("sppBatchId")
+        )
         
-        # Return the success status and the complete document data
-        return {
+        result = {
             "status": "success", 
             "message": f"Sub Lot Process record created",
-            "process_record": process_doc.name,
-            "data": process_data
+            "process_record": process_doc.name
         }
+
+        # The inserted document already carries its name and child row names,
+        # so the full payload needs no reload
+        if full_response:
+            result["data"] = process_doc.as_dict()
+
+        return result
         
     except Exception as e:
-        frappe.log_error(f"Error creating Sub Lot Process record: {str(e)}\n{frappe.get_traceback()}", 
-                       "Sub Lot Process - Error")
+        lot_journal.error(
+            "Sub Lot Process - Error",
+            f"Error creating Sub Lot Process record: {str(e)}\n{frappe.get_traceback()}",
+            reference=batch_info.get("sppBatchId")
+        )
         return {
             "status": "failed", 
             "message": f"Error creating process record: {str(e)}"
         }
 
+@instrumentation.stage
 def _create_stock_reconciliation(item_code, warehouse, batch_no, current_qty, new_qty):
     """
     Create a Stock Reconciliation document to adjust inventory quantities.
@@ -755,9 +1441,9 @@ def _create_stock_reconciliation(item_code, warehouse, batch_no, current_qty, ne
         dict: Result of the operation
     """
     try:
-        frappe.log_error(
-            f"Creating stock reconciliation for {item_code} in {warehouse}, batch {batch_no}: {current_qty} -> {new_qty}",
-            "Stock Reconciliation - Start"
+        lot_journal.debug(
+            "Stock Reconciliation - Start",
+            f"Creating stock reconciliation for {item_code} in {warehouse}, batch {batch_no}: {current_qty} -> {new_qty}"
         )
         
         # Create stock reconciliation document
@@ -773,9 +1459,7 @@ def _create_stock_reconciliation(item_code, warehouse, batch_no, current_qty, ne
             "use_serial_batch_fields": 1,
             "batch_no": batch_no,
             "qty": new_qty,
-            "valuation_rate": frappe.db.get_value("Stock Ledger Entry", 
-                                                {"item_code": item_code, "batch_no": batch_no, "warehouse": warehouse},
-                                                "valuation_rate")
+            "valuation_rate": valuation.get_valuation_rate(item_code, warehouse, batch_no)
         })
         
         # Set flags to bypass permission issues
@@ -786,8 +1470,10 @@ def _create_stock_reconciliation(item_code, warehouse, batch_no, current_qty, ne
         sr.insert()
         sr.submit()
         
-        frappe.log_error(f"Stock reconciliation {sr.name} created and submitted successfully", 
-                       "Stock Reconciliation - Complete")
+        lot_journal.info(
+            "Stock Reconciliation - Complete",
+            f"Stock reconciliation {sr.name} created and submitted successfully"
+        )
         
         return {
             "status": "success",
@@ -797,8 +1483,10 @@ def _create_stock_reconciliation(item_code, warehouse, batch_no, current_qty, ne
         }
         
     except Exception as e:
-        frappe.log_error(f"Error creating stock reconciliation: {str(e)}\n{frappe.get_traceback()}", 
-                       "Stock Reconciliation - Error")
+        lot_journal.error(
+            "Stock Reconciliation - Error",
+            f"Error creating stock reconciliation: {str(e)}\n{frappe.get_traceback()}"
+        )
         return {
             "status": "failed",
             "message": f"Error reconciling stock: {str(e)}"
@@ -0,0 +1,166 @@
+"""
+Archiving of closed months of Sub Lot Process records.
+
+Every lot adds a Sub Lot Process and a few rows to each of its child tables.
+`archive_closed_months` (daily scheduler) moves the records of every month
+that ended more than `spp_archive_after_months` months ago (site config,
+default 12, 0 to disable) into archive tables, `BATCH_SIZE` records per
+transaction: the child rows and their parents are copied and deleted together,
+so a record is always either live or archived as a whole. Archive tables are
+created with CREATE TABLE ... LIKE their live table and get the columns the
+live table gained since on every run and after migrate.
+
+Archived records are not Frappe documents anymore, so list views and forms
+only see the live tables; `get_tables` gives the lookups (traceability, audit
+export, rejection rollup rebuild) both tables to read from.
+"""
+
+import time
+
+import frappe
+from frappe.query_builder import Table
+from frappe.utils import add_months, cint, get_first_day, today
+
+ARCHIVED_DOCTYPES = (
+    "Sub Lot Process",
+    "Sub Lot Process Operations",
+    "Rejection Details",
+    "Sub Lot Ref Docs",
+)
+DEFAULT_KEEP_MONTHS = 12
+BATCH_SIZE = 500
+# Stop starting new batches after this many seconds, the next run carries on
+MAX_RUN_SECONDS = 10 * 60
+
+
+def get_archive_table(doctype):
+    return f"__spp_archive_{frappe.scrub(doctype)}"
+
+def get_tables(doctype):
+    """
+    Query builder tables holding rows of `doctype`: the live table, then the
+    archive table once archiving has created it.
+    """
+    tables = [frappe.qb.DocType(doctype)]
+    if archive_exists(doctype):
+        tables.append(Table(get_archive_table(doctype)))
+
+    return tables
+
+def get_table_names(doctype):
+    """
+    Like `get_tables`, as table names for raw SQL.
+    """
+    names = [f"tab{doctype}"]
+    if archive_exists(doctype):
+        names.append(get_archive_table(doctype))
+
+    return names
+
+def archive_exists(doctype):
+    return get_archive_table(doctype) in frappe.db.get_tables()
+
+def archive_closed_months():
+    """
+    Move Sub Lot Process records of closed months into the archive tables.
+    """
+    keep_months = cint(frappe.conf.get("spp_archive_after_months", DEFAULT_KEEP_MONTHS))
+    if keep_months <= 0:
+        return
+
+    cutoff = get_first_day(add_months(today(), -keep_months))
+    sync_archive_tables(create=True)
+
+    started = time.monotonic()
+    while time.monotonic() - started < MAX_RUN_SECONDS:
+        try:
+            if not archive_batch(cutoff):
+                break
+        except Exception:
+            frappe.db.rollback()
+            frappe.log_error(title="Sub Lot Process - Archiving Failed")
+            break
+
+def archive_batch(cutoff, batch_size=BATCH_SIZE):
+    """
+    Move the oldest `batch_size` Sub Lot Process records created before
+    `cutoff`, with their child rows, in one transaction.
+
+    Returns:
+        int: Number of records moved
+    """
+    names = frappe.db.sql_list(
+        f"""
+        SELECT `name` FROM `tabSub Lot Process`
+        WHERE `creation` < %(cutoff)s
+        ORDER BY `creation`
+        LIMIT {cint(batch_size)}
+        """,
+        {"cutoff": cutoff},
+    )
+    if not names:
+        return 0
+
+    values = {"names": tuple(names)}
+    for doctype in ARCHIVED_DOCTYPES[1:]:
+        _move(doctype, "`parenttype` = 'Sub Lot Process' AND `parent` IN %(names)s", values)
+    _move("Sub Lot Process", "`name` IN %(names)s", values)
+
+    frappe.db.commit()
+    return len(names)
+
+def sync_archive_tables(create=False):
+    """
+    Give the archive tables the columns their live tables gained (or changed)
+    since they were created. With `create`, create missing archive tables.
+    """
+    created = False
+    for doctype in ARCHIVED_DOCTYPES:
+        archive_table = get_archive_table(doctype)
+        if not archive_exists(doctype):
+            if not create:
+                continue
+            frappe.db.sql_ddl(f"CREATE TABLE IF NOT EXISTS `{archive_table}` LIKE `tab{doctype}`")
+            created = True
+            continue
+
+        archived = _get_columns(archive_table)
+        changes = [
+            f"ADD COLUMN `{column}` {column_type} NULL" if column not in archived
+            else f"MODIFY COLUMN `{column}` {column_type} NULL"
+            for column, column_type in _get_columns(f"tab{doctype}").items()
+            if archived.get(column) != column_type and column != "name"
+        ]
+        if changes:
+            frappe.db.sql_ddl(f"ALTER TABLE `{archive_table}` {', '.join(changes)}")
+
+    if created:
+        # `frappe.db.get_tables` is cached
+        frappe.cache.delete_value("db_tables")
+
+def _move(doctype, condition, values):
+    columns = ", ".join(f"`{column}`" for column in _get_columns(f"tab{doctype}"))
+    frappe.db.sql(
+        f"""
+        REPLACE INTO `{get_archive_table(doctype)}` ({columns})
+        SELECT {columns} FROM `tab{doctype}` WHERE {condition}
+        """,
+        values,
+    )
+    frappe.db.sql(f"DELETE FROM `tab{doctype}` WHERE {condition}", values)
+
+def _get_columns(table):
+    """
+    column -> column type of a table, in table order.
+    """
+    return dict(
+        frappe.db.sql(
+            """
+            SELECT `column_name`, `column_type`
+            FROM information_schema.columns
+            WHERE `table_schema` = DATABASE() AND `table_name` = %s
+            ORDER BY `ordinal_position`
+            """,
+            table,
+        )
+    )
@@ -0,0 +1,255 @@
+"""
+Streaming audit export of Sub Lot Process records.
+
+Records are read one page at a time with keyset pagination on (creation,
+name), and the operations, rejections and ref docs of a page are fetched with
+one query per child table. `iter_rows` joins them into flat rows: a process
+with three operations and one rejection becomes three rows, the n-th row
+carrying the n-th entry of each child table. Rows go straight into a file
+(CSV, or an openpyxl write-only workbook), so memory stays flat whatever the
+date range. Records moved to the archive tables (see `spp.archive`) are
+exported first, then the live ones.
+
+The database connection is closed when the request returns, so the file has
+to be complete before the response starts. Ranges of up to
+`spp_audit_export_sync_days` days (site config, default 31) are written to a
+temporary file and sent back in the request; longer ones are written by a
+background job into a private File, whose URL is pushed to the user through
+the `spp_audit_export` realtime event.
+"""
+
+import csv
+import io
+import tempfile
+from itertools import zip_longest
+
+import frappe
+from frappe.utils import add_days, cint, date_diff, getdate, today
+from werkzeug.wrappers import Response
+from werkzeug.wsgi import wrap_file
+
+from spp import archive
+
+PAGE_SIZE = 500
+DEFAULT_SYNC_DAYS = 31
+
+PROCESS_FIELDS = (
+    "name", "creation", "spp_batch_number", "sub_lot_number", "item_code", "batch_no", "warehouse",
+    "available_quantity", "inspection_quantity", "inspector_code", "inspector_name",
+)
+# child doctype -> (table fieldname on Sub Lot Process, exported fields)
+CHILD_TABLES = {
+    "Sub Lot Process Operations": ("operations", ("operation", "employee_code", "employee_name")),
+    "Rejection Details": ("table_ilhb", ("rejection_type", "quantity")),
+    "Sub Lot Ref Docs": ("table_zhga", ("ref_doctype", "ref_doc")),
+}
+HEADERS = (
+    *PROCESS_FIELDS,
+    "operation", "employee_code", "employee_name",
+    "rejection_type", "rejection_quantity",
+    "ref_doctype", "ref_doc",
+)
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def export(from_date, to_date=None, file_format="csv"):
+    """
+    Export Sub Lot Process records created between two dates.
+
+    Args:
+        from_date (str): First day to export
+        to_date (str): Last day to export, defaults to today
+        file_format (str): "csv" or "xlsx"
+
+    Returns:
+        Response | dict: The file, streamed from a temporary file, or for
+            long ranges status "queued" while a background job writes it
+    """
+    if file_format not in CONTENT_TYPES:
+        frappe.throw(f"Unsupported export format: {file_format}")
+
+    from_date, to_date = getdate(from_date), getdate(to_date or today())
+    sync_days = cint(frappe.conf.get("spp_audit_export_sync_days")) or DEFAULT_SYNC_DAYS
+    if date_diff(to_date, from_date) >= sync_days:
+        frappe.enqueue(
+            "spp.audit_export.export_to_file",
+            queue="long",
+            timeout=4 * 60 * 60,
+            from_date=from_date,
+            to_date=to_date,
+            file_format=file_format,
+        )
+        return {
+            "status": "queued",
+            "message": "The export is being prepared, a download link follows once it is ready",
+        }
+
+    output = tempfile.TemporaryFile()
+    write(output, from_date, to_date, file_format)
+    output.seek(0)
+
+    response = Response(
+        wrap_file(frappe.local.request.environ, output),
+        mimetype=CONTENT_TYPES[file_format],
+        direct_passthrough=True,
+    )
+    response.headers["Content-Disposition"] = f'attachment; filename="{get_file_name(from_date, to_date, file_format)}"'
+    return response
+
+def export_to_file(from_date, to_date, file_format="csv"):
+    """
+    Background job for long exports: write the export into a private File and
+    push its URL to the user through the `spp_audit_export` realtime event.
+    """
+    from_date, to_date = getdate(from_date), getdate(to_date)
+    file_name = get_file_name(from_date, to_date, file_format, unique=True)
+    path = frappe.get_site_path("private", "files", file_name)
+
+    try:
+        with open(path, "wb") as output:
+            write(output, from_date, to_date, file_format)
+
+        file_doc = frappe.get_doc({
+            "doctype": "File",
+            "file_name": file_name,
+            "file_url": f"/private/files/{file_name}",
+            "is_private": 1,
+        }).insert(ignore_permissions=True)
+    except Exception:
+        frappe.log_error(title="Sub Lot Process - Export Failed")
+        frappe.publish_realtime(
+            "spp_audit_export", {"status": "failed", "message": "The export failed"}, user=frappe.session.user
+        )
+        raise
+
+    frappe.publish_realtime(
+        "spp_audit_export",
+        {"status": "success", "file_url": file_doc.file_url, "file_name": file_name},
+        user=frappe.session.user,
+        after_commit=True,
+    )
+
+def write(output, from_date, to_date, file_format):
+    """
+    Write the export of the records created from `from_date` to `to_date`
+    (both included) into the binary file `output`.
+    """
+    rows = iter_rows(from_date, add_days(to_date, 1))
+    if file_format == "xlsx":
+        _write_xlsx(output, rows)
+    else:
+        _write_csv(output, rows)
+
+def get_file_name(from_date, to_date, file_format, unique=False):
+    suffix = f"_{frappe.generate_hash(length=8)}" if unique else ""
+    return f"sub_lot_process_{from_date}_{to_date}{suffix}.{file_format}"
+
+def iter_rows(start, end):
+    """
+    Flat export rows of the Sub Lot Process records created in [start, end).
+    """
+    for tables in _get_sources():
+        yield from _iter_source_rows(start, end, tables)
+
+def _iter_source_rows(start, end, tables):
+    for page in iter_pages(start, end, tables["Sub Lot Process"]):
+        children = _get_children([process[0] for process in page], tables)
+
+        for process in page:
+            entries = [children[doctype].get(process[0], ()) for doctype in CHILD_TABLES]
+            lines = zip_longest(*entries) if any(entries) else [(None, None, None)]
+            for operation, rejection, ref in lines:
+                yield (
+                    *process,
+                    *(operation or (None,) * 3),
+                    *(rejection or (None,) * 2),
+                    *(ref or (None,) * 2),
+                )
+
+def iter_pages(start, end, process, page_size=PAGE_SIZE):
+    """
+    Pages of rows (PROCESS_FIELDS tuples) of the Sub Lot Process table
+    `process` created in [start, end), in (creation, name) order.
+    """
+    query = (
+        frappe.qb.from_(process)
+        .select(*[process[fieldname] for fieldname in PROCESS_FIELDS])
+        .where(process.creation >= start)
+        .where(process.creation < end)
+        .orderby(process.creation)
+        .orderby(process.name)
+        .limit(page_size)
+    )
+
+    last = None
+    while True:
+        page_query = query
+        if last:
+            page_query = page_query.where(
+                (process.creation > last[1]) | ((process.creation == last[1]) & (process.name > last[0]))
+            )
+
+        page = page_query.run()
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+
+        last = page[-1]
+
+def _get_sources():
+    """
+    The archive tables, then the live tables, as doctype -> table.
+    """
+    tables = {doctype: archive.get_tables(doctype) for doctype in ("Sub Lot Process", *CHILD_TABLES)}
+    count = min(len(doctype_tables) for doctype_tables in tables.values())
+
+    return [
+        {doctype: doctype_tables[index] for doctype, doctype_tables in tables.items()}
+        for index in reversed(range(count))
+    ]
+
+def _get_children(names, tables):
+    """
+    doctype -> parent -> list of exported field tuples, in idx order.
+    """
+    children = {}
+    for doctype, (parentfield, fields) in CHILD_TABLES.items():
+        table = tables[doctype]
+        rows = (
+            frappe.qb.from_(table)
+            .select(table.parent, *[table[fieldname] for fieldname in fields])
+            .where(table.parenttype == "Sub Lot Process")
+            .where(table.parentfield == parentfield)
+            .where(table.parent.isin(names))
+            .orderby(table.parent)
+            .orderby(table.idx)
+            .run()
+        )
+
+        by_parent = children[doctype] = {}
+        for row in rows:
+            by_parent.setdefault(row[0], []).append(row[1:])
+
+    return children
+
+def _write_csv(output, rows):
+    text = io.TextIOWrapper(output, encoding="utf-8-sig", newline="")
+    writer = csv.writer(text)
+    writer.writerow(HEADERS)
+    writer.writerows(rows)
+    text.flush()
+    text.detach()
+
+def _write_xlsx(output, rows):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Sub Lot Process")
+    sheet.append(HEADERS)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(output)
@@ -0,0 +1,112 @@
+"""
+Benchmark: native lot validation vs the legacy two-pass validation.
+
+Runs both engines against real lots of a site and reports latency, query
+counts and every field on which the two disagree:
+
+    bench --site <site> execute spp.benchmarks.lot_validation.run \
+        --kwargs "{'lots': ['<spp batch number>', ...], 'iterations': 20}"
+
+Nothing is written: the transaction is rolled back and journal events are
+discarded when the run finishes.
+"""
+
+import frappe
+from frappe.utils import cint, flt
+
+from spp import instrumentation, lot_journal, lot_validation
+
+COMPARED_FIELDS = (
+    "qty", "item_code", "batch_no", "t_warehouse", "bom_no", "from_warehouse",
+    "production_item", "qty_from_item_batch", "spp_batch_number", "bom_operations",
+)
+
+
+def run(lots, iterations=20):
+    """
+    Args:
+        lots (list): SPP batch numbers to validate
+        iterations (int): Runs per lot and engine
+
+    Returns:
+        dict: Latency / query summary per engine and field mismatches per lot
+    """
+    from spp.api import _get_lot_res_validation_data, _get_lot_validation_data, _isolated_response
+
+    if isinstance(lots, str):
+        lots = frappe.parse_json(lots)
+
+    iterations = cint(iterations) or 1
+    legacy_spans, native_spans = [], []
+    mismatches = {}
+
+    try:
+        for lot_no in lots:
+            for _ in range(iterations):
+                with _isolated_response(), instrumentation.span("legacy", store=False) as legacy_span:
+                    lot_data = _get_lot_validation_data(lot_no)
+                    res_data = _get_lot_res_validation_data(lot_no)
+                legacy_spans.append(legacy_span)
+
+                with instrumentation.span("native", store=False) as native_span:
+                    native = lot_validation.validate_lot(lot_no)
+                native_spans.append(native_span)
+
+            diff = _diff(lot_data, res_data, native)
+            if diff:
+                mismatches[lot_no] = diff
+    finally:
+        lot_journal.discard()
+        frappe.db.rollback()
+
+    legacy_summary = _summarize(legacy_spans)
+    native_summary = _summarize(native_spans)
+
+    return {
+        "lots": len(lots),
+        "iterations": iterations,
+        "legacy": legacy_summary,
+        "native": native_summary,
+        "speedup_p50": round(legacy_summary["p50_ms"] / native_summary["p50_ms"], 2) if native_summary["p50_ms"] else None,
+        "mismatches": mismatches,
+    }
+
+def _summarize(spans):
+    durations = sorted(span.duration_ms for span in spans)
+    count = len(spans) or 1
+
+    return {
+        "runs": len(spans),
+        "p50_ms": round(instrumentation.percentile(durations, 50), 3),
+        "p95_ms": round(instrumentation.percentile(durations, 95), 3),
+        "p99_ms": round(instrumentation.percentile(durations, 99), 3),
+        "avg_queries": sum(span.queries for span in spans) / count,
+    }
+
+def _diff(lot_data, res_data, native):
+    """
+    Compare the native result with the legacy pair of validation dicts. The
+    sub-lot validation (`validate_lot`) wins for fields both legacy passes return.
+    """
+    legacy = {}
+    for source in (res_data, lot_data):
+        if isinstance(source, dict):
+            legacy.update(source)
+
+    diff = {}
+    for fieldname in COMPARED_FIELDS:
+        legacy_value = _normalize(fieldname, legacy.get(fieldname))
+        native_value = _normalize(fieldname, native.get(fieldname))
+        if legacy_value != native_value:
+            diff[fieldname] = {"legacy": legacy_value, "native": native_value}
+
+    return diff
+
+def _normalize(fieldname, value):
+    if fieldname in ("qty", "qty_from_item_batch"):
+        return flt(value, 3)
+
+    if fieldname == "bom_operations":
+        return [op.get("operation") for op in value or [] if isinstance(op, dict)]
+
+    return value or None
@@ -0,0 +1,509 @@
+"""
+Benchmark: the lot pipeline, stage by stage.
+
+Generates Items, a BOM with operations, Employees and lots with stock, runs
+`process_lot` for every lot and reports, per stage of the pipeline
+(`create_sub_lot_entry`, `_create_resource_tags_for_operations`,
+`_create_inspection_entry`, `_create_sub_lot_process_record`, ...), the latency
+distribution, queries and rows written:
+
+    bench --site <site> execute spp.benchmarks.pipeline.run \
+        --kwargs "{'lots': 50, 'save_baseline': 'main'}"
+    bench --site <site> execute spp.benchmarks.pipeline.run \
+        --kwargs "{'lots': 50, 'compare_to': 'main'}"
+
+Baselines are saved as JSON under `<site>/spp_benchmarks/`.
+
+On sites without shree_polymer_custom_app the custom app's validation and
+workstation functions are replaced by local stand-ins and its doctypes are
+created as custom doctypes, so the suite runs on a bare test site. The
+stand-in validations are built on `spp.lot_validation` and only approximate
+the cost of the real ones. Generated records are written straight to the
+database and everything the run writes is rolled back; the stand-in doctypes
+are the only thing left behind, except under tests, where `teardown` drops them
+again (creating a table commits implicitly, so a rollback cannot).
+"""
+
+import json
+import os
+import sys
+import types
+
+import frappe
+from frappe.utils import cint, flt, now, nowtime, today
+
+from spp import bom_explosion, employee_directory, instrumentation, lot_journal, lot_validation, uom, workstations
+
+CUSTOM_APP = "shree_polymer_custom_app"
+SUB_LOT_CREATION_MODULE = f"{CUSTOM_APP}.{CUSTOM_APP}.doctype.sub_lot_creation.sub_lot_creation"
+LOT_RESOURCE_TAGGING_MODULE = f"{CUSTOM_APP}.{CUSTOM_APP}.doctype.lot_resource_tagging.lot_resource_tagging"
+
+# Custom app doctypes the pipeline writes to or reads from, as
+# (fieldname, fieldtype[, options]). Child tables come before their parents.
+STAND_IN_DOCTYPES = {
+    "Inspection Entry Item": {
+        "istable": 1,
+        "fields": [("type_of_defect", "Data"), ("rejected_qty", "Float"), ("rejected_qty_kg", "Float")],
+    },
+    "Sub Lot Creation": {
+        "is_submittable": 1,
+        "fields": [
+            ("scan_lot_no", "Data"), ("item_code", "Data"), ("batch_no", "Data"), ("posting_date", "Date"),
+            ("available_qty", "Float"), ("warehouse", "Data"), ("qty", "Float"), ("uom", "Data"),
+            ("first_parent_lot_no", "Data"), ("material_receipt_parent", "Data"), ("sub_lot_no", "Data"),
+        ],
+    },
+    "Lot Resource Tagging": {
+        "is_submittable": 1,
+        "fields": [
+            ("posting_date", "Date"), ("scan_lot_no", "Data"), ("batch_no", "Data"), ("bom_no", "Data"),
+            ("warehouse", "Data"), ("product_ref", "Data"), ("available_qty", "Float"), ("qtynos", "Float"),
+            ("spp_batch_no", "Data"), ("operations", "Small Text"), ("scan_operator", "Data"),
+            ("operator_id", "Data"), ("operation_type", "Data"), ("workstation", "Data"),
+            ("qty_after_rejection_nos", "Float"), ("job_card", "Data"), ("moulding_lot_number", "Data"),
+        ],
+    },
+    "Inspection Entry": {
+        "is_submittable": 1,
+        "fields": [
+            ("posting_date", "Date"), ("inspection_type", "Data"), ("scan_inspector", "Data"),
+            ("inspector_code", "Data"), ("inspector_name", "Data"), ("scan_production_lot", "Data"),
+            ("lot_no", "Data"), ("batch_no", "Data"), ("spp_batch_number", "Data"),
+            ("source_warehouse", "Data"), ("product_ref_no", "Data"), ("total_inspected_qty_nos", "Int"),
+            ("total_inspected_qty", "Float"), ("total_rejected_qty", "Float"),
+            ("total_rejected_qty_in_percentage", "Float"), ("items", "Table", "Inspection Entry Item"),
+        ],
+    },
+    "Item Batch Stock Balance": {
+        "fields": [("item_code", "Data"), ("batch_no", "Data"), ("warehouse", "Data"), ("qty", "Float")],
+    },
+}
+
+# Custom fields the pipeline filters on, as (doctype, fieldname)
+STAND_IN_FIELDS = (("Stock Entry Detail", "spp_batch_number"), ("Employee", "employee_id"))
+SUB_LOT_NO_HOOK = "spp.benchmarks.pipeline.set_sub_lot_no"
+
+# What `setup` installed in this process, for `teardown`
+_installed = {"hook": False, "modules": [], "doctypes": [], "custom_fields": []}
+
+
+def run(lots=50, operations=3, warmup=5, save_baseline=None, compare_to=None):
+    """
+    Args:
+        lots (int): Lots to measure
+        operations (int): Operations (and operators) per lot
+        warmup (int): Extra lots processed first and left out of the figures
+        save_baseline (str): Save the report as this baseline
+        compare_to (str): Compare the report with this baseline
+
+    Returns:
+        dict: Per-stage summary, per-lot totals, failures and, with
+            `compare_to`, the comparison
+    """
+    from spp.api import process_lot
+
+    lots, operations, warmup = cint(lots) or 1, cint(operations) or 1, cint(warmup)
+
+    stand_ins = setup()
+    if not frappe.flags.in_test:
+        # Keep the stand-ins past the rollback below; tests drop them instead
+        frappe.db.commit()
+
+    spans, failures = [], []
+    fixtures = None
+    try:
+        fixtures = make_fixtures(lots + warmup, operations)
+        for idx, payload in enumerate(fixtures["payloads"]):
+            with instrumentation.span("benchmark", store=False) as root:
+                result = process_lot(payload)
+
+            if result.get("status") != "success":
+                failures.append({"lot": payload["batchInfo"]["sppBatchId"], "result": result})
+            if idx >= warmup:
+                spans.append(root)
+    finally:
+        lot_journal.discard()
+        frappe.db.rollback()
+        if fixtures:
+            clear_caches(fixtures)
+        teardown()
+
+    report = {
+        "lots": lots,
+        "operations": operations,
+        "stand_ins": stand_ins,
+        "per_lot": _summarize([root.children[0] for root in spans if root.children]),
+        "stages": summarize_stages(spans),
+        "failures": failures,
+    }
+
+    if compare_to:
+        report["comparison"] = compare(load_baseline(compare_to), report)
+    if save_baseline:
+        report["baseline"] = save(save_baseline, report)
+
+    return report
+
+def setup():
+    """
+    Install stand-ins for whatever part of the custom app is missing.
+
+    Returns:
+        bool: Whether stand-ins are in use
+    """
+    if _custom_app_installed():
+        return False
+
+    _install_stand_in_modules()
+    _install_stand_in_doctypes()
+
+    # The real Sub Lot Creation generates `sub_lot_no` on submit
+    handlers = frappe.get_doc_hooks().setdefault("Sub Lot Creation", {}).setdefault("on_submit", [])
+    if SUB_LOT_NO_HOOK not in handlers:
+        handlers.append(SUB_LOT_NO_HOOK)
+        _installed["hook"] = True
+
+    return True
+
+def teardown():
+    """
+    Undo `setup`: remove the `sub_lot_no` hook and the stand-in modules and,
+    under tests, drop the stand-in doctypes and custom fields it created.
+    """
+    if _installed["hook"]:
+        handlers = frappe.get_doc_hooks().get("Sub Lot Creation", {}).get("on_submit", [])
+        if SUB_LOT_NO_HOOK in handlers:
+            handlers.remove(SUB_LOT_NO_HOOK)
+        _installed["hook"] = False
+
+    for name in reversed(_installed["modules"]):
+        sys.modules.pop(name, None)
+    _installed["modules"].clear()
+
+    if not frappe.flags.in_test:
+        return
+
+    for name in _installed["custom_fields"]:
+        frappe.delete_doc("Custom Field", name, force=True, ignore_permissions=True)
+    # Parents before the child tables they use
+    for doctype in reversed(_installed["doctypes"]):
+        frappe.delete_doc("DocType", doctype, force=True, ignore_permissions=True)
+
+    _installed["custom_fields"].clear()
+    _installed["doctypes"].clear()
+
+def make_fixtures(lots, operations=3):
+    """
+    Write the records the pipeline needs for `lots` lots straight to the
+    database: a compound item with a KG conversion, the product made from it
+    by a default BOM with `operations` operations, one operator per operation
+    plus an inspector, and per lot a finished stock entry and stock balance.
+
+    Returns:
+        dict: `payloads` (one `process_lot` payload per lot) and the generated names
+    """
+    prefix = f"SPPB{frappe.generate_hash(length=5).upper()}"
+    warehouse = f"{prefix} Warehouse"
+    compound, product, bom_no = f"{prefix}-CMP", f"{prefix}-FG", f"{prefix}-BOM"
+    operation_names = [f"{prefix}-OP-{idx}" for idx in range(operations)]
+    employee_ids = [f"{prefix}E{idx}" for idx in range(operations + 1)]
+
+    _insert("Item", [
+        {"name": item_code, "item_code": item_code, "item_name": item_code, "stock_uom": "Nos", "is_stock_item": 1}
+        for item_code in (compound, product)
+    ])
+    _insert("UOM Conversion Detail", [{
+        "name": frappe.generate_hash(length=10), "parent": compound, "parenttype": "Item",
+        "parentfield": "uoms", "idx": 1, "uom": "Kg", "conversion_factor": 2.0,
+    }])
+    _insert("Workstation", [
+        {"name": f"{operation} Station", "workstation_name": f"{operation} Station"}
+        for operation in operation_names
+    ])
+    _insert("Operation", [
+        {"name": operation, "workstation": f"{operation} Station"}
+        for operation in operation_names
+    ])
+    _insert("BOM", [{
+        "name": bom_no, "item": product, "item_name": product, "quantity": 1.0,
+        "is_active": 1, "is_default": 1, "docstatus": 1,
+    }])
+    _insert("BOM Item", [{
+        "name": frappe.generate_hash(length=10), "parent": bom_no, "parenttype": "BOM", "parentfield": "items",
+        "idx": 1, "item_code": compound, "item_name": compound, "qty": 1.0, "stock_qty": 1.0,
+        "uom": "Nos", "stock_uom": "Nos", "docstatus": 1,
+    }])
+    _insert("BOM Operation", [
+        {
+            "name": frappe.generate_hash(length=10), "parent": bom_no, "parenttype": "BOM", "parentfield": "operations",
+            "idx": idx + 1, "operation": operation, "workstation": f"{operation} Station", "docstatus": 1,
+        }
+        for idx, operation in enumerate(operation_names)
+    ])
+    _insert("Employee", [
+        {
+            "name": f"{prefix}-EMP-{idx}", "first_name": f"Operator {idx}", "employee_name": f"Operator {idx}",
+            "employee_id": employee_id, "status": "Active",
+        }
+        for idx, employee_id in enumerate(employee_ids)
+    ])
+
+    lot_nos = [f"{prefix}L{idx:05d}" for idx in range(lots)]
+    _insert("Stock Entry", [
+        {
+            "name": f"{prefix}-SE-{idx}", "purpose": "Manufacture", "stock_entry_type": "Manufacture",
+            "posting_date": today(), "posting_time": nowtime(), "docstatus": 1,
+        }
+        for idx in range(lots)
+    ])
+    _insert("Stock Entry Detail", [
+        {
+            "name": frappe.generate_hash(length=10), "parent": f"{prefix}-SE-{idx}", "parenttype": "Stock Entry",
+            "parentfield": "items", "idx": 1, "item_code": compound, "batch_no": f"{lot_no}B",
+            "stock_uom": "Nos", "t_warehouse": warehouse, "qty": 100.0, "is_finished_item": 1,
+            "spp_batch_number": lot_no, "docstatus": 1,
+        }
+        for idx, lot_no in enumerate(lot_nos)
+    ])
+    _insert("Item Batch Stock Balance", [
+        {"name": f"{lot_no}B", "item_code": compound, "batch_no": f"{lot_no}B", "warehouse": warehouse, "qty": 100.0}
+        for lot_no in lot_nos
+    ])
+
+    payloads = [
+        {
+            "batchInfo": {"sppBatchId": lot_no, "itemCode": compound, "batchNo": f"{lot_no}B", "warehouse": warehouse},
+            "inspectionInfo": {"inspectorCode": employee_ids[-1], "inspectionQuantity": "40"},
+            "operationDetails": [
+                {"operation": operation, "employeeCode": employee_id}
+                for operation, employee_id in zip(operation_names, employee_ids)
+            ],
+            "rejectionDetails": [{"rejectionType": "Flash", "quantity": "2"}],
+        }
+        for lot_no in lot_nos
+    ]
+
+    return {
+        "payloads": payloads,
+        "items": [compound, product],
+        "bom_no": bom_no,
+        "operations": operation_names,
+        "employees": employee_ids,
+    }
+
+def clear_caches(fixtures):
+    """
+    Drop what the run left in the shared caches for the rolled back records.
+    """
+    uom.kg_conversion_cache.invalidate(fixtures["items"])
+    bom_explosion.default_bom_cache.invalidate(fixtures["items"])
+    bom_explosion.explosion_cache.invalidate([fixtures["bom_no"]])
+    workstations.workstation_cache.invalidate(fixtures["operations"])
+    employee_directory.employee_cache.invalidate(fixtures["employees"])
+
+def summarize_stages(spans):
+    """
+    Per-stage summary over the span trees of many lots.
+    """
+    by_stage = {}
+    for root in spans:
+        for node, parent in root.walk():
+            if parent is not None:
+                by_stage.setdefault(node.name, []).append(node)
+
+    return {name: _summarize(nodes) for name, nodes in sorted(by_stage.items())}
+
+def compare(baseline, report, tolerance=0.1):
+    """
+    Compare a report with a baseline. A stage regresses when its p95 grows by
+    more than `tolerance` or it issues more queries or writes more rows.
+
+    Returns:
+        dict: stage -> baseline / current figures and whether it regressed
+    """
+    comparison = {}
+    stages = {"per_lot": baseline.get("per_lot"), **baseline.get("stages", {})}
+    current = {"per_lot": report["per_lot"], **report["stages"]}
+
+    for name in sorted(set(stages) | set(current)):
+        before, after = stages.get(name), current.get(name)
+        if not before or not after:
+            comparison[name] = {"baseline": before, "current": after, "regressed": False}
+            continue
+
+        p95_change = (after["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0.0
+        comparison[name] = {
+            "p95_ms": [before["p95_ms"], after["p95_ms"]],
+            "p95_change": round(p95_change, 3),
+            "avg_queries": [before["avg_queries"], after["avg_queries"]],
+            "avg_rows_written": [before["avg_rows_written"], after["avg_rows_written"]],
+            "regressed": (
+                p95_change > tolerance
+                or after["avg_queries"] > before["avg_queries"]
+                or after["avg_rows_written"] > before["avg_rows_written"]
+            ),
+        }
+
+    return comparison
+
+def save(name, report):
+    path = _baseline_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, "w") as f:
+        json.dump({key: report[key] for key in ("lots", "operations", "stand_ins", "per_lot", "stages")}, f, indent=1, sort_keys=True)
+
+    return path
+
+def load_baseline(name):
+    path = _baseline_path(name)
+    if not os.path.exists(path):
+        frappe.throw(f"No benchmark baseline named {name} at {path}")
+
+    with open(path) as f:
+        return json.load(f)
+
+def set_sub_lot_no(doc, method=None):
+    """
+    Stand-in for the custom app's sub lot numbering: <lot>-<n>.
+    """
+    count = frappe.db.count("Sub Lot Creation", {"scan_lot_no": doc.scan_lot_no, "docstatus": 1})
+    doc.db_set("sub_lot_no", f"{doc.scan_lot_no}-{count}", update_modified=False)
+
+def _summarize(spans):
+    durations = sorted(span.duration_ms for span in spans)
+    count = len(spans) or 1
+
+    return {
+        "count": len(spans),
+        "p50_ms": round(instrumentation.percentile(durations, 50), 3),
+        "p95_ms": round(instrumentation.percentile(durations, 95), 3),
+        "p99_ms": round(instrumentation.percentile(durations, 99), 3),
+        "max_ms": round(durations[-1], 3) if durations else 0.0,
+        "avg_queries": round(sum(span.queries for span in spans) / count, 2),
+        "avg_rows_written": round(sum(span.rows_written for span in spans) / count, 2),
+    }
+
+def _baseline_path(name):
+    return frappe.get_site_path("spp_benchmarks", f"{frappe.scrub(name)}.json")
+
+def _insert(doctype, rows):
+    """
+    Bulk insert fixture rows, bypassing controllers.
+    """
+    if not rows:
+        return
+
+    timestamp = now()
+    user = frappe.session.user
+    fields = ["creation", "modified", "owner", "modified_by", *rows[0]]
+    frappe.db.bulk_insert(
+        doctype,
+        fields=fields,
+        values=[(timestamp, timestamp, user, user, *row.values()) for row in rows],
+    )
+
+def _custom_app_installed():
+    # Not an import check: the stand-in modules would pass it
+    return CUSTOM_APP in frappe.get_installed_apps()
+
+def _install_stand_in_modules():
+    functions = {
+        SUB_LOT_CREATION_MODULE: {"validate_lot": _validate_lot},
+        LOT_RESOURCE_TAGGING_MODULE: {
+            "validate_lot_number": _validate_lot_number,
+            "check_return_workstation": _check_return_workstation,
+        },
+    }
+
+    for module_name, attributes in functions.items():
+        parts = module_name.split(".")
+        for depth in range(1, len(parts) + 1):
+            name = ".".join(parts[:depth])
+            if name not in sys.modules:
+                module = types.ModuleType(name)
+                module.__path__ = []
+                sys.modules[name] = module
+                _installed["modules"].append(name)
+
+        for attribute, function in attributes.items():
+            setattr(sys.modules[module_name], attribute, function)
+
+def _install_stand_in_doctypes():
+    from frappe.custom.doctype.custom_field.custom_field import create_custom_field
+
+    for doctype, spec in STAND_IN_DOCTYPES.items():
+        if frappe.db.exists("DocType", doctype):
+            continue
+
+        frappe.get_doc({
+            "doctype": "DocType",
+            "name": doctype,
+            "module": "Spp",
+            "custom": 1,
+            "autoname": "hash",
+            "istable": spec.get("istable", 0),
+            "is_submittable": spec.get("is_submittable", 0),
+            "fields": [
+                {"fieldname": field[0], "label": frappe.unscrub(field[0]), "fieldtype": field[1], "options": field[2] if len(field) > 2 else None}
+                for field in spec["fields"]
+            ],
+            "permissions": [] if spec.get("istable") else [{
+                "role": "System Manager", "read": 1, "write": 1, "create": 1, "delete": 1,
+                "submit": spec.get("is_submittable", 0), "cancel": spec.get("is_submittable", 0),
+            }],
+        }).insert(ignore_permissions=True)
+        _installed["doctypes"].append(doctype)
+
+    for doctype, fieldname in STAND_IN_FIELDS:
+        if not frappe.db.has_column(doctype, fieldname):
+            field = create_custom_field(doctype, {"fieldname": fieldname, "label": frappe.unscrub(fieldname), "fieldtype": "Data"})
+            if field:
+                _installed["custom_fields"].append(field.name)
+
+def _validate_lot(lot_no, name=None):
+    """
+    Stand-in for the custom app's `validate_lot`, reporting through `frappe.response`.
+    """
+    lot = lot_validation.validate_lot(lot_no)
+    if lot.failed:
+        frappe.response.message = lot.message
+        return
+
+    frappe.response.message = {
+        "qty": lot.qty,
+        "item_code": lot.item_code,
+        "batch_no": lot.batch_no,
+        "stock_uom": lot.stock_uom,
+        "t_warehouse": lot.t_warehouse,
+        "spp_batch_number": lot.spp_batch_number,
+        "first_parent_lot_no": lot.first_parent_lot_no,
+        "material_receipt_parent": lot.material_receipt_parent,
+    }
+
+def _validate_lot_number(barcode):
+    """
+    Stand-in for the custom app's `validate_lot_number`, reporting through `frappe.response`.
+    """
+    lot = lot_validation.validate_lot(barcode)
+    frappe.response.status = lot.status
+    frappe.response.message = lot.message if lot.failed else {
+        "item_code": lot.item_code,
+        "batch_no": lot.batch_no,
+        "from_warehouse": lot.from_warehouse,
+        "qty_from_item_batch": flt(lot.qty_from_item_batch),
+        "spp_batch_number": lot.spp_batch_number,
+        "bom_no": lot.bom_no,
+        "production_item": lot.production_item,
+        "bom_operations": lot.bom_operations,
+    }
+
+def _check_return_workstation(operation):
+    """
+    Stand-in for the custom app's `check_return_workstation`.
+    """
+    workstation = frappe.db.get_value("Operation", operation, "workstation")
+    if not workstation:
+        return {"status": "failed", "message": f"No workstation mapped for {operation}"}
+
+    return {"status": "success", "message": workstation}
@@ -0,0 +1,338 @@
+"""
+Multi-level BOM explosion.
+
+BOM trees are fetched one level at a time: each level is a single query over
+the items of every BOM on that level (joined with the headers of the BOMs they
+point to), followed by one query for the operations of all BOMs involved. The
+tree is then walked in memory, where cycles are detected and quantities are
+rolled up through the levels.
+
+Explosions are materialized in a `SharedCache` per BOM, next to a cache of the
+default BOM of each item, so a read for an (item, default BOM) pair costs two
+cache lookups. BOM `doc_events` - saving or deleting a draft as well as
+submitting, cancelling or updating a submitted BOM - invalidate the changed
+BOM together with every ancestor BOM that uses it and recompute them in the
+background. Costs and rates also change without `doc_events`: the BOM Update
+Tool and the "Update Cost" button write them with `db_update` and bulk
+updates. Submitting a BOM Update Log drops every explosion, a daily job does
+the same after ERPNext's automatic cost update, and explosions expire after
+`spp_bom_explosion_cache_ttl` seconds (site config, default 3600) whatever
+changed them.
+"""
+
+import frappe
+from frappe.utils import cint, flt
+
+from spp.cache import SharedCache
+
+DEFAULT_TTL = 3600
+
+
+def _get_ttl():
+    return cint(frappe.conf.get("spp_bom_explosion_cache_ttl")) or DEFAULT_TTL
+
+explosion_cache = SharedCache("spp:bom_explosion", ttl=_get_ttl, maxsize=256)
+default_bom_cache = SharedCache("spp:default_bom")
+
+
+def get_default_bom(item_code):
+    return frappe.db.get_value("BOM", {"item": item_code, "is_active": 1, "is_default": 1, "docstatus": 1}, "name")
+
+def get_cached_default_bom(item_code):
+    if not item_code:
+        return None
+
+    return default_bom_cache.get(item_code, get_default_bom)
+
+def get_exploded_bom(bom_no, qty=None):
+    """
+    Materialized explosion of a BOM.
+
+    Args:
+        bom_no (str): The root BOM
+        qty (float): Quantity of the root item to roll up for, defaults to
+            the root BOM quantity
+
+    Returns:
+        dict: Same shape as `explode`
+    """
+    exploded = explosion_cache.get(bom_no, explode)
+    if not qty or not exploded["bom_data"]:
+        return exploded
+
+    # Rolled-up quantities are linear in the root quantity
+    factor = flt(qty) / (flt(exploded["bom_data"]["quantity"]) or 1.0)
+    return {
+        **exploded,
+        "tree": [{**node, "required_qty": node["required_qty"] * factor} for node in exploded["tree"]],
+    }
+
+def on_bom_change(doc, method=None, *args, **kwargs):
+    """
+    `doc_events` hook for BOM: drop the explosions of the BOM and of every BOM
+    above it, plus the cached default BOM of its item, and recompute them once
+    the transaction commits.
+    """
+    bom_nos = get_ancestor_boms([doc.name])
+    explosion_cache.invalidate(bom_nos)
+    default_bom_cache.invalidate([doc.item])
+
+    frappe.enqueue(
+        "spp.bom_explosion.refresh_explosions",
+        queue="short",
+        enqueue_after_commit=True,
+        bom_nos=bom_nos,
+    )
+
+def clear_explosion_cache(doc=None, method=None, *args, **kwargs):
+    """
+    Drop every materialized explosion. `doc_events` hook for BOM Update Log
+    and daily scheduled job, for the cost updates that bypass BOM `doc_events`.
+    """
+    explosion_cache.invalidate()
+
+def on_item_update(doc, method=None, *args, **kwargs):
+    """
+    `doc_events` hook for Item: the default BOM of an item is also kept on the
+    item itself, so drop the cached one when the item changes.
+    """
+    default_bom_cache.invalidate([doc.name])
+
+def get_ancestor_boms(bom_nos):
+    """
+    The given BOMs and every BOM that uses one of them at any level, found
+    with one query per level.
+    """
+    seen = set(bom_nos)
+    frontier = list(bom_nos)
+
+    while frontier:
+        parents = frappe.get_all(
+            "BOM Item",
+            filters={"bom_no": ["in", frontier], "parenttype": "BOM"},
+            pluck="parent",
+            distinct=True,
+        )
+        frontier = [parent for parent in parents if parent not in seen]
+        seen.update(frontier)
+
+    return sorted(seen)
+
+def refresh_explosions(bom_nos):
+    """
+    Recompute the materialized explosions of submitted, active BOMs. Other
+    BOMs stay invalidated and are exploded again on their next read.
+    """
+    active = frappe.get_all(
+        "BOM",
+        filters={"name": ["in", bom_nos], "docstatus": 1, "is_active": 1},
+        pluck="name",
+    )
+    if not active:
+        return
+
+    # Rebuilt from committed data, so it must survive this job's commit
+    explosion_cache.invalidate(active, after_commit=False)
+    explosion_cache.get_many(active, lambda keys: {bom_no: explode(bom_no) for bom_no in keys})
+
+def explode(bom_no, qty=None):
+    """
+    Explode a BOM to any depth.
+
+    Args:
+        bom_no (str): The root BOM
+        qty (float): Quantity of the root item to roll up for, defaults to
+            the root BOM quantity
+
+    Returns:
+        dict: `bom_data` (root BOM with all sub-BOMs, as the BOM screens
+            render it), `tree` (flattened nodes in depth-first order with
+            rolled-up quantities) and `cycles` (BOM paths that loop back)
+    """
+    headers = _get_bom_headers([bom_no])
+    if bom_no not in headers:
+        return {"bom_data": None, "tree": [], "cycles": []}
+
+    items_by_bom = {}
+    frontier = [bom_no]
+
+    while frontier:
+        rows = _get_level_items(frontier)
+        frontier = []
+
+        for row in rows:
+            items_by_bom.setdefault(row.parent, []).append(row)
+            if row.bom_no and row.bom_no not in headers and row.child_bom_quantity is not None:
+                headers[row.bom_no] = frappe._dict(
+                    name=row.bom_no,
+                    item=row.item_code,
+                    item_name=row.item_name,
+                    quantity=row.child_bom_quantity,
+                    total_cost=row.child_total_cost,
+                    raw_material_cost=row.child_raw_material_cost,
+                    operating_cost=row.child_operating_cost,
+                )
+                frontier.append(row.bom_no)
+
+    operations_by_bom = _get_operations(list(headers))
+
+    tree = []
+    cycles = []
+    root_qty = flt(qty) or flt(headers[bom_no].quantity) or 1.0
+    _walk(bom_no, root_qty, 0, [bom_no], headers, items_by_bom, tree, cycles)
+
+    return {
+        "bom_data": _as_bom_data(bom_no, headers, items_by_bom, operations_by_bom),
+        "tree": tree,
+        "cycles": cycles,
+    }
+
+def _walk(bom_no, qty, level, path, headers, items_by_bom, tree, cycles):
+    """
+    Depth-first walk of an already fetched BOM tree.
+
+    Args:
+        qty (float): Quantity of the BOM's item required at this point of the tree
+        path (list): BOMs from the root down to `bom_no`, used for cycle detection
+    """
+    bom_qty = flt(headers[bom_no].quantity) or 1.0
+
+    for row in items_by_bom.get(bom_no, []):
+        per_unit = flt(row.stock_qty or row.qty) / bom_qty
+        required_qty = qty * per_unit
+        is_cycle = bool(row.bom_no and row.bom_no in path)
+
+        tree.append({
+            "level": level + 1,
+            "parent_bom": bom_no,
+            "item_code": row.item_code,
+            "item_name": row.item_name,
+            "bom_no": row.bom_no or None,
+            "qty": flt(row.qty),
+            "uom": row.uom,
+            "stock_qty": flt(row.stock_qty),
+            "stock_uom": row.stock_uom,
+            "rate": flt(row.rate),
+            "amount": flt(row.amount),
+            "qty_per_unit": per_unit,
+            "required_qty": required_qty,
+            "is_cycle": is_cycle,
+        })
+
+        if is_cycle:
+            cycles.append(path + [row.bom_no])
+        elif row.bom_no and row.bom_no in headers:
+            _walk(row.bom_no, required_qty, level + 1, path + [row.bom_no], headers, items_by_bom, tree, cycles)
+
+def _get_bom_headers(bom_nos):
+    rows = frappe.get_all(
+        "BOM",
+        filters={"name": ["in", bom_nos]},
+        fields=[
+            "name", "item", "item_name", "quantity", "uom", "company", "is_active", "is_default",
+            "total_cost", "raw_material_cost", "operating_cost",
+        ],
+    )
+
+    return {row.name: row for row in rows}
+
+def _get_level_items(bom_nos):
+    """
+    Items of all `bom_nos` with the header of the BOM each item points to.
+    """
+    return frappe.db.sql(
+        """
+        SELECT
+            bom_item.parent, bom_item.idx, bom_item.item_code, bom_item.item_name, bom_item.description, bom_item.bom_no,
+            bom_item.qty, bom_item.uom, bom_item.stock_qty, bom_item.stock_uom, bom_item.rate, bom_item.amount,
+            child.quantity AS child_bom_quantity, child.total_cost AS child_total_cost,
+            child.raw_material_cost AS child_raw_material_cost, child.operating_cost AS child_operating_cost
+        FROM `tabBOM Item` bom_item
+        LEFT JOIN `tabBOM` child ON child.name = bom_item.bom_no
+        WHERE bom_item.parent IN %(bom_nos)s AND bom_item.parenttype = 'BOM'
+        ORDER BY bom_item.parent, bom_item.idx
+        """,
+        {"bom_nos": tuple(bom_nos)},
+        as_dict=True,
+    )
+
+def _get_operations(bom_nos):
+    rows = frappe.get_all(
+        "BOM Operation",
+        filters={"parent": ["in", bom_nos], "parenttype": "BOM"},
+        fields=["name", "parent", "operation", "workstation", "time_in_mins", "operating_cost"],
+        order_by="parent asc, idx asc",
+    )
+
+    operations_by_bom = {}
+    for row in rows:
+        operations_by_bom.setdefault(row.parent, []).append(row)
+
+    return operations_by_bom
+
+def _as_bom_data(bom_no, headers, items_by_bom, operations_by_bom):
+    """
+    Shape the exploded tree the way the BOM screens render it: the root BOM
+    with its items, and every sub-BOM below it as a flat list.
+    """
+    def items_of(name):
+        return [
+            {
+                "item_code": row.item_code,
+                "item_name": row.item_name,
+                "description": row.description,
+                "bom_no": row.bom_no or None,
+                "qty": flt(row.qty),
+                "uom": row.uom,
+                "stock_qty": flt(row.stock_qty),
+                "stock_uom": row.stock_uom,
+                "rate": flt(row.rate),
+                "amount": flt(row.amount),
+            }
+            for row in items_by_bom.get(name, [])
+        ]
+
+    def operations_of(name):
+        return [
+            {
+                "name": row.name,
+                "operation": row.operation,
+                "workstation": row.workstation,
+                "time_in_mins": flt(row.time_in_mins),
+                "operating_cost": flt(row.operating_cost),
+            }
+            for row in operations_by_bom.get(name, [])
+        ]
+
+    root = headers[bom_no]
+    return {
+        "bom_name": [{"name": bom_no}],
+        "name": bom_no,
+        "item": root.item,
+        "item_name": root.item_name,
+        "is_active": root.is_active,
+        "is_default": root.is_default,
+        "company": root.company,
+        "quantity": flt(root.quantity),
+        "uom": root.uom,
+        "total_cost": flt(root.total_cost),
+        "raw_material_cost": flt(root.raw_material_cost),
+        "operating_cost": flt(root.operating_cost),
+        "items": items_of(bom_no),
+        "operations": operations_of(bom_no),
+        "child_boms": [
+            {
+                "bom_name": name,
+                "item": header.item,
+                "item_name": header.item_name,
+                "quantity": flt(header.quantity),
+                "total_cost": flt(header.total_cost),
+                "raw_material_cost": flt(header.raw_material_cost),
+                "operating_cost": flt(header.operating_cost),
+                "items": items_of(name),
+                "operations": operations_of(name),
+            }
+            for name, header in headers.items()
+            if name != bom_no
+        ],
+    }
@@ -0,0 +1,103 @@
+"""
+Boot data for the /spp React app.
+
+The app only reads the site name, the app versions and the current user from
+`frappe.boot`, so by default the page gets a slim boot with just those
+instead of the full desk boot from `frappe.sessions.get()`. The serialized
+boot is kept in a `SharedCache` per user together with the build version it
+was made for, and dropped when the user logs in or out or their User record
+(and with it their roles) changes - again once the change commits, so a
+request reading the old roles in between cannot cache them. Boots also expire
+after `BOOT_TTL` seconds, bounding how long a change made outside the User
+record stays visible. Set `spp_full_boot` to 1 in site config to get the full
+desk boot back.
+"""
+
+import frappe
+from frappe.utils import cint
+from frappe.utils.change_log import get_versions
+
+from spp.cache import SharedCache
+
+BOOT_TTL = 3600
+
+boot_cache = SharedCache("spp:boot", ttl=BOOT_TTL, local_ttl=30, maxsize=1024)
+
+# Characters that could close the <script> the boot is inlined in, start an
+# HTML entity or end a line for older JS engines. JSON only allows them inside
+# strings, where the escape stands for the same character.
+SCRIPT_ESCAPES = (
+    ("&", "\\u0026"),
+    ("<", "\\u003c"),
+    (">", "\\u003e"),
+    ("\u2028", "\\u2028"),
+    ("\u2029", "\\u2029"),
+)
+
+
+def get_boot_json():
+    """
+    The boot for the current user as a JSON object literal that is safe to
+    inline in a <script> tag.
+    """
+    user = frappe.session.user
+    if user == "Guest":
+        return to_script_json(frappe.website.utils.get_boot_data())
+
+    if cint(frappe.conf.get("spp_full_boot")):
+        try:
+            return to_script_json(frappe.sessions.get())
+        except Exception as e:
+            raise frappe.SessionBootFailed from e
+
+    build_version = frappe.utils.get_build_version()
+
+    def load_boot(user):
+        """The serialized slim boot of `user`, tagged with the current build."""
+        return build_version, to_script_json(get_slim_boot(user))
+
+    cached_version, boot_json = boot_cache.get(user, load_boot)
+    if cached_version != build_version:
+        # Made for a previous build of the app
+        boot_cache.invalidate([user], after_commit=False)
+        cached_version, boot_json = boot_cache.get(user, load_boot)
+
+    return boot_json
+
+def get_slim_boot(user):
+    """
+    The parts of the desk boot the React app uses.
+    """
+    user_info = frappe.db.get_value("User", user, ["full_name", "email", "user_image"], as_dict=True) or {}
+
+    return {
+        "sitename": frappe.local.site,
+        "versions": {app: version["version"] for app, version in get_versions().items()},
+        "user": {
+            "name": user,
+            "full_name": user_info.get("full_name"),
+            "email": user_info.get("email"),
+            "user_image": user_info.get("user_image"),
+            "roles": frappe.get_roles(user),
+        },
+        "lang": frappe.local.lang,
+        "time_zone": frappe.utils.get_system_timezone(),
+    }
+
+def to_script_json(boot):
+    boot_json = frappe.as_json(boot, indent=None, separators=(",", ":"))
+    for character, escape in SCRIPT_ESCAPES:
+        if character in boot_json:
+            boot_json = boot_json.replace(character, escape)
+
+    return boot_json
+
+def clear_boot_cache(login_manager=None):
+    """
+    Drop the cached boot of the user logging in or out.
+    """
+    user = getattr(login_manager, "user", None) or frappe.session.user
+    boot_cache.invalidate([user])
+
+def on_user_update(doc, method=None):
+    boot_cache.invalidate([doc.name])
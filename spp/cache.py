@@ -0,0 +1,191 @@
+"""
+Two-level cache for hot, rarely written lookups.
+
+Values live in a Redis hash shared by every worker of the site, fronted by a
+small in-process LRU so repeat reads in the same worker skip Redis as well.
+Writers call `invalidate` (usually from `doc_events`), which clears Redis and
+the local LRU of the worker doing the write, once straight away and once more
+after the write commits: a reader that reloads the old committed value in
+between would otherwise put it back for good. The LRU entries of other workers
+expire after `local_ttl` seconds.
+"""
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import frappe
+
+# Loader result for a key that must not be cached
+UNCACHED = object()
+
+
+class SharedCache:
+    def __init__(self, namespace, ttl=None, local_ttl=60, maxsize=4096):
+        """
+        Args:
+            namespace (str): Redis hash the values are stored in
+            ttl (int | callable): Seconds a value stays valid, None to keep it
+                until invalidated. May be a callable returning the TTL so it
+                can be read from site config at call time.
+            local_ttl (int): Seconds a value stays in the in-process LRU
+            maxsize (int): Maximum number of entries in the in-process LRU
+        """
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.maxsize = maxsize
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        """
+        Get one value, calling `loader(key)` on a miss.
+        """
+        return self.get_many([key], lambda keys: {k: loader(k) for k in keys})[key]
+
+    def get_many(self, keys, loader):
+        """
+        Get many values at once.
+
+        Args:
+            keys (iterable): Keys to look up
+            loader (callable): Called once with the list of keys missing from
+                both cache levels; returns a dict of key -> value. Keys the
+                loader leaves out are cached as None; keys it maps to
+                `UNCACHED` (e.g. failed lookups) come back as None without
+                being cached.
+
+        Returns:
+            dict: key -> value for every requested key
+        """
+        keys = list(dict.fromkeys(keys))
+        result = self._get_local(keys)
+
+        missing = [key for key in keys if key not in result]
+        if missing:
+            found = self._get_redis(missing)
+            self._set_local(found)
+            result.update(found)
+            missing = [key for key in missing if key not in found]
+
+        if missing:
+            loaded = loader(missing) or {}
+            values = {key: loaded.get(key) for key in missing}
+            cacheable = {key: value for key, value in values.items() if value is not UNCACHED}
+            self._set_redis(cacheable)
+            self._set_local(cacheable)
+            result.update({key: None if value is UNCACHED else value for key, value in values.items()})
+
+        return result
+
+    def invalidate(self, keys=None, after_commit=True):
+        """
+        Drop `keys` (or everything in the namespace) from both levels, now and
+        (unless `after_commit` is False, for values that do not depend on the
+        current transaction) again when the current transaction commits.
+        """
+        keys = None if keys is None else list(keys)
+        self._clear(keys)
+
+        if after_commit and getattr(frappe.local, "db", None):
+            frappe.db.after_commit.add(lambda: self._clear(keys))
+
+    def _clear(self, keys):
+        site = frappe.local.site
+        with self._lock:
+            if keys is None:
+                for local_key in [k for k in self._local if k[0] == site]:
+                    del self._local[local_key]
+            else:
+                for key in keys:
+                    self._local.pop((site, key), None)
+
+        try:
+            pipe = frappe.cache.pipeline()
+            if keys is None:
+                pipe.delete(self._redis_key())
+            elif keys:
+                pipe.hdel(self._redis_key(), *keys)
+            pipe.execute()
+        except Exception:
+            # Redis being down must not block the write that triggered this
+            pass
+
+    def _get_ttl(self):
+        return self.ttl() if callable(self.ttl) else self.ttl
+
+    def _redis_key(self):
+        return frappe.cache.make_key(self.namespace)
+
+    def _get_local(self, keys):
+        site = frappe.local.site
+        now = time.monotonic()
+        found = {}
+
+        with self._lock:
+            for key in keys:
+                entry = self._local.get((site, key))
+                if entry is None:
+                    continue
+                if entry[0] <= now:
+                    del self._local[(site, key)]
+                    continue
+                self._local.move_to_end((site, key))
+                found[key] = entry[1]
+
+        return found
+
+    def _set_local(self, values):
+        if not values:
+            return
+
+        site = frappe.local.site
+        expires_at = time.monotonic() + self.local_ttl
+        ttl = self._get_ttl()
+        if ttl is not None:
+            expires_at = min(expires_at, time.monotonic() + ttl)
+
+        with self._lock:
+            for key, value in values.items():
+                self._local[(site, key)] = (expires_at, value)
+                self._local.move_to_end((site, key))
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+    def _get_redis(self, keys):
+        try:
+            pipe = frappe.cache.pipeline()
+            pipe.hmget(self._redis_key(), keys)
+            blobs = pipe.execute()[0]
+        except Exception:
+            return {}
+
+        now = time.time()
+        found = {}
+        for key, blob in zip(keys, blobs):
+            if blob is None:
+                continue
+            expires_at, value = pickle.loads(blob)
+            if expires_at is None or expires_at > now:
+                found[key] = value
+
+        return found
+
+    def _set_redis(self, values):
+        if not values:
+            return
+
+        ttl = self._get_ttl()
+        expires_at = time.time() + ttl if ttl is not None else None
+
+        try:
+            pipe = frappe.cache.pipeline()
+            pipe.hset(
+                self._redis_key(),
+                mapping={key: pickle.dumps((expires_at, value)) for key, value in values.items()},
+            )
+            pipe.execute()
+        except Exception:
+            pass
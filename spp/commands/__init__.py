@@ -0,0 +1,24 @@
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.command("rebuild-rejection-rollup")
+@click.option("--from-date", help="Only rebuild rejections recorded on or after this date (YYYY-MM-DD)")
+@pass_context
+def rebuild_rejection_rollup(context, from_date=None):
+    "Recompute the Rejection Rollup from Sub Lot Process records"
+    from spp import rejection_rollup
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        rows = rejection_rollup.rebuild(from_date)
+        frappe.db.commit()
+        click.echo(f"Rejection Rollup rebuilt: {rows} rows written")
+    finally:
+        frappe.destroy()
+
+
+commands = [rebuild_rejection_rollup]
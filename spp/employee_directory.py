@@ -0,0 +1,74 @@
+"""
+Employee code -> employee name resolution.
+
+Codes are resolved in one `IN` query per call and kept in a `SharedCache`
+for `spp_employee_cache_ttl` seconds (site config, default 600). Employee
+`doc_events` drop the cached entries when an employee changes.
+"""
+
+import frappe
+from frappe.utils import cint
+
+from spp.cache import SharedCache
+
+DEFAULT_TTL = 600
+
+
+def _get_ttl():
+    return cint(frappe.conf.get("spp_employee_cache_ttl")) or DEFAULT_TTL
+
+employee_cache = SharedCache("spp:employee_name", ttl=_get_ttl, local_ttl=DEFAULT_TTL)
+
+
+def get_employee_name(employee_code):
+    """
+    Get the employee name for an employee code.
+
+    Args:
+        employee_code (str): The employee code (`employee_id` on Employee)
+
+    Returns:
+        str: Employee name, or None if the employee is unknown
+    """
+    if not employee_code:
+        return None
+
+    return get_employee_names([employee_code]).get(employee_code)
+
+def get_employee_names(employee_codes):
+    """
+    Resolve many employee codes with at most one query.
+
+    Args:
+        employee_codes (iterable): Employee codes
+
+    Returns:
+        dict: employee_code -> employee name (None for unknown codes)
+    """
+    employee_codes = [code for code in employee_codes if code]
+    if not employee_codes:
+        return {}
+
+    return employee_cache.get_many(employee_codes, _load_employee_names)
+
+def clear_employee_cache(doc, method=None, *args, **kwargs):
+    """
+    `doc_events` hook for Employee: drop the cached name of the employee,
+    including its previous code if the code itself was changed.
+    """
+    employee_codes = [doc.get("employee_id")]
+
+    previous = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+    if previous:
+        employee_codes.append(previous.get("employee_id"))
+
+    employee_cache.invalidate([code for code in employee_codes if code])
+
+def _load_employee_names(employee_codes):
+    rows = frappe.get_all(
+        "Employee",
+        filters={"employee_id": ["in", employee_codes]},
+        fields=["employee_id", "employee_name"],
+    )
+
+    return {row.employee_id: row.employee_name for row in rows}
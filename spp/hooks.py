@@ -84,6 +84,7 @@ app_license = "mit"
 
 # before_install = "spp.install.before_install"
 # after_install = "spp.install.after_install"
+after_migrate = ["spp.install.after_migrate"]
 
 # Uninstallation
 # ------------
@@ -137,21 +138,59 @@ app_license = "mit"
 # ---------------
 # Hook on document methods and events
 
-# doc_events = {
-# 	"*": {
-# 		"on_update": "method",
-# 		"on_cancel": "method",
-# 		"on_trash": "method"
-# 	}
-# }
+doc_events = {
+	"Item": {
+		"on_update": [
+			"spp.uom.clear_kg_conversion_cache",
+			"spp.bom_explosion.on_item_update",
+		],
+		"on_trash": "spp.uom.clear_kg_conversion_cache",
+		"after_rename": "spp.uom.clear_kg_conversion_cache",
+	},
+	"BOM": {
+		"on_update": "spp.bom_explosion.on_bom_change",
+		"on_submit": "spp.bom_explosion.on_bom_change",
+		"on_cancel": "spp.bom_explosion.on_bom_change",
+		"on_update_after_submit": "spp.bom_explosion.on_bom_change",
+		"on_trash": "spp.bom_explosion.on_bom_change",
+	},
+	"BOM Update Log": {
+		"on_submit": "spp.bom_explosion.clear_explosion_cache",
+	},
+	"Stock Ledger Entry": {
+		"on_submit": "spp.valuation.clear_valuation_rate_cache",
+	},
+	"Employee": {
+		"on_update": "spp.employee_directory.clear_employee_cache",
+		"on_trash": "spp.employee_directory.clear_employee_cache",
+	},
+	"Operation": {
+		"on_update": "spp.workstations.on_workstation_mapping_change",
+		"on_trash": "spp.workstations.on_workstation_mapping_change",
+	},
+	"Workstation": {
+		"on_update": "spp.workstations.on_workstation_mapping_change",
+		"on_trash": "spp.workstations.on_workstation_mapping_change",
+	},
+	"User": {
+		"on_update": "spp.boot.on_user_update",
+		"on_trash": "spp.boot.on_user_update",
+	},
+}
 
 # Scheduled Tasks
 # ---------------
 
-# scheduler_events = {
-# 	"all": [
-# 		"spp.tasks.all"
-# 	],
+scheduler_events = {
+	"all": [
+		"spp.stock_adjustments.post_due"
+	],
+	"daily": [
+		"spp.bom_explosion.clear_explosion_cache"
+	],
+	"daily_long": [
+		"spp.archive.archive_closed_months"
+	],
 # 	"daily": [
 # 		"spp.tasks.daily"
 # 	],
@@ -164,7 +203,7 @@ app_license = "mit"
 # 	"monthly": [
 # 		"spp.tasks.monthly"
 # 	],
-# }
+}
 
 # Testing
 # -------
@@ -197,12 +236,12 @@ app_license = "mit"
 # Request Events
 # ----------------
 # before_request = ["spp.utils.before_request"]
-# after_request = ["spp.utils.after_request"]
+after_request = ["spp.lot_journal.flush_pending"]
 
 # Job Events
 # ----------
 # before_job = ["spp.utils.before_job"]
-# after_job = ["spp.utils.after_job"]
+after_job = ["spp.lot_journal.flush_pending"]
 
 # User Data Protection
 # --------------------
@@ -235,12 +274,16 @@ app_license = "mit"
 # 	"spp.auth.validate"
 # ]
 
+on_session_creation = ["spp.boot.clear_boot_cache"]
+on_logout = ["spp.boot.clear_boot_cache"]
+
 # Automatically update python controller files with type annotations for this app.
 # export_python_type_annotations = True
 
-# default_log_clearing_doctypes = {
-# 	"Logging DocType Name": 30  # days to retain logs
-# }
+default_log_clearing_doctypes = {
+	"Lot Processing Event": 30,  # days to retain logs
+	"Lot Stage Timing": 30,
+}
 
 
 website_route_rules = [{'from_route': '/sppdash/<path:app_path>', 'to_route': 'sppdash'},]
\ No newline at end of file
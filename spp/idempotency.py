@@ -0,0 +1,96 @@
+"""
+Idempotency keys for lot processing.
+
+Stations send an idempotency key with each lot. The first request with a key
+claims it in Redis; repeats of that key within `spp_idempotency_retention`
+seconds (site config, default one day) get the stored result back without
+any validation or document work. Results are only remembered once the
+transaction that produced them commits. Failed results release the key so a
+retry processes the lot again.
+"""
+
+import pickle
+
+import frappe
+from frappe.utils import cint
+
+DEFAULT_RETENTION = 24 * 60 * 60
+# How long a claim stays valid while its request is still running
+CLAIM_TTL = 10 * 60
+
+
+def get_key(data):
+    """
+    The idempotency key of a payload: `idempotencyKey` in the payload, or the
+    `Idempotency-Key` request header.
+    """
+    key = data.get("idempotencyKey")
+    if not key and getattr(frappe.local, "request", None):
+        key = frappe.get_request_header("Idempotency-Key")
+
+    return key or None
+
+def claim(key):
+    """
+    Claim a key for processing.
+
+    Args:
+        key (str): The idempotency key
+
+    Returns:
+        tuple: (True, None) if the caller should process the lot, otherwise
+            (False, response) with the response to return instead
+    """
+    redis_key = _redis_key(key)
+
+    pipe = frappe.cache.pipeline()
+    pipe.set(redis_key, pickle.dumps({"state": "in_progress"}), nx=True, ex=CLAIM_TTL)
+    pipe.get(redis_key)
+    claimed, blob = pipe.execute()
+
+    if claimed or not blob:
+        return True, None
+
+    stored = pickle.loads(blob)
+    if stored.get("state") == "in_progress":
+        return False, {
+            "status": "in_progress",
+            "message": "A request with this idempotency key is still being processed"
+        }
+
+    return False, {**stored["result"], "idempotent_replay": True}
+
+def complete(key, result):
+    """
+    Remember the result of a claimed key.
+
+    Failed results release the key straight away. Everything else, queued
+    (async) results with their job id included, is stored when the
+    transaction commits and released if it rolls back, so a rolled back
+    request never hands out a job that was not queued.
+    """
+    if not key:
+        return
+
+    status = (result or {}).get("status")
+    if status == "failed":
+        release(key)
+    else:
+        frappe.db.after_commit.add(lambda: _store(key, result))
+        frappe.db.after_rollback.add(lambda: release(key))
+
+def release(key):
+    if not key:
+        return
+
+    frappe.cache.pipeline().delete(_redis_key(key)).execute()
+
+def _store(key, result):
+    retention = cint(frappe.conf.get("spp_idempotency_retention")) or DEFAULT_RETENTION
+    frappe.cache.pipeline().set(
+        _redis_key(key), pickle.dumps({"state": "done", "result": result}), ex=retention
+    ).execute()
+
+def _redis_key(key):
+    # Keys are scoped per user so two stations cannot collide on a key
+    return frappe.cache.make_key(f"spp:idempotency:{frappe.session.user}:{key}")
@@ -0,0 +1,39 @@
+import frappe
+
+from spp import archive, valuation
+
+TRACE_INDEXES = (
+    ("Sub Lot Creation", "scan_lot_no"),
+    ("Sub Lot Creation", "sub_lot_no"),
+    ("Lot Resource Tagging", "scan_lot_no"),
+    ("Inspection Entry", "lot_no"),
+)
+
+
+def after_migrate():
+    add_lookup_indexes()
+    archive.sync_archive_tables()
+
+
+def add_lookup_indexes():
+    """
+    Indexes on tables owned by other apps that the spp lookups filter on.
+    Skipped while the owning app (or its custom fields) is not installed.
+    """
+    if frappe.db.has_column("Stock Entry Detail", "spp_batch_number"):
+        frappe.db.add_index("Stock Entry Detail", ["spp_batch_number"])
+
+    # Walked upwards when a BOM changes, see `bom_explosion.get_ancestor_boms`
+    frappe.db.add_index("BOM Item", ["bom_no"])
+
+    # Latest valuation rate lookups, see `spp.valuation`
+    for index_name, fields in valuation.LEDGER_INDEXES.items():
+        frappe.db.add_index("Stock Ledger Entry", fields, index_name=index_name)
+
+    if frappe.db.table_exists("Item Batch Stock Balance"):
+        frappe.db.add_index("Item Batch Stock Balance", ["item_code", "batch_no"])
+
+    # Lot traceability, see `spp.traceability`
+    for doctype, fieldname in TRACE_INDEXES:
+        if frappe.db.table_exists(doctype) and frappe.db.has_column(doctype, fieldname):
+            frappe.db.add_index(doctype, [fieldname])
@@ -0,0 +1,215 @@
+"""
+Per-stage timing for the lot pipeline.
+
+`span` opens a timed stage. The outermost span installs a counter on
+`frappe.db.sql` so every stage records its wall time, the number of SQL
+statements it issued and the rows those statements wrote. When the outermost
+span closes, every stage of the tree is stored as a `Lot Stage Timing` row
+(one bulk insert) so percentiles can be computed per stage over any window.
+Set `spp_record_stage_timings` to 0 in site config to keep the spans in memory
+only. A root span opened with `record=True` also keeps the text of every
+statement, which the query budget tests diff against their snapshots.
+"""
+
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import frappe
+from frappe.utils import add_to_date, now, now_datetime
+
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+TIMING_FIELDS = ("name", "creation", "modified", "owner", "modified_by", "stage", "parent_stage", "reference_name", "duration_ms", "queries", "rows_written")
+
+
+class Span:
+    __slots__ = ("name", "reference", "children", "duration_ms", "queries", "rows_written", "statements")
+
+    def __init__(self, name, reference=None):
+        self.name = name
+        self.reference = reference
+        self.children = []
+        self.duration_ms = 0.0
+        self.queries = 0
+        self.rows_written = 0
+        self.statements = None
+
+    def as_dict(self):
+        return {
+            "stage": self.name,
+            "duration_ms": round(self.duration_ms, 3),
+            "queries": self.queries,
+            "rows_written": self.rows_written,
+            "children": [child.as_dict() for child in self.children],
+        }
+
+    def walk(self, parent=None):
+        yield self, parent
+        for child in self.children:
+            yield from child.walk(self)
+
+
+class _SQLCounter:
+    __slots__ = ("queries", "rows_written", "statements")
+
+    def __init__(self, record=False):
+        self.queries = 0
+        self.rows_written = 0
+        self.statements = [] if record else None
+
+
+@contextmanager
+def span(name, reference=None, store=True, record=False):
+    """
+    Time a pipeline stage.
+
+    Nested spans become children of the enclosing span. The outermost span
+    owns the SQL counter and stores the finished tree.
+
+    Args:
+        name (str): Stage name, e.g. "create_sub_lot_entry"
+        reference (str): Optional lot number the stage works on
+        store (bool): Whether a root span stores its tree in Lot Stage Timing
+        record (bool): Whether a root span keeps the statements issued in
+            `Span.statements` (of itself and every nested span)
+
+    Yields:
+        Span: The span being recorded
+    """
+    stack = getattr(frappe.local, "spp_span_stack", None)
+    is_root = not stack
+
+    if is_root:
+        stack = frappe.local.spp_span_stack = []
+        _install_sql_counter(record)
+
+    counter = frappe.local.spp_sql_counter
+    current = Span(name, reference or (stack[-1].reference if stack else None))
+    if stack:
+        stack[-1].children.append(current)
+    stack.append(current)
+
+    started = time.perf_counter()
+    queries, rows_written = counter.queries, counter.rows_written
+    try:
+        yield current
+    finally:
+        current.duration_ms = (time.perf_counter() - started) * 1000
+        current.queries = counter.queries - queries
+        current.rows_written = counter.rows_written - rows_written
+        if counter.statements is not None:
+            current.statements = counter.statements[queries:]
+        stack.pop()
+
+        if is_root:
+            _uninstall_sql_counter()
+            frappe.local.spp_span_stack = None
+            if store:
+                _store(current)
+
+def stage(func):
+    """
+    Decorator form of `span`, named after the decorated function.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(func.__name__):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+def get_stage_stats(from_datetime=None, to_datetime=None, stage=None):
+    """
+    Per-stage latency percentiles over a time window.
+
+    Percentiles are computed by the database (nearest rank, like
+    `percentile`), so only one row per stage is fetched however many timings
+    the window holds.
+
+    Args:
+        from_datetime (str): Window start, defaults to 24 hours ago
+        to_datetime (str): Window end, defaults to now
+        stage (str): Optional stage name to restrict to
+
+    Returns:
+        list: One dict per stage with count, p50/p95/p99 wall time and
+            average queries / rows written
+    """
+    values = {
+        "from_datetime": from_datetime or add_to_date(now_datetime(), hours=-24),
+        "to_datetime": to_datetime or now_datetime(),
+        "stage": stage,
+    }
+
+    return frappe.db.sql(
+        f"""
+        SELECT DISTINCT
+            `stage`,
+            COUNT(*) OVER (PARTITION BY `stage`) AS `count`,
+            PERCENTILE_DISC(0.5) WITHIN GROUP (ORDER BY `duration_ms`) OVER (PARTITION BY `stage`) AS `p50_ms`,
+            PERCENTILE_DISC(0.95) WITHIN GROUP (ORDER BY `duration_ms`) OVER (PARTITION BY `stage`) AS `p95_ms`,
+            PERCENTILE_DISC(0.99) WITHIN GROUP (ORDER BY `duration_ms`) OVER (PARTITION BY `stage`) AS `p99_ms`,
+            AVG(`queries`) OVER (PARTITION BY `stage`) AS `avg_queries`,
+            AVG(`rows_written`) OVER (PARTITION BY `stage`) AS `avg_rows_written`
+        FROM `tabLot Stage Timing`
+        WHERE `creation` BETWEEN %(from_datetime)s AND %(to_datetime)s
+            {"AND `stage` = %(stage)s" if stage else ""}
+        ORDER BY `p95_ms` DESC
+        """,
+        values,
+        as_dict=True,
+    )
+
+def percentile(sorted_values, percent):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+def _install_sql_counter(record=False):
+    db = frappe.local.db
+    original_sql = db.sql
+    counter = frappe.local.spp_sql_counter = _SQLCounter(record)
+
+    def counting_sql(query, *args, **kwargs):
+        result = original_sql(query, *args, **kwargs)
+        counter.queries += 1
+        if counter.statements is not None:
+            counter.statements.append(str(query))
+
+        if str(query).lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+            cursor = getattr(db, "_cursor", None)
+            counter.rows_written += max(getattr(cursor, "rowcount", 0) or 0, 0)
+
+        return result
+
+    # Shadow the bound method on this connection only; removed again by
+    # `_uninstall_sql_counter`
+    db.sql = counting_sql
+
+def _uninstall_sql_counter():
+    frappe.local.db.__dict__.pop("sql", None)
+
+def _store(root):
+    if not frappe.conf.get("spp_record_stage_timings", 1):
+        return
+
+    timestamp = now()
+    user = frappe.session.user if getattr(frappe.local, "session", None) else "Administrator"
+    values = [
+        (
+            frappe.generate_hash(length=12), timestamp, timestamp, user, user,
+            node.name, parent.name if parent else None, node.reference,
+            node.duration_ms, node.queries, node.rows_written,
+        )
+        for node, parent in root.walk()
+    ]
+
+    try:
+        frappe.db.bulk_insert("Lot Stage Timing", fields=TIMING_FIELDS, values=values)
+    except Exception:
+        frappe.log_error(title="Lot Stage Timing - Store Failed")
@@ -0,0 +1,262 @@
+"""
+Shop floor KPIs: lots processed, inspected quantity, rejection percentage and
+throughput per operation for today, the current shift and this week.
+
+Every period has a Redis hash of counters, incremented when a Sub Lot Process
+commits, so the screens polling `get_kpis` cost a single Redis round trip. A
+hash is (re)seeded from the database when it is missing - e.g. at the start of
+a period, after a Redis restart or for lots processed before the counters
+existed - and every `spp_kpi_reconcile_interval` seconds (site config, default
+600) so drift from deletions or lost increments does not accumulate. Only one
+worker reseeds a period at a time, writing the counters to a temporary key and
+renaming it over the live one, so readers and increments never see a
+half-written hash. A lot committed while a reseed runs can still be counted
+twice (read from the database, then incremented) or not at all (incremented
+just before the rename); the next reconciliation corrects it. When Redis is
+unavailable the KPIs are read from the database.
+
+Shifts come from `spp_shifts` in site config, a list of
+{"name": "A", "start": "06:00", "end": "14:00"}; a shift ending before it
+starts runs past midnight and belongs to the day it started.
+"""
+
+from datetime import datetime, timedelta
+
+import frappe
+from frappe.utils import cint, flt, get_datetime, get_time, now_datetime
+
+DEFAULT_SHIFTS = (
+    {"name": "A", "start": "06:00", "end": "14:00"},
+    {"name": "B", "start": "14:00", "end": "22:00"},
+    {"name": "C", "start": "22:00", "end": "06:00"},
+)
+DEFAULT_RECONCILE_INTERVAL = 600
+# How long a worker may hold a period's reseed lock
+SEED_LOCK_TTL = 30
+SEEDED = "__seeded"
+
+
+def get_kpis(at=None):
+    """
+    KPIs of the periods containing `at` (default: now).
+
+    Returns:
+        dict: "today", "shift" and "week", each with lots, inspected_qty,
+            rejected_qty, rejection_pct and throughput per operation. "shift"
+            is None when no configured shift covers `at`.
+    """
+    at = get_datetime(at) if at else now_datetime()
+    periods = get_periods(at)
+
+    try:
+        counters = _get_counters(periods)
+    except Exception:
+        counters = {key: None for key in periods}
+
+    kpis = {"today": None, "shift": None, "week": None}
+    for key, period in periods.items():
+        values, source = counters[key], "cache"
+        if values is None:
+            values, source = _load_counters(period), "database"
+        kpis[period["kind"]] = _format(period, values, source, at)
+
+    return kpis
+
+def record_process(doc, sign=1):
+    """
+    Count (or with `sign=-1` uncount) a Sub Lot Process in the counters of its
+    periods once the current transaction commits.
+    """
+    at = get_datetime(doc.creation) if doc.creation else now_datetime()
+    increments = {
+        "lots": sign,
+        "inspected_qty": sign * flt(doc.inspection_quantity),
+        "rejected_qty": sign * sum(flt(row.quantity) for row in doc.get("table_ilhb") or []),
+    }
+    for operation in {row.operation for row in doc.get("operations") or [] if row.operation}:
+        increments[f"lots:{operation}"] = sign
+        increments[f"qty:{operation}"] = sign * flt(doc.available_quantity)
+
+    periods = get_periods(at)
+    frappe.db.after_commit.add(lambda: _increment(periods, increments))
+
+def get_periods(at):
+    """
+    The day, shift and ISO week containing `at`, keyed by counter key.
+    """
+    day_start = datetime.combine(at.date(), datetime.min.time())
+    week_start = day_start - timedelta(days=at.weekday())
+    year, week, _ = at.isocalendar()
+
+    periods = {
+        f"day:{at.date()}": {"kind": "today", "start": day_start, "end": day_start + timedelta(days=1)},
+        f"week:{year}-W{week:02d}": {"kind": "week", "start": week_start, "end": week_start + timedelta(days=7)},
+    }
+
+    shift = get_shift(at)
+    if shift:
+        periods[f"shift:{shift['start'].date()}:{shift['name']}"] = {"kind": "shift", **shift}
+
+    return periods
+
+def get_shift(at):
+    """
+    The configured shift running at `at`, with its start and end datetimes.
+    """
+    for shift in frappe.conf.get("spp_shifts") or DEFAULT_SHIFTS:
+        start_time, end_time = get_time(shift["start"]), get_time(shift["end"])
+        # An overnight shift running at `at` may have started the day before
+        for day in (at.date(), at.date() - timedelta(days=1)):
+            start = datetime.combine(day, start_time)
+            end = datetime.combine(day if end_time > start_time else day + timedelta(days=1), end_time)
+            if start <= at < end:
+                return {"name": shift["name"], "start": start, "end": end}
+
+    return None
+
+def _get_counters(periods):
+    """
+    Counters of each period from Redis, reseeding the ones that are missing or
+    due for reconciliation. A period another worker is reseeding comes back
+    as None when it has no counters yet.
+    """
+    keys = list(periods)
+    pipe = frappe.cache.pipeline()
+    for key in keys:
+        pipe.hgetall(_redis_key(key))
+    hashes = dict(zip(keys, pipe.execute()))
+
+    interval = cint(frappe.conf.get("spp_kpi_reconcile_interval")) or DEFAULT_RECONCILE_INTERVAL
+    now = now_datetime().timestamp()
+
+    counters = {}
+    for key, blob in hashes.items():
+        values = {field.decode(): flt(value.decode()) for field, value in blob.items()}
+        seeded_at = values.pop(SEEDED, None)
+        if seeded_at and now - seeded_at < interval:
+            counters[key] = values
+        elif frappe.cache.set(frappe.cache.make_key(f"spp:kpi_seed:{key}"), 1, nx=True, ex=SEED_LOCK_TTL):
+            counters[key] = _seed(key, periods[key])
+        else:
+            counters[key] = values if seeded_at else None
+
+    return counters
+
+def _seed(key, period):
+    values = _load_counters(period)
+
+    redis_key = _redis_key(key)
+    seed_key = f"{redis_key}:seed:{frappe.generate_hash(length=10)}"
+    pipe = frappe.cache.pipeline()
+    pipe.hset(seed_key, mapping={**values, SEEDED: now_datetime().timestamp()})
+    pipe.expireat(seed_key, _expires_at(period))
+    pipe.rename(seed_key, redis_key)
+    pipe.delete(frappe.cache.make_key(f"spp:kpi_seed:{key}"))
+    pipe.execute()
+
+    return values
+
+def _increment(periods, increments):
+    now = now_datetime()
+    try:
+        pipe = frappe.cache.pipeline()
+        for key, period in periods.items():
+            if period["end"] <= now:
+                continue
+
+            redis_key = _redis_key(key)
+            for field, value in increments.items():
+                if isinstance(value, int):
+                    pipe.hincrby(redis_key, field, value)
+                else:
+                    pipe.hincrbyfloat(redis_key, field, value)
+            pipe.expireat(redis_key, _expires_at(period))
+        pipe.execute()
+    except Exception:
+        # The next reconciliation picks the lot up from the database
+        pass
+
+def _load_counters(period):
+    """
+    Counters of a period computed from the database.
+    """
+    bounds = {"start": period["start"], "end": period["end"]}
+
+    lots, inspected_qty = frappe.db.sql(
+        """
+        SELECT COUNT(*), IFNULL(SUM(inspection_quantity), 0)
+        FROM `tabSub Lot Process`
+        WHERE creation >= %(start)s AND creation < %(end)s
+        """,
+        bounds,
+    )[0]
+
+    rejected_qty = frappe.db.sql(
+        """
+        SELECT IFNULL(SUM(rejection.quantity), 0)
+        FROM `tabRejection Details` rejection
+        INNER JOIN `tabSub Lot Process` process ON process.name = rejection.parent
+        WHERE rejection.parenttype = 'Sub Lot Process'
+            AND process.creation >= %(start)s AND process.creation < %(end)s
+        """,
+        bounds,
+    )[0][0]
+
+    values = {"lots": lots, "inspected_qty": flt(inspected_qty), "rejected_qty": flt(rejected_qty)}
+
+    for operation, operation_lots, qty in frappe.db.sql(
+        """
+        SELECT lot.operation, COUNT(*), SUM(lot.available_quantity)
+        FROM (
+            -- One row per lot and operation, for the lots of the period only
+            SELECT DISTINCT process.name, process.available_quantity, operation.operation
+            FROM `tabSub Lot Process` process
+            INNER JOIN `tabSub Lot Process Operations` operation
+                ON operation.parent = process.name AND operation.parenttype = 'Sub Lot Process'
+            WHERE process.creation >= %(start)s AND process.creation < %(end)s
+                AND IFNULL(operation.operation, '') != ''
+        ) lot
+        GROUP BY lot.operation
+        """,
+        bounds,
+    ):
+        values[f"lots:{operation}"] = operation_lots
+        values[f"qty:{operation}"] = flt(qty)
+
+    return values
+
+def _format(period, values, source, at):
+    # Hours of the period elapsed so far, at least a minute
+    hours = max((min(at, period["end"]) - period["start"]).total_seconds(), 60) / 3600
+    inspected_qty = flt(values.get("inspected_qty"))
+    rejected_qty = flt(values.get("rejected_qty"))
+
+    throughput = [
+        {
+            "operation": field[len("lots:"):],
+            "lots": cint(lots),
+            "qty": flt(values.get(f"qty:{field[len('lots:'):]}")),
+            "lots_per_hour": flt(lots / hours, 2),
+        }
+        for field, lots in values.items()
+        if field.startswith("lots:") and lots
+    ]
+
+    return {
+        "name": period.get("name"),
+        "from": period["start"],
+        "to": period["end"],
+        "lots": cint(values.get("lots")),
+        "inspected_qty": inspected_qty,
+        "rejected_qty": rejected_qty,
+        "rejection_pct": flt(rejected_qty * 100 / inspected_qty, 2) if inspected_qty else 0.0,
+        "throughput": sorted(throughput, key=lambda row: row["lots"], reverse=True),
+        "source": source,
+    }
+
+def _expires_at(period):
+    # Keep a finished period around for a day so late readers still hit Redis
+    return int((period["end"] + timedelta(days=1)).timestamp())
+
+def _redis_key(key):
+    return frappe.cache.make_key(f"spp:kpi:{key}")
@@ -0,0 +1,102 @@
+"""
+Buffered journal for lot processing events.
+
+Progress messages from the lot pipeline are kept in memory for the duration of
+the request (or background job) and written to `Lot Processing Event` with a
+single bulk insert by `flush_pending`, once the request or job has committed
+or rolled back, so the events of a failed lot are kept. Events below the configured
+level (`spp_lot_event_level` in site config, default INFO) are dropped without
+touching the database. Failures logged through `error` are also written to
+Error Log so they keep showing up where they always have.
+"""
+
+import frappe
+from frappe.utils import now
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+DEFAULT_LEVEL = "INFO"
+
+EVENT_FIELDS = ("name", "creation", "modified", "owner", "modified_by", "level", "title", "reference_name", "message")
+
+
+def debug(title, message=None, reference=None):
+    log("DEBUG", title, message, reference)
+
+def info(title, message=None, reference=None):
+    log("INFO", title, message, reference)
+
+def warning(title, message=None, reference=None):
+    log("WARNING", title, message, reference)
+
+def error(title, message=None, reference=None):
+    """
+    Journal a failure and record it in Error Log as well.
+    """
+    frappe.log_error(title=title, message=message)
+    log("ERROR", title, message, reference)
+
+def log(level, title, message=None, reference=None):
+    """
+    Buffer an event if it is at or above the configured level.
+
+    Args:
+        level (str): One of DEBUG, INFO, WARNING, ERROR
+        title (str): Short event title, e.g. "Sub Lot Creation - Start"
+        message (str): Optional event details
+        reference (str): Optional lot / document the event relates to
+    """
+    if LEVELS.get(level, 0) < _get_threshold():
+        return
+
+    _get_buffer().append((now(), level, title, message, reference))
+
+def flush():
+    """
+    Write all buffered events with a single bulk insert.
+
+    Returns:
+        int: Number of events written
+    """
+    events = getattr(frappe.local, "spp_lot_events", None)
+    if not events:
+        return 0
+
+    frappe.local.spp_lot_events = []
+    user = frappe.session.user if getattr(frappe.local, "session", None) else "Administrator"
+
+    values = [
+        (frappe.generate_hash(length=12), timestamp, timestamp, user, user, level, (title or "")[:140], reference, message)
+        for timestamp, level, title, message, reference in events
+    ]
+    frappe.db.bulk_insert("Lot Processing Event", fields=EVENT_FIELDS, values=values)
+
+    return len(values)
+
+def discard():
+    """
+    Drop all buffered events without writing them.
+    """
+    frappe.local.spp_lot_events = []
+
+def flush_pending(*args, **kwargs):
+    """
+    `after_request` / `after_job` hook: write the buffered events in their own
+    transaction. These hooks run after the request or job has committed or
+    rolled back its own work.
+    """
+    try:
+        if flush():
+            frappe.db.commit()
+    except Exception:
+        frappe.db.rollback()
+        frappe.log_error(title="Lot Processing Event - Flush Failed")
+
+def _get_buffer():
+    if getattr(frappe.local, "spp_lot_events", None) is None:
+        frappe.local.spp_lot_events = []
+
+    return frappe.local.spp_lot_events
+
+def _get_threshold():
+    level = str(frappe.conf.get("spp_lot_event_level") or DEFAULT_LEVEL).upper()
+    return LEVELS.get(level, LEVELS[DEFAULT_LEVEL])
@@ -0,0 +1,137 @@
+"""
+`available_quantity` / `inspection_quantity` of Sub Lot Process and `quantity`
+of Rejection Details become Float fields.
+
+Runs before the model sync alters the columns: every value is rewritten as a
+fixed-point number, batch by batch. Empty values become 0. Values that do not
+parse, or do not fit the decimal(21,9) column, are copied to the
+`__spp_quantity_quarantine` table, along with the document and field they
+came from, and then set to 0, so no value is lost and strict mode does not
+abort the column type change.
+"""
+
+import re
+from decimal import Decimal, InvalidOperation
+
+import frappe
+from frappe.utils import now
+
+FIELDS = (
+    ("Sub Lot Process", "available_quantity"),
+    ("Sub Lot Process", "inspection_quantity"),
+    ("Rejection Details", "quantity"),
+)
+QUARANTINE_TABLE = "__spp_quantity_quarantine"
+BATCH_SIZE = 5000
+# Values the column type change converts as they are
+PLAIN_NUMBER = re.compile(r"^-?\d+(\.\d+)?$")
+# Float fields are decimal(21,9) columns: 12 integer digits, 9 decimals
+FLOAT_LIMIT = Decimal(10) ** 12
+FLOAT_STEP = Decimal("1e-9")
+
+
+def execute():
+    create_quarantine_table()
+
+    for doctype, fieldname in FIELDS:
+        if frappe.db.table_exists(doctype):
+            convert(doctype, fieldname)
+
+def create_quarantine_table():
+    frappe.db.sql_ddl(
+        f"""
+        CREATE TABLE IF NOT EXISTS `{QUARANTINE_TABLE}` (
+            `id` BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            `reference_doctype` VARCHAR(140) NOT NULL,
+            `reference_name` VARCHAR(140) NOT NULL,
+            `fieldname` VARCHAR(140) NOT NULL,
+            `value` TEXT,
+            `quarantined_on` DATETIME(6) NOT NULL
+        )
+        """
+    )
+
+def convert(doctype, fieldname):
+    """
+    Rewrite one column in batches of `BATCH_SIZE`, walking the table by name.
+    """
+    table = f"tab{doctype}"
+    last_name = ""
+
+    while True:
+        rows = frappe.db.sql(
+            f"""
+            SELECT `name`, `{fieldname}` AS value
+            FROM `{table}`
+            WHERE `name` > %(last_name)s
+            ORDER BY `name`
+            LIMIT {BATCH_SIZE}
+            """,
+            {"last_name": last_name},
+            as_dict=True,
+        )
+        if not rows:
+            break
+
+        last_name = rows[-1].name
+        updates, quarantined = {}, []
+
+        for row in rows:
+            value, ok = parse(row.value)
+            if not ok:
+                quarantined.append((doctype, row.name, fieldname, row.value, now()))
+            if row.value != value:
+                updates[row.name] = value
+
+        if quarantined:
+            frappe.db.sql(
+                f"""
+                INSERT INTO `{QUARANTINE_TABLE}`
+                    (`reference_doctype`, `reference_name`, `fieldname`, `value`, `quarantined_on`)
+                VALUES {", ".join(["(%s, %s, %s, %s, %s)"] * len(quarantined))}
+                """,
+                [value for row in quarantined for value in row],
+            )
+
+        for value, names in group_by_value(updates).items():
+            frappe.db.sql(
+                f"UPDATE `{table}` SET `{fieldname}` = %(value)s WHERE `name` IN %(names)s",
+                {"value": value, "names": tuple(names)},
+            )
+
+        frappe.db.commit()
+
+def parse(value):
+    """
+    Returns:
+        tuple: (the value as a number string the Float column accepts,
+            whether it parsed and fits the column)
+    """
+    if value is None or not str(value).strip():
+        return "0", True
+
+    try:
+        number = Decimal(str(value).strip())
+    except InvalidOperation:
+        return "0", False
+
+    if not number.is_finite() or abs(number) >= FLOAT_LIMIT:
+        return "0", False
+
+    number = number.quantize(FLOAT_STEP)
+    if abs(number) >= FLOAT_LIMIT:
+        return "0", False
+
+    if PLAIN_NUMBER.match(str(value)) and Decimal(value) == number:
+        return value, True
+
+    # Fixed point: the exponent forms str() can produce ("1E-7") are not
+    # plain numbers to the column type change either
+    return f"{number:.9f}", True
+
+def group_by_value(updates):
+    grouped = {}
+    for name, value in updates.items():
+        grouped.setdefault(value, []).append(name)
+
+    return grouped
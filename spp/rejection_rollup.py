@@ -0,0 +1,219 @@
+"""
+Rejection analytics rollup.
+
+`Rejection Rollup` holds one row per (date, item_code, rejection_type,
+operation, employee) with the rejected quantity and the number of rejection
+entries behind it. Rows are named after a hash of their key and updated with
+INSERT ... ON DUPLICATE KEY UPDATE from the Sub Lot Process controller, in the
+same transaction as the process record (an edit subtracts the record as it
+was and adds it as it is). A lot's rejections are not attributed to a single
+operation, so each rejection - its quantity and its entry - is split evenly
+over the lot's operation/operator pairs: totals add up whichever dimensions
+are grouped by.
+Rejections are read from the process record only, as the Inspection Entry
+items of a lot carry the same rejections. `rebuild` also reads the records
+moved to the archive tables (see `spp.archive`).
+"""
+
+import hashlib
+
+import frappe
+from frappe.utils import add_days, flt, getdate, now, today
+
+from spp import archive
+
+DIMENSIONS = ("posting_date", "item_code", "rejection_type", "operation", "employee")
+ROLLUP_FIELDS = ("name", "creation", "modified", "owner", "modified_by", *DIMENSIONS, "quantity", "entries")
+REBUILD_WINDOW_DAYS = 30
+
+
+def add_process(doc, sign=1):
+    """
+    Add (or with `sign=-1` remove) the rejections of a Sub Lot Process.
+    """
+    rejections = [row for row in doc.get("table_ilhb") or [] if flt(row.quantity) > 0]
+    if not rejections:
+        return
+
+    pairs = [(row.operation or "", row.employee_code or "") for row in doc.get("operations") or []] or [("", "")]
+    posting_date = getdate(doc.creation or now())
+
+    totals = {}
+    for rejection in rejections:
+        share = flt(rejection.quantity) / len(pairs)
+        for operation, employee in pairs:
+            key = (posting_date, doc.item_code or "", rejection.rejection_type or "", operation, employee)
+            quantity, entries = totals.get(key, (0.0, 0.0))
+            totals[key] = (quantity + sign * share, entries + sign / len(pairs))
+
+    upsert(totals)
+
+def update_process(doc):
+    """
+    Move the rejections of a saved Sub Lot Process from what they were before
+    the save to what they are now.
+    """
+    before = doc.get_doc_before_save()
+    if before:
+        add_process(before, sign=-1)
+    add_process(doc)
+
+def upsert(totals):
+    """
+    Add quantities and entry counts to rollup rows, creating missing ones.
+
+    Args:
+        totals (dict): (posting_date, item_code, rejection_type, operation,
+            employee) -> (quantity, entries)
+    """
+    if not totals:
+        return
+
+    timestamp = now()
+    user = frappe.session.user
+    rows = [
+        (get_name(key), timestamp, timestamp, user, user, *key, quantity, entries)
+        for key, (quantity, entries) in totals.items()
+    ]
+
+    frappe.db.sql(
+        f"""
+        INSERT INTO `tabRejection Rollup` ({", ".join(f"`{field}`" for field in ROLLUP_FIELDS)})
+        VALUES {", ".join([f"({', '.join(['%s'] * len(ROLLUP_FIELDS))})"] * len(rows))}
+        ON DUPLICATE KEY UPDATE
+            `quantity` = `quantity` + VALUES(`quantity`),
+            `entries` = `entries` + VALUES(`entries`),
+            `modified` = VALUES(`modified`),
+            `modified_by` = VALUES(`modified_by`)
+        """,
+        [value for row in rows for value in row],
+    )
+
+def get_name(key):
+    return hashlib.sha1("\x1f".join(str(part) for part in key).encode()).hexdigest()[:20]
+
+def get_summary(from_date=None, to_date=None, group_by=("rejection_type",), filters=None):
+    """
+    Rejected quantities grouped by any of the rollup dimensions.
+
+    Args:
+        from_date (str): Window start, defaults to 30 days ago
+        to_date (str): Window end, defaults to today
+        group_by (list): Dimensions to group by
+        filters (dict): dimension -> value to restrict to
+
+    Returns:
+        list: One dict per group with the dimensions, `quantity` and `entries`
+    """
+    group_by = [dimension for dimension in group_by if dimension in DIMENSIONS]
+    if not group_by:
+        frappe.throw(f"group_by must name at least one of {', '.join(DIMENSIONS)}")
+
+    rollup = frappe.qb.DocType("Rejection Rollup")
+    query = (
+        frappe.qb.from_(rollup)
+        .select(
+            *[rollup[dimension] for dimension in group_by],
+            frappe.query_builder.functions.Sum(rollup.quantity).as_("quantity"),
+            frappe.query_builder.functions.Sum(rollup.entries).as_("entries"),
+        )
+        .where(rollup.posting_date[getdate(from_date or add_days(today(), -30)):getdate(to_date or today())])
+        .groupby(*[rollup[dimension] for dimension in group_by])
+        .orderby(frappe.query_builder.functions.Sum(rollup.quantity), order=frappe.qb.desc)
+    )
+
+    for dimension, value in (filters or {}).items():
+        if dimension in DIMENSIONS and value:
+            query = query.where(rollup[dimension] == value)
+
+    return query.run(as_dict=True)
+
+def rebuild(from_date=None):
+    """
+    Recompute the rollup from the Sub Lot Process records created on or after
+    `from_date` (all of them by default), one window of days at a time.
+
+    Each window is deleted and recomputed in its own transaction, reading the
+    live records with a locking read: records being inserted in the window
+    are waited for and counted by the rebuild, records inserted after the read
+    wait for its commit and are then added on top, so none is counted twice.
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    sources = _get_sources()
+    firsts = [frappe.db.sql(f"SELECT MIN(`creation`) FROM `{process}`")[0][0] for process, *_ in sources]
+    firsts = [first for first in firsts if first]
+    if not firsts:
+        return 0
+
+    first = getdate(min(firsts))
+    start = max(getdate(from_date), first) if from_date else first
+    if start == first:
+        # Drop rows left over from records that no longer exist
+        frappe.db.delete("Rejection Rollup", {"posting_date": ["<", start]})
+
+    written = 0
+    while start <= getdate(today()):
+        end = add_days(start, REBUILD_WINDOW_DAYS)
+        totals = {}
+        for index, tables in enumerate(sources):
+            # Only the live tables (the first source) take inserts
+            for key, (quantity, entries) in _aggregate(start, end, *tables, lock=index == 0).items():
+                total_quantity, total_entries = totals.get(key, (0.0, 0.0))
+                totals[key] = (total_quantity + quantity, total_entries + entries)
+
+        frappe.db.delete("Rejection Rollup", {"posting_date": ["between", [start, add_days(end, -1)]]})
+        upsert(totals)
+        frappe.db.commit()
+
+        written += len(totals)
+        start = end
+
+    return written
+
+def _get_sources():
+    """
+    (process, rejection, operation) table names, live and archived.
+    """
+    return list(zip(
+        archive.get_table_names("Sub Lot Process"),
+        archive.get_table_names("Rejection Details"),
+        archive.get_table_names("Sub Lot Process Operations"),
+    ))
+
+def _aggregate(start, end, process_table, rejection_table, operation_table, lock=False):
+    rows = frappe.db.sql(
+        f"""
+        SELECT
+            DATE(process.creation) AS posting_date,
+            IFNULL(process.item_code, '') AS item_code,
+            IFNULL(rejection.rejection_type, '') AS rejection_type,
+            IFNULL(operation.operation, '') AS operation,
+            IFNULL(operation.employee_code, '') AS employee,
+            SUM(rejection.quantity / GREATEST(IFNULL(operation_count.pairs, 0), 1)) AS quantity,
+            SUM(1 / GREATEST(IFNULL(operation_count.pairs, 0), 1)) AS entries
+        FROM `{process_table}` process
+        INNER JOIN `{rejection_table}` rejection
+            ON rejection.parent = process.name AND rejection.parenttype = 'Sub Lot Process'
+        LEFT JOIN (
+            SELECT parent, COUNT(*) AS pairs
+            FROM `{operation_table}`
+            WHERE parenttype = 'Sub Lot Process'
+            GROUP BY parent
+        ) operation_count ON operation_count.parent = process.name
+        LEFT JOIN `{operation_table}` operation
+            ON operation.parent = process.name AND operation.parenttype = 'Sub Lot Process'
+        WHERE process.creation >= %(start)s AND process.creation < %(end)s
+            AND rejection.quantity > 0
+        GROUP BY 1, 2, 3, 4, 5
+        {"LOCK IN SHARE MODE" if lock else ""}
+        """,
+        {"start": start, "end": end},
+        as_dict=True,
+    )
+
+    return {
+        (row.posting_date, row.item_code, row.rejection_type, row.operation, row.employee): (flt(row.quantity), flt(row.entries))
+        for row in rows
+    }
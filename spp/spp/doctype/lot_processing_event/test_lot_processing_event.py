@@ -0,0 +1,32 @@
+# Copyright (c) 2026, Alphaworkz and Contributors
+# See license.txt
+
+import frappe
+from frappe.model.base_document import get_controller
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, now_datetime
+
+
+class TestLotProcessingEvent(FrappeTestCase):
+	def test_log_clearing_prunes_old_events(self):
+		days = frappe.get_hooks("default_log_clearing_doctypes")["Lot Processing Event"][-1]
+		old = make_event("old")
+		recent = make_event("recent")
+		frappe.db.set_value(
+			"Lot Processing Event", old, "creation", add_days(now_datetime(), -(days + 1)), update_modified=False
+		)
+
+		# What Log Settings runs for the doctypes registered in the hook
+		get_controller("Lot Processing Event").clear_old_logs(days=days)
+
+		self.assertFalse(frappe.db.exists("Lot Processing Event", old))
+		self.assertTrue(frappe.db.exists("Lot Processing Event", recent))
+
+
+def make_event(title):
+	return frappe.get_doc({
+		"doctype": "Lot Processing Event",
+		"level": "INFO",
+		"title": title,
+		"reference_name": "TEST-LOT",
+	}).insert(ignore_permissions=True).name
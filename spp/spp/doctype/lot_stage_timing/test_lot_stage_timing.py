@@ -0,0 +1,46 @@
+# Copyright (c) 2026, Alphaworkz and Contributors
+# See license.txt
+
+import frappe
+from frappe.model.base_document import get_controller
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, now_datetime
+
+from spp import instrumentation
+
+
+class TestLotStageTiming(FrappeTestCase):
+	def test_log_clearing_prunes_old_timings(self):
+		days = frappe.get_hooks("default_log_clearing_doctypes")["Lot Stage Timing"][-1]
+		old = make_timing("test_stage", 1)
+		recent = make_timing("test_stage", 1)
+		frappe.db.set_value(
+			"Lot Stage Timing", old, "creation", add_days(now_datetime(), -(days + 1)), update_modified=False
+		)
+
+		# What Log Settings runs for the doctypes registered in the hook
+		get_controller("Lot Stage Timing").clear_old_logs(days=days)
+
+		self.assertFalse(frappe.db.exists("Lot Stage Timing", old))
+		self.assertTrue(frappe.db.exists("Lot Stage Timing", recent))
+
+	def test_stage_stats_use_nearest_rank(self):
+		durations = list(range(1, 101))
+		for duration in durations:
+			make_timing("test_stats_stage", duration)
+
+		(stats,) = instrumentation.get_stage_stats(stage="test_stats_stage")
+
+		self.assertEqual(stats.count, 100)
+		for key, percent in (("p50_ms", 50), ("p95_ms", 95), ("p99_ms", 99)):
+			self.assertEqual(stats[key], instrumentation.percentile(durations, percent))
+
+
+def make_timing(stage, duration_ms):
+	return frappe.get_doc({
+		"doctype": "Lot Stage Timing",
+		"stage": stage,
+		"duration_ms": duration_ms,
+		"queries": 1,
+		"rows_written": 0,
+	}).insert(ignore_permissions=True).name
@@ -0,0 +1,8 @@
+// Copyright (c) 2026, Alphaworkz and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("Pending Stock Adjustment", {
+// 	refresh(frm) {
+
+// 	},
+// });
@@ -0,0 +1,13 @@
+# Copyright (c) 2026, Alphaworkz and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class PendingStockAdjustment(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("Pending Stock Adjustment", ["status", "company", "creation"])
@@ -0,0 +1,74 @@
+# Copyright (c) 2026, Alphaworkz and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import today
+
+from spp import rejection_rollup
+
+
+class TestRejectionRollup(FrappeTestCase):
+	def setUp(self):
+		self.item_code = f"_Test Rollup Item {frappe.generate_hash(length=8)}"
+
+	def test_rejection_is_split_over_operators(self):
+		self.make_process([("Trimming", "EMP-1"), ("Deflashing", "EMP-2")], [("Flash", 9)])
+
+		rows = self.get_rows()
+		self.assertEqual(rows[("Flash", "Trimming", "EMP-1")], (4.5, 0.5))
+		self.assertEqual(rows[("Flash", "Deflashing", "EMP-2")], (4.5, 0.5))
+
+		(summary,) = rejection_rollup.get_summary(group_by=["rejection_type"], filters={"item_code": self.item_code})
+		self.assertEqual((summary.rejection_type, summary.quantity, summary.entries), ("Flash", 9, 1))
+
+	def test_edit_and_delete_move_the_totals(self):
+		doc = self.make_process([("Trimming", "EMP-1")], [("Flash", 5)])
+
+		doc.table_ilhb[0].quantity = 3
+		doc.append("table_ilhb", {"rejection_type": "Crack", "quantity": 2})
+		doc.save(ignore_permissions=True)
+		self.assertEqual(self.get_totals(), (5, 2))
+
+		doc.delete(ignore_permissions=True)
+		self.assertEqual(self.get_totals(), (0, 0))
+
+	def test_rebuild_matches_incremental_totals(self):
+		self.make_process([("Trimming", "EMP-1"), ("Deflashing", "EMP-2")], [("Flash", 6), ("Crack", 3)])
+		self.make_process([], [("Flash", 1)])
+		incremental = self.get_rows()
+
+		frappe.db.delete("Rejection Rollup", {"item_code": self.item_code})
+		# Keep the rebuild inside the test transaction
+		with patch.object(frappe.db, "commit"):
+			rejection_rollup.rebuild(from_date=today())
+
+		self.assertEqual(self.get_rows(), incremental)
+
+	def make_process(self, operations, rejections):
+		return frappe.get_doc({
+			"doctype": "Sub Lot Process",
+			"item_code": self.item_code,
+			"spp_batch_number": frappe.generate_hash(length=10),
+			"operations": [{"operation": operation, "employee_code": employee} for operation, employee in operations],
+			"table_ilhb": [{"rejection_type": rejection_type, "quantity": quantity} for rejection_type, quantity in rejections],
+		}).insert(ignore_permissions=True)
+
+	def get_rows(self):
+		rows = {}
+		for row in frappe.get_all(
+			"Rejection Rollup",
+			filters={"item_code": self.item_code},
+			fields=["rejection_type", "operation", "employee", "quantity", "entries"],
+		):
+			rows[(row.rejection_type, row.operation, row.employee)] = (row.quantity, row.entries)
+
+		return rows
+
+	def get_totals(self):
+		rows = frappe.get_all(
+			"Rejection Rollup", filters={"item_code": self.item_code}, fields=["quantity", "entries"]
+		)
+		return (sum(row.quantity for row in rows), sum(row.entries for row in rows))
@@ -4,6 +4,17 @@
 # import frappe
 from frappe.model.document import Document
 
+from spp import kpi, rejection_rollup
+
 
 class SubLotProcess(Document):
-	pass
+	def after_insert(self):
+		kpi.record_process(self)
+
+	def on_update(self):
+		# Also runs on insert, when there is no document before save
+		rejection_rollup.update_process(self)
+
+	def on_trash(self):
+		rejection_rollup.add_process(self, sign=-1)
+		kpi.record_process(self, sign=-1)
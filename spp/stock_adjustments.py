@@ -0,0 +1,219 @@
+"""
+Coalesced stock reconciliation.
+
+When an inspection finds more stock than the system has, the legacy path posts
+a Stock Reconciliation for that one lot straight away, and every submit reposts
+the stock ledger. With `spp_coalesce_stock_reconciliation` set in site config
+the difference is instead reserved as a `Pending Stock Adjustment` and the sub
+lot proceeds against it. The scheduler posts the pending adjustments of each
+company as one multi-row Stock Reconciliation once the oldest of them is
+`spp_stock_adjustment_window` minutes old (default 15); `post_pending` posts
+them on demand, e.g. at the end of a shift.
+"""
+
+from collections import OrderedDict
+
+import frappe
+from erpnext.stock.doctype.batch.batch import get_batch_qty
+from frappe.utils import add_to_date, cint, flt, now_datetime
+
+from spp import lot_journal, valuation
+
+DEFAULT_WINDOW = 15
+
+
+def is_enabled():
+    return bool(cint(frappe.conf.get("spp_coalesce_stock_reconciliation")))
+
+def reserve(item_code, warehouse, batch_no, current_qty, new_qty, reference=None):
+    """
+    Reserve a stock adjustment to be posted with the next coalesced reconciliation.
+
+    Args:
+        item_code (str): Item code
+        warehouse (str): Warehouse
+        batch_no (str): Batch number
+        current_qty (float): Quantity the system has
+        new_qty (float): Quantity found on inspection
+        reference (str): Lot the difference was found on
+
+    Returns:
+        dict: Result of the operation, shaped like `_create_stock_reconciliation`'s
+    """
+    try:
+        adjustment = frappe.get_doc({
+            "doctype": "Pending Stock Adjustment",
+            "status": "Pending",
+            "company": frappe.defaults.get_user_default("company"),
+            "warehouse": warehouse,
+            "item_code": item_code,
+            "batch_no": batch_no,
+            "current_qty": flt(current_qty),
+            "qty_delta": flt(new_qty) - flt(current_qty),
+            "reference_name": reference,
+        })
+        adjustment.insert(ignore_permissions=True)
+
+        lot_journal.info(
+            "Stock Adjustment - Reserved",
+            f"Reserved {adjustment.qty_delta} of {item_code} in {warehouse}, batch {batch_no} as {adjustment.name}",
+            reference=reference
+        )
+
+        return {
+            "status": "success",
+            "message": "Stock adjustment reserved",
+            "adjustment": adjustment.name,
+            "difference": adjustment.qty_delta
+        }
+
+    except Exception as e:
+        lot_journal.error(
+            "Stock Adjustment - Error",
+            f"Error reserving stock adjustment: {str(e)}\n{frappe.get_traceback()}",
+            reference=reference
+        )
+        return {
+            "status": "failed",
+            "message": f"Error reserving stock adjustment: {str(e)}"
+        }
+
+def post_due():
+    """
+    Scheduler job: post the pending adjustments of every company whose oldest
+    pending adjustment has waited for the coalescing window.
+    """
+    window = cint(frappe.conf.get("spp_stock_adjustment_window")) or DEFAULT_WINDOW
+    cutoff = add_to_date(now_datetime(), minutes=-window)
+
+    companies = frappe.get_all(
+        "Pending Stock Adjustment",
+        filters={"status": "Pending", "creation": ["<=", cutoff]},
+        pluck="company",
+        distinct=True,
+    )
+
+    for company in companies:
+        post_pending(company)
+        frappe.db.commit()
+
+def post_pending(company=None, include_failed=False):
+    """
+    Post pending adjustments as one Stock Reconciliation per company.
+
+    The reconciled quantity of each (warehouse, item, batch) is its current
+    batch quantity plus the sum of its pending deltas.
+
+    Args:
+        company (str): Only post adjustments of this company
+        include_failed (bool): Retry adjustments whose last posting failed
+
+    Returns:
+        dict: company -> name of the reconciliation posted, or the error
+    """
+    filters = {"status": ["in", ["Pending", "Failed"] if include_failed else ["Pending"]]}
+    if company:
+        filters["company"] = company
+
+    # Lock the rows so two runs cannot post the same adjustment twice
+    adjustments = frappe.get_all(
+        "Pending Stock Adjustment",
+        filters=filters,
+        fields=["name", "company", "warehouse", "item_code", "batch_no", "qty_delta"],
+        order_by="creation asc",
+        for_update=True,
+    )
+
+    by_company = OrderedDict()
+    for adjustment in adjustments:
+        by_company.setdefault(adjustment.company, []).append(adjustment)
+
+    results = {}
+    for company, rows in by_company.items():
+        save_point = "spp_stock_adjustment"
+        frappe.db.savepoint(save_point)
+
+        names = [row.name for row in rows]
+        try:
+            reconciliation = _post_reconciliation(company, rows)
+        except Exception as e:
+            frappe.db.rollback(save_point=save_point)
+            lot_journal.error(
+                "Stock Adjustment - Posting Failed",
+                f"Error posting {len(rows)} stock adjustments of {company}: {str(e)}\n{frappe.get_traceback()}"
+            )
+            _set_status(names, "Failed", error=str(e))
+            results[company] = {"status": "failed", "message": str(e)}
+            continue
+
+        frappe.db.release_savepoint(save_point)
+        _set_status(names, "Posted", stock_reconciliation=reconciliation)
+        results[company] = {"status": "success", "reconciliation": reconciliation, "adjustments": len(names)}
+
+    lot_journal.flush()
+
+    return results
+
+def get_reserved_qty(item_code, warehouse, batch_no):
+    """
+    Sum of the adjustments of a batch that are reserved but not posted yet.
+    """
+    return flt(frappe.db.get_value(
+        "Pending Stock Adjustment",
+        {"status": "Pending", "item_code": item_code, "warehouse": warehouse, "batch_no": batch_no},
+        "sum(qty_delta)",
+    ))
+
+def _post_reconciliation(company, rows):
+    deltas = OrderedDict()
+    for row in rows:
+        key = (row.warehouse, row.item_code, row.batch_no)
+        deltas[key] = deltas.get(key, 0.0) + flt(row.qty_delta)
+
+    sr = frappe.new_doc("Stock Reconciliation")
+    sr.purpose = "Stock Reconciliation"
+    sr.set_posting_time = 1
+    sr.posting_date = frappe.utils.today()
+    sr.posting_time = frappe.utils.nowtime()
+    sr.company = company
+
+    for (warehouse, item_code, batch_no), delta in deltas.items():
+        if not delta:
+            continue
+
+        current_qty = flt(get_batch_qty(batch_no=batch_no, warehouse=warehouse, item_code=item_code))
+        sr.append("items", {
+            "item_code": item_code,
+            "warehouse": warehouse,
+            "use_serial_batch_fields": 1,
+            "batch_no": batch_no,
+            "qty": current_qty + delta,
+            "valuation_rate": valuation.get_valuation_rate(item_code, warehouse, batch_no)
+        })
+
+    if not sr.items:
+        return None
+
+    sr.flags.ignore_permissions = True
+    sr.flags.ignore_links = True
+    sr.insert()
+    sr.submit()
+
+    lot_journal.info(
+        "Stock Adjustment - Posted",
+        f"Stock reconciliation {sr.name} posted {len(sr.items)} rows for {len(rows)} adjustments of {company}"
+    )
+
+    return sr.name
+
+def _set_status(names, status, stock_reconciliation=None, error=None):
+    adjustment = frappe.qb.DocType("Pending Stock Adjustment")
+    (
+        frappe.qb.update(adjustment)
+        .set(adjustment.status, status)
+        .set(adjustment.stock_reconciliation, stock_reconciliation)
+        .set(adjustment.error, error)
+        .set(adjustment.modified, now_datetime())
+        .where(adjustment.name.isin(names))
+        .run()
+    )
@@ -0,0 +1,83 @@
+# Copyright (c) 2026, Alphaworkz and Contributors
+# See license.txt
+
+from datetime import datetime
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from spp import kpi
+
+
+class TestKPI(FrappeTestCase):
+    def test_periods_of_a_day_shift(self):
+        at = datetime(2026, 10, 17, 9, 30)
+        periods = kpi.get_periods(at)
+
+        self.assertEqual(
+            periods["day:2026-10-17"],
+            {"kind": "today", "start": datetime(2026, 10, 17), "end": datetime(2026, 10, 18)},
+        )
+        self.assertEqual(
+            periods["week:2026-W42"],
+            {"kind": "week", "start": datetime(2026, 10, 12), "end": datetime(2026, 10, 19)},
+        )
+        self.assertEqual(
+            periods["shift:2026-10-17:A"],
+            {"kind": "shift", "name": "A", "start": datetime(2026, 10, 17, 6), "end": datetime(2026, 10, 17, 14)},
+        )
+
+    def test_overnight_shift_belongs_to_the_day_it_started(self):
+        shift = {"name": "C", "start": datetime(2026, 10, 16, 22), "end": datetime(2026, 10, 17, 6)}
+
+        self.assertEqual(kpi.get_shift(datetime(2026, 10, 16, 23, 0)), shift)
+        self.assertEqual(kpi.get_shift(datetime(2026, 10, 17, 5, 59)), shift)
+        self.assertIn("shift:2026-10-16:C", kpi.get_periods(datetime(2026, 10, 17, 3, 0)))
+
+    def test_shift_bounds(self):
+        self.assertEqual(kpi.get_shift(datetime(2026, 10, 17, 14, 0))["name"], "B")
+        self.assertEqual(kpi.get_shift(datetime(2026, 10, 17, 6, 0))["name"], "A")
+
+    def test_no_shift_outside_the_configured_ones(self):
+        with patch.dict(frappe.conf, {"spp_shifts": [{"name": "Day", "start": "08:00", "end": "17:00"}]}):
+            self.assertIsNone(kpi.get_shift(datetime(2026, 10, 17, 20, 0)))
+            self.assertEqual(
+                [period["kind"] for period in kpi.get_periods(datetime(2026, 10, 17, 20, 0)).values()],
+                ["today", "week"],
+            )
+
+    def test_format(self):
+        period = {"kind": "shift", "name": "A", "start": datetime(2026, 10, 17, 6), "end": datetime(2026, 10, 17, 14)}
+        values = {
+            "lots": 6,
+            "inspected_qty": 400.0,
+            "rejected_qty": 10.0,
+            "lots:Trimming": 4,
+            "qty:Trimming": 300.0,
+            "lots:Deflashing": 2,
+            "qty:Deflashing": 100.0,
+            "lots:Buffing": 0,
+        }
+
+        kpis = kpi._format(period, values, "cache", datetime(2026, 10, 17, 8))
+
+        self.assertEqual(kpis["lots"], 6)
+        self.assertEqual(kpis["rejection_pct"], 2.5)
+        self.assertEqual(kpis["source"], "cache")
+        self.assertEqual(
+            kpis["throughput"],
+            [
+                {"operation": "Trimming", "lots": 4, "qty": 300.0, "lots_per_hour": 2.0},
+                {"operation": "Deflashing", "lots": 2, "qty": 100.0, "lots_per_hour": 1.0},
+            ],
+        )
+
+    def test_format_of_an_empty_period(self):
+        period = {"kind": "today", "start": datetime(2026, 10, 17), "end": datetime(2026, 10, 18)}
+
+        kpis = kpi._format(period, {}, "database", datetime(2026, 10, 17))
+
+        self.assertEqual(kpis["lots"], 0)
+        self.assertEqual(kpis["rejection_pct"], 0.0)
+        self.assertEqual(kpis["throughput"], [])
@@ -0,0 +1,39 @@
+# Copyright (c) 2026, Alphaworkz and Contributors
+# See license.txt
+
+from frappe.tests.utils import FrappeTestCase
+
+from spp.benchmarks import pipeline
+
+STAGES = (
+    "create_sub_lot_entry",
+    "_create_resource_tags_for_operations",
+    "_create_inspection_entry",
+    "_create_sub_lot_process_record",
+)
+
+
+class TestPipelineBenchmark(FrappeTestCase):
+    def test_run_reports_every_stage(self):
+        report = pipeline.run(lots=3, operations=2, warmup=1)
+
+        self.assertEqual(report["failures"], [])
+        self.assertEqual(report["per_lot"]["count"], 3)
+        self.assertGreater(report["per_lot"]["avg_rows_written"], 0)
+
+        for stage in STAGES:
+            self.assertIn(stage, report["stages"])
+        self.assertEqual(report["stages"]["_create_resource_tags_for_operations"]["count"], 6)
+
+    def test_compare_flags_regressions(self):
+        figures = {"p95_ms": 10.0, "avg_queries": 20, "avg_rows_written": 5}
+        baseline = {"per_lot": figures, "stages": {"create_sub_lot_entry": figures}}
+        report = {
+            "per_lot": {**figures, "p95_ms": 10.5},
+            "stages": {"create_sub_lot_entry": {**figures, "avg_queries": 21}},
+        }
+
+        comparison = pipeline.compare(baseline, report)
+
+        self.assertFalse(comparison["per_lot"]["regressed"])
+        self.assertTrue(comparison["create_sub_lot_entry"]["regressed"])
@@ -0,0 +1,137 @@
+# Copyright (c) 2026, Alphaworkz and Contributors
+# See license.txt
+
+"""
+Query budgets for the whitelisted endpoints of `spp.api`.
+
+Every endpoint runs against fresh fixtures from `spp.benchmarks.pipeline` (so
+lookups start from cold caches) inside a recording span. The test fails when
+the endpoint issues more statements or more write statements than its budget
+in `BUDGETS`, listing the statements it issued, or their diff against the
+endpoint's snapshot in `query_snapshots/` when there is one. Run with
+SPP_UPDATE_QUERY_SNAPSHOTS=1 to write the snapshots, and lower a budget when
+an endpoint gets cheaper.
+"""
+
+import difflib
+import os
+import re
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from spp import api, instrumentation
+from spp.benchmarks import pipeline
+
+# endpoint -> maximum statements / write statements per call, with the
+# fixtures of `setUp` (two lots of two operations each)
+BUDGETS = {
+    "scan_batch": {"queries": 3, "writes": 0},
+    "get_multi_level_bom": {"queries": 8, "writes": 0},
+    "create_lot_resource_taggings": {"queries": 90, "writes": 24},
+    "process_lot": {"queries": 260, "writes": 70},
+    "process_lots": {"queries": 520, "writes": 140},
+}
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(__file__), "query_snapshots")
+
+
+def normalize(statement):
+    """
+    Statement text without literals and formatting, so snapshots only change
+    when the statements themselves do.
+    """
+    statement = re.sub(r"\s+", " ", statement).strip()
+    statement = re.sub(r"'(?:[^'\\]|\\.)*'", "?", statement)
+    statement = re.sub(r"\b\d+(?:\.\d+)?\b", "?", statement)
+    return re.sub(r"\(\?(?:, ?\?)*\)", "(?...)", statement)
+
+
+class TestQueryBudgets(FrappeTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        pipeline.setup()
+
+    @classmethod
+    def tearDownClass(cls):
+        pipeline.teardown()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.fixtures = pipeline.make_fixtures(2, operations=2)
+
+    def tearDown(self):
+        pipeline.clear_caches(self.fixtures)
+        frappe.db.rollback()
+
+    def test_scan_batch(self):
+        lot_no = self.fixtures["payloads"][0]["batchInfo"]["sppBatchId"]
+        self.assertWithinBudget("scan_batch", lambda: api.scan_batch(lot_no))
+
+    def test_get_multi_level_bom(self):
+        self.assertWithinBudget("get_multi_level_bom", lambda: api.get_multi_level_bom(bom_no=self.fixtures["bom_no"]))
+
+    def test_create_lot_resource_taggings(self):
+        payload = self.fixtures["payloads"][0]
+        data = {
+            "scan_lot_no": f"{payload['batchInfo']['sppBatchId']}-1",
+            "batch_no": payload["batchInfo"]["batchNo"],
+            "bom_no": self.fixtures["bom_no"],
+            "available_qty": 100,
+            "operations": ",".join(self.fixtures["operations"]),
+            "rows": [
+                {"operation_type": op["operation"], "operator_id": op["employeeCode"]}
+                for op in payload["operationDetails"]
+            ],
+        }
+        self.assertWithinBudget("create_lot_resource_taggings", lambda: api.create_lot_resource_taggings(data))
+
+    def test_process_lot(self):
+        payload = self.fixtures["payloads"][0]
+        self.assertWithinBudget("process_lot", lambda: api.process_lot(payload))
+
+    def test_process_lots(self):
+        payloads = self.fixtures["payloads"]
+        self.assertWithinBudget("process_lots", lambda: api.process_lots(payloads))
+
+    def assertWithinBudget(self, endpoint, call):
+        with instrumentation.span(endpoint, store=False, record=True) as span:
+            call()
+
+        statements = [normalize(statement) for statement in span.statements]
+        snapshot = get_snapshot(endpoint, statements)
+        budget = BUDGETS[endpoint]
+
+        writes = count_writes(statements)
+        if len(statements) <= budget["queries"] and writes <= budget["writes"]:
+            return
+
+        if snapshot is None:
+            details = "\n".join(statements)
+        else:
+            details = "\n".join(difflib.unified_diff(snapshot, statements, "snapshot", endpoint, lineterm=""))
+        self.fail(
+            f"{endpoint} issued {len(statements)} statements ({writes} writes), "
+            f"budget is {budget['queries']} ({budget['writes']} writes):\n{details}"
+        )
+
+
+def count_writes(statements):
+    return sum(statement.upper().startswith(instrumentation.WRITE_STATEMENTS) for statement in statements)
+
+def get_snapshot(endpoint, statements):
+    """
+    The recorded statements of an endpoint, or None when it has no snapshot.
+    With SPP_UPDATE_QUERY_SNAPSHOTS set, `statements` are recorded first.
+    """
+    path = os.path.join(SNAPSHOT_DIR, f"{endpoint}.sql")
+    if os.environ.get("SPP_UPDATE_QUERY_SNAPSHOTS"):
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        with open(path, "w") as f:
+            f.write("\n".join(statements) + "\n")
+    elif not os.path.exists(path):
+        return None
+
+    with open(path) as f:
+        return f.read().splitlines()
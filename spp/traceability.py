@@ -0,0 +1,134 @@
+"""
+Lot traceability.
+
+Given a lot, a sub lot or the name of any document the pipeline created,
+`get_trace` returns the whole chain - Sub Lot Process, Sub Lot Creation,
+Lot Resource Tagging, Inspection Entry and Stock Reconciliation (or the
+Pending Stock Adjustment waiting for one) - with one batched query per
+doctype, however many sub lots and documents the chain holds. Sub Lot Process
+records moved to the archive tables (see `spp.archive`) are found as well.
+Chain documents are read with the permissions of the current user: a doctype
+they cannot read comes back as an empty list, and user permissions restrict
+the documents listed.
+"""
+
+import frappe
+
+from spp import archive
+
+CHAIN_FIELDS = {
+    "Sub Lot Creation": ["name", "docstatus", "posting_date", "scan_lot_no", "sub_lot_no", "item_code", "batch_no", "qty", "warehouse"],
+    "Lot Resource Tagging": ["name", "docstatus", "posting_date", "scan_lot_no", "operation_type", "operator_id", "workstation", "batch_no"],
+    "Inspection Entry": ["name", "docstatus", "posting_date", "lot_no", "inspector_code", "total_inspected_qty", "total_rejected_qty"],
+    "Stock Reconciliation": ["name", "docstatus", "posting_date", "posting_time", "company"],
+    "Pending Stock Adjustment": ["name", "status", "creation", "reference_name", "item_code", "warehouse", "batch_no", "qty_delta", "stock_reconciliation"],
+}
+
+
+def get_trace(value):
+    """
+    Trace a lot through the pipeline.
+
+    Args:
+        value (str): SPP batch number, sub lot number, or the name of a
+            Sub Lot Process or of a document it references
+
+    Returns:
+        dict: `processes` (Sub Lot Process with their references), and one
+            list per doctype of the chain
+    """
+    processes = _get_processes(value)
+    refs = _get_refs([process.name for process in processes])
+
+    for process in processes:
+        process.refs = [ref for ref in refs if ref.parent == process.name]
+
+    lots = {value} | {process.spp_batch_number for process in processes if process.spp_batch_number}
+    sub_lots = {value} | {process.sub_lot_number for process in processes if process.sub_lot_number}
+    ref_docs = {value} | {ref.ref_doc for ref in refs}
+
+    sub_lot_creations = _get_chain("Sub Lot Creation", ref_docs, [("scan_lot_no", lots), ("sub_lot_no", sub_lots)])
+    sub_lots |= {doc.sub_lot_no for doc in sub_lot_creations if doc.sub_lot_no}
+
+    adjustments = _get_chain("Pending Stock Adjustment", ref_docs, [("reference_name", lots)])
+
+    return {
+        "value": value,
+        "processes": processes,
+        "sub_lot_creations": sub_lot_creations,
+        "resource_tags": _get_chain("Lot Resource Tagging", ref_docs, [("scan_lot_no", sub_lots)]),
+        "inspection_entries": _get_chain("Inspection Entry", ref_docs, [("lot_no", sub_lots)]),
+        "stock_reconciliations": _get_chain(
+            "Stock Reconciliation",
+            ref_docs | {doc.stock_reconciliation for doc in adjustments if doc.stock_reconciliation},
+        ),
+        "stock_adjustments": adjustments,
+    }
+
+def _get_processes(value):
+    processes = []
+    for process, ref in zip(archive.get_tables("Sub Lot Process"), archive.get_tables("Sub Lot Ref Docs")):
+        referencing = (
+            frappe.qb.from_(ref)
+            .select(ref.parent)
+            .where(ref.parenttype == "Sub Lot Process")
+            .where(ref.ref_doc == value)
+        )
+
+        processes += (
+            frappe.qb.from_(process)
+            .select(
+                process.name, process.creation, process.spp_batch_number, process.sub_lot_number,
+                process.batch_no, process.item_code, process.warehouse,
+                process.available_quantity, process.inspection_quantity, process.inspector_code,
+            )
+            .where(
+                (process.spp_batch_number == value)
+                | (process.sub_lot_number == value)
+                | (process.name == value)
+                | process.name.isin(referencing)
+            )
+            .orderby(process.creation)
+            .run(as_dict=True)
+        )
+
+    return sorted(processes, key=lambda process: process.creation)
+
+def _get_refs(process_names):
+    if not process_names:
+        return []
+
+    refs = []
+    for ref in archive.get_tables("Sub Lot Ref Docs"):
+        refs += (
+            frappe.qb.from_(ref)
+            .select(ref.parent, ref.ref_doctype, ref.ref_doc)
+            .where(ref.parenttype == "Sub Lot Process")
+            .where(ref.parent.isin(process_names))
+            .orderby(ref.parent)
+            .orderby(ref.idx)
+            .run(as_dict=True)
+        )
+
+    return refs
+
+def _get_chain(doctype, names, links=()):
+    """
+    Documents of `doctype` the current user can read, named in `names` or
+    linked through one of `links`, given as (fieldname, values), in a single
+    query.
+    """
+    if not frappe.has_permission(doctype, "read"):
+        return []
+
+    or_filters = [["name", "in", list(names)]]
+    for fieldname, values in links:
+        or_filters.append([fieldname, "in", list(values)])
+
+    return frappe.get_list(
+        doctype,
+        fields=CHAIN_FIELDS[doctype],
+        or_filters=or_filters,
+        order_by="creation asc",
+        limit_page_length=0,
+    )
@@ -0,0 +1,85 @@
+"""
+KG conversion factors for items.
+
+Items are read on every lot but almost never written, so the factor for each
+item is kept in a `SharedCache` and invalidated through Item `doc_events`.
+"""
+
+import frappe
+
+from spp import lot_journal
+from spp.cache import SharedCache
+
+KG_UOMS = ("kg", "kgs", "kilogram", "kilograms")
+
+kg_conversion_cache = SharedCache("spp:kg_conversion_factor")
+
+
+def get_kg_conversion_factor(item_code):
+    """
+    Get the KG conversion factor for an item.
+
+    Args:
+        item_code (str): The item code
+
+    Returns:
+        float: Conversion factor for KG, 1.0 if the item has none
+    """
+    if not item_code:
+        return 1.0
+
+    return get_kg_conversion_factors([item_code])[item_code]
+
+def get_kg_conversion_factors(item_codes):
+    """
+    Get the KG conversion factors for many items with at most one query.
+
+    Args:
+        item_codes (iterable): Item codes
+
+    Returns:
+        dict: item_code -> conversion factor (1.0 for items without one)
+    """
+    item_codes = [item_code for item_code in item_codes if item_code]
+    if not item_codes:
+        return {}
+
+    factors = kg_conversion_cache.get_many(item_codes, _load_kg_conversion_factors)
+    return {item_code: factor or 1.0 for item_code, factor in factors.items()}
+
+def clear_kg_conversion_cache(doc, method=None, *args, **kwargs):
+    """
+    `doc_events` hook for Item: drop the cached factor when the item (or its
+    UOM table) changes, is renamed or deleted.
+    """
+    item_codes = [doc.name]
+    if method == "after_rename" and args:
+        item_codes.append(args[0])
+
+    kg_conversion_cache.invalidate(item_codes)
+
+def _load_kg_conversion_factors(item_codes):
+    uom_detail = frappe.qb.DocType("UOM Conversion Detail")
+    rows = (
+        frappe.qb.from_(uom_detail)
+        .select(uom_detail.parent, uom_detail.conversion_factor)
+        .where(uom_detail.parenttype == "Item")
+        .where(uom_detail.parent.isin(item_codes))
+        .where(uom_detail.uom.isin(KG_UOMS))
+        .orderby(uom_detail.idx)
+        .run(as_dict=True)
+    )
+
+    factors = {}
+    for row in rows:
+        # First KG row of the UOM table wins
+        factors.setdefault(row.parent, float(row.conversion_factor or 1.0))
+
+    for item_code in item_codes:
+        if item_code not in factors:
+            lot_journal.warning(
+                "Sub Lot Creation - Missing UOM Conversion",
+                f"No KG conversion found for item {item_code}"
+            )
+
+    return factors
@@ -0,0 +1,88 @@
+"""
+Latest valuation rate of an item / warehouse / batch.
+
+The rate comes from the latest non-cancelled Stock Ledger Entry of the key,
+found through one of the indexes added by `spp.install`: (item_code,
+warehouse, batch_no, posting_date, posting_time, creation) for a batch, and
+the same without batch_no for the item / warehouse fallback. It is kept in a
+`SharedCache` until the next ledger entry for the key is submitted. Reposts
+rewrite rates without submitting new entries, so cached rates also expire
+after `spp_valuation_rate_cache_ttl` seconds (site config, default 3600).
+"""
+
+import frappe
+from frappe.utils import cint, flt
+
+from spp.cache import SharedCache
+
+DEFAULT_TTL = 60 * 60
+# index name -> columns; MariaDB index names are limited to 64 characters
+LEDGER_INDEXES = {
+    "spp_valuation_batch_index": ["item_code", "warehouse", "batch_no", "posting_date", "posting_time", "creation"],
+    "spp_valuation_item_index": ["item_code", "warehouse", "posting_date", "posting_time", "creation"],
+}
+
+
+def _get_ttl():
+    return cint(frappe.conf.get("spp_valuation_rate_cache_ttl")) or DEFAULT_TTL
+
+valuation_rate_cache = SharedCache("spp:valuation_rate", ttl=_get_ttl)
+
+
+def get_valuation_rate(item_code, warehouse, batch_no=None):
+    """
+    Get the latest valuation rate.
+
+    Args:
+        item_code (str): Item code
+        warehouse (str): Warehouse
+        batch_no (str): Batch number; falls back to the latest rate of the item
+            in the warehouse when the batch has no ledger entry of its own
+
+    Returns:
+        float: Valuation rate, or None if the item has no ledger entries there
+    """
+    if not item_code or not warehouse:
+        return None
+
+    if batch_no:
+        rate = valuation_rate_cache.get(_key(item_code, warehouse, batch_no), _load_valuation_rate)
+        if rate is not None:
+            return rate
+
+    return valuation_rate_cache.get(_key(item_code, warehouse), _load_valuation_rate)
+
+def clear_valuation_rate_cache(doc, method=None, *args, **kwargs):
+    """
+    `doc_events` hook for Stock Ledger Entry: a new posting changes the latest
+    rate of its item / warehouse, with and without its batch.
+    """
+    keys = [_key(doc.item_code, doc.warehouse)]
+    if doc.batch_no:
+        keys.append(_key(doc.item_code, doc.warehouse, doc.batch_no))
+
+    valuation_rate_cache.invalidate(keys)
+
+def _key(item_code, warehouse, batch_no=None):
+    return "\x1f".join((item_code, warehouse, batch_no or ""))
+
+def _load_valuation_rate(key):
+    item_code, warehouse, batch_no = key.split("\x1f")
+
+    sle = frappe.qb.DocType("Stock Ledger Entry")
+    query = (
+        frappe.qb.from_(sle)
+        .select(sle.valuation_rate)
+        .where(sle.item_code == item_code)
+        .where(sle.warehouse == warehouse)
+        .where(sle.is_cancelled == 0)
+        .orderby(sle.posting_date, order=frappe.qb.desc)
+        .orderby(sle.posting_time, order=frappe.qb.desc)
+        .orderby(sle.creation, order=frappe.qb.desc)
+        .limit(1)
+    )
+    if batch_no:
+        query = query.where(sle.batch_no == batch_no)
+
+    rows = query.run()
+    return flt(rows[0][0]) if rows else None
@@ -0,0 +1,110 @@
+"""
+Operation -> workstation resolution.
+
+The mapping almost never changes, so resolved workstations are kept in a
+`SharedCache` for `spp_workstation_cache_ttl` seconds (site config, default
+3600) and dropped whenever an Operation or Workstation changes, or when
+`clear_workstation_cache` is called explicitly. Failed lookups are logged and
+not cached, so the next call tries again.
+"""
+
+import frappe
+from frappe.utils import cint
+
+from spp.cache import UNCACHED, SharedCache
+
+DEFAULT_TTL = 3600
+
+
+def _get_ttl():
+    return cint(frappe.conf.get("spp_workstation_cache_ttl")) or DEFAULT_TTL
+
+workstation_cache = SharedCache("spp:operation_workstation", ttl=_get_ttl)
+
+
+def get_workstation(operation):
+    """
+    Resolve the workstation for an operation.
+
+    Args:
+        operation (str): The operation name
+
+    Returns:
+        str: Workstation name, or an empty string if none could be resolved
+
+    Raises:
+        Exception: Whatever the custom app raised resolving the operation
+    """
+    if not operation:
+        return ""
+
+    return get_workstations([operation], raise_exception=True)[str(operation)]
+
+def get_workstations(operations, raise_exception=False):
+    """
+    Resolve the workstations of many operations in a single pass; each
+    distinct operation not already cached is resolved once.
+
+    Args:
+        operations (iterable): Operation names
+        raise_exception (bool): Raise resolution errors instead of logging
+            them and resolving the operation to an empty string
+
+    Returns:
+        dict: operation -> workstation name
+    """
+    operations = [str(operation) for operation in operations if operation]
+    if not operations:
+        return {}
+
+    workstations = workstation_cache.get_many(
+        operations, lambda missing: _resolve_workstations(missing, raise_exception)
+    )
+    return {operation: workstation or "" for operation, workstation in workstations.items()}
+
+def clear_workstation_cache(operations=None):
+    """
+    Drop the cached workstation of `operations`, or of every operation.
+    """
+    workstation_cache.invalidate(operations)
+
+def on_workstation_mapping_change(doc, method=None, *args, **kwargs):
+    """
+    `doc_events` hook for Operation and Workstation. Either side of the
+    mapping can change which workstation an operation resolves to, so the
+    whole cache is dropped.
+    """
+    clear_workstation_cache()
+
+def _resolve_workstations(operations, raise_exception=False):
+    """
+    Resolve operations through the custom app, which only resolves one
+    operation per call; each distinct operation is resolved once per TTL.
+    """
+    try:
+        from shree_polymer_custom_app.shree_polymer_custom_app.doctype.lot_resource_tagging.lot_resource_tagging import check_return_workstation
+    except ImportError:
+        if raise_exception:
+            raise
+        frappe.log_error(title="Workstation Resolution Failed")
+        return {operation: UNCACHED for operation in operations}
+
+    resolved = {}
+    for operation in operations:
+        try:
+            workstation_result = check_return_workstation(operation)
+        except Exception:
+            if raise_exception:
+                raise
+            frappe.log_error(title=f"Workstation Resolution Failed - {operation}")
+            resolved[operation] = UNCACHED
+            continue
+
+        # Extract workstation from the result which is a dictionary
+        if isinstance(workstation_result, dict):
+            success = workstation_result.get("status") == "success"
+            resolved[operation] = str(workstation_result.get("message", "")) if success else UNCACHED
+        else:
+            resolved[operation] = str(workstation_result) if workstation_result is not None else ""
+
+    return resolved
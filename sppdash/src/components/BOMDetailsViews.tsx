@@ -53,7 +53,7 @@ export function FinalBatchBOMDetailsView({ bomId, onClose }: BOMViewProps) {
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState<Error | null>(null);
   
-  // Fetch BOM data directly using fetch API instead of hooks
+  // Fetch the materialized BOM explosion instead of the full BOM document
   useEffect(() => {
     let isMounted = true;
     
@@ -64,14 +64,8 @@ export function FinalBatchBOMDetailsView({ bomId, onClose }: BOMViewProps) {
       setError(null);
       
       try {
-        const fields = [
-          "name", "item", "item_name", "is_active", "is_default", "company", 
-          "quantity", "uom", "operating_cost", "raw_material_cost", "total_cost",
-          "items", "operations"
-        ];
-        
         const response = await fetch(
-          `/api/method/frappe.client.get?doctype=BOM&name=${bomId}&fields=${JSON.stringify(fields)}`
+          `/api/method/spp.api.get_multi_level_bom?bom_no=${encodeURIComponent(bomId)}`
         );
         
         if (!response.ok) {
@@ -81,8 +75,8 @@ export function FinalBatchBOMDetailsView({ bomId, onClose }: BOMViewProps) {
         const result = await response.json();
         
         if (isMounted) {
-          if (result.message) {
-            setBomData(result.message);
+          if (result.message?.bom_data) {
+            setBomData(result.message.bom_data);
           } else {
             throw new Error("No data returned from API");
           }
@@ -124,7 +118,7 @@ export function MasterBatchBOMDetailsView({ bomId, onClose }: BOMViewProps) {
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState<Error | null>(null);
   
-  // Fetch BOM data directly using fetch API instead of hooks
+  // Fetch the materialized BOM explosion instead of the full BOM document
   useEffect(() => {
     let isMounted = true;
     
@@ -135,14 +129,8 @@ export function MasterBatchBOMDetailsView({ bomId, onClose }: BOMViewProps) {
       setError(null);
       
       try {
-        const fields = [
-          "name", "item", "item_name", "is_active", "is_default", "company", 
-          "quantity", "uom", "operating_cost", "raw_material_cost", "total_cost",
-          "items", "operations"
-        ];
-        
         const response = await fetch(
-          `/api/method/frappe.client.get?doctype=BOM&name=${bomId}&fields=${JSON.stringify(fields)}`
+          `/api/method/spp.api.get_multi_level_bom?bom_no=${encodeURIComponent(bomId)}`
         );
         
         if (!response.ok) {
@@ -152,8 +140,8 @@ export function MasterBatchBOMDetailsView({ bomId, onClose }: BOMViewProps) {
         const result = await response.json();
         
         if (isMounted) {
-          if (result.message) {
-            setBomData(result.message);
+          if (result.message?.bom_data) {
+            setBomData(result.message.bom_data);
           } else {
             throw new Error("No data returned from API");
           }
@@ -195,7 +183,7 @@ export function BatchBOMDetailsView({ bomId, onClose }: BOMViewProps) {
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState<Error | null>(null);
   
-  // Fetch BOM data directly using fetch API instead of hooks
+  // Fetch the materialized BOM explosion instead of the full BOM document
   useEffect(() => {
     let isMounted = true;
     
@@ -206,14 +194,8 @@ export function BatchBOMDetailsView({ bomId, onClose }: BOMViewProps) {
       setError(null);
       
       try {
-        const fields = [
-          "name", "item", "item_name", "is_active", "is_default", "company", 
-          "quantity", "uom", "operating_cost", "raw_material_cost", "total_cost",
-          "items", "operations"
-        ];
-        
         const response = await fetch(
-          `/api/method/frappe.client.get?doctype=BOM&name=${bomId}&fields=${JSON.stringify(fields)}`
+          `/api/method/spp.api.get_multi_level_bom?bom_no=${encodeURIComponent(bomId)}`
         );
         
         if (!response.ok) {
@@ -223,8 +205,8 @@ export function BatchBOMDetailsView({ bomId, onClose }: BOMViewProps) {
         const result = await response.json();
         
         if (isMounted) {
-          if (result.message) {
-            setBomData(result.message);
+          if (result.message?.bom_data) {
+            setBomData(result.message.bom_data);
           } else {
             throw new Error("No data returned from API");
           }
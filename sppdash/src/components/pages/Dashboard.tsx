@@ -8,11 +8,26 @@ import {
   TrendingUp, TrendingDown, RefreshCw, Filter, Download, Calendar 
 } from "lucide-react";
 
+interface PeriodKpis {
+  name: string | null;
+  lots: number;
+  inspected_qty: number;
+  rejected_qty: number;
+  rejection_pct: number;
+  throughput: { operation: string; lots: number; qty: number; lots_per_hour: number }[];
+}
+
+type LiveKpis = Record<'today' | 'shift' | 'week', PeriodKpis | null>;
+
+// spp.api.get_kpis is served from Redis counters, so polling it is cheap
+const KPI_POLL_INTERVAL_MS = 15000;
+
 const Dashboard: React.FC = () => {
   // Dashboard state
   const [timeframe, setTimeframe] = useState<'day'|'week'|'month'>('week');
   const [isRefreshing, setIsRefreshing] = useState(false);
   const [selectedProcess, setSelectedProcess] = useState<string>("all");
+  const [liveKpis, setLiveKpis] = useState<LiveKpis | null>(null);
   
   // Simulated dashboard data
   // Production KPIs
@@ -114,19 +129,48 @@ const Dashboard: React.FC = () => {
   // Colors for charts
   const COLORS = ['#0088FE', '#00C49F', '#FFBB28', '#FF8042', '#8884d8'];
   
+  // Live KPIs for the periods the server tracks; month stays simulated
+  const livePeriod = timeframe === 'day' ? liveKpis?.today : timeframe === 'week' ? liveKpis?.week : null;
+  const kpis = livePeriod
+    ? {
+        ...kpiData[timeframe],
+        totalProduction: livePeriod.inspected_qty,
+        rejectionRate: livePeriod.rejection_pct
+      }
+    : kpiData[timeframe];
+
+  const fetchKpis = async () => {
+    try {
+      const response = await fetch('/api/method/spp.api.get_kpis');
+      if (!response.ok) {
+        throw new Error(`HTTP error! Status: ${response.status}`);
+      }
+
+      const result = await response.json();
+      if (result.message) {
+        setLiveKpis(result.message);
+      }
+    } catch (err) {
+      console.error("Error fetching KPIs:", err);
+    }
+  };
+
   // Refresh dashboard data
-  const refreshData = () => {
+  const refreshData = async () => {
     setIsRefreshing(true);
-    // Simulate API call delay
-    setTimeout(() => {
-      setIsRefreshing(false);
-    }, 1500);
+    await fetchKpis();
+    setIsRefreshing(false);
   };
 
   useEffect(() => {
     // Initial data fetch
     refreshData();
   }, [timeframe]);
+
+  useEffect(() => {
+    const interval = setInterval(fetchKpis, KPI_POLL_INTERVAL_MS);
+    return () => clearInterval(interval);
+  }, []);
   
   return (
     <div className="p-6 bg-slate-50 min-h-screen">
@@ -194,7 +238,7 @@ const Dashboard: React.FC = () => {
           <div className="flex justify-between items-start">
             <div>
               <p className="text-sm font-medium text-slate-500">Total Production</p>
-              <h3 className="text-2xl font-bold mt-1 text-slate-800">{kpiData[timeframe].totalProduction.toLocaleString()}</h3>
+              <h3 className="text-2xl font-bold mt-1 text-slate-800">{kpis.totalProduction.toLocaleString()}</h3>
               <p className="text-sm text-green-600 flex items-center mt-1">
                 <TrendingUp className="h-4 w-4 mr-1" />
                 +5.2% from previous {timeframe}
@@ -205,7 +249,7 @@ const Dashboard: React.FC = () => {
             </div>
           </div>
           <div className="mt-4 pt-4 border-t border-slate-100">
-            <p className="text-xs text-slate-500">Target: {(kpiData[timeframe].totalProduction * 1.1).toLocaleString()} units</p>
+            <p className="text-xs text-slate-500">Target: {(kpis.totalProduction * 1.1).toLocaleString()} units</p>
           </div>
         </div>
         
@@ -214,7 +258,7 @@ const Dashboard: React.FC = () => {
           <div className="flex justify-between items-start">
             <div>
               <p className="text-sm font-medium text-slate-500">Rejection Rate</p>
-              <h3 className="text-2xl font-bold mt-1 text-slate-800">{kpiData[timeframe].rejectionRate}%</h3>
+              <h3 className="text-2xl font-bold mt-1 text-slate-800">{kpis.rejectionRate}%</h3>
               <p className="text-sm text-green-600 flex items-center mt-1">
                 <TrendingDown className="h-4 w-4 mr-1" />
                 -0.3% from previous {timeframe}
@@ -225,7 +269,10 @@ const Dashboard: React.FC = () => {
             </div>
           </div>
           <div className="mt-4 pt-4 border-t border-slate-100">
-            <p className="text-xs text-slate-500">Target: Below 2.5%</p>
+            <p className="text-xs text-slate-500">
+              Target: Below 2.5%
+              {liveKpis?.shift && ` · Shift ${liveKpis.shift.name}: ${liveKpis.shift.lots} lots, ${liveKpis.shift.rejection_pct}%`}
+            </p>
           </div>
         </div>
         
@@ -681,9 +681,9 @@ const SubLotProcessing: React.FC = () => {
         setIsLoading(true);
 
         try {
-            // First API call - Get Stock Entry Detail
-            const stockEntryUrl = `/api/resource/Stock Entry Detail/?fields=["name","item_code","batch_no"]&filters=[["Stock Entry Detail","spp_batch_number","=","${encodeURIComponent(batchId)}"],["Stock Entry Detail","item_group","=","Products"],["Stock Entry Detail","is_finished_item","=",1]]&parent=Stock Entry`;
-            const stockEntryResponse = await fetch(stockEntryUrl, {
+            // Single server-side lookup: finished product row plus its largest stock balance
+            const scanUrl = `/api/method/spp.api.scan_batch?batch_id=${encodeURIComponent(batchId)}`;
+            const scanResponse = await fetch(scanUrl, {
                 method: 'GET',
                 headers: {
                     'Accept': 'application/json',
@@ -691,58 +691,23 @@ const SubLotProcessing: React.FC = () => {
                 },
             });
 
-            if (!stockEntryResponse.ok) {
-                throw new Error(`Stock Entry API request failed with status ${stockEntryResponse.status}`);
+            if (!scanResponse.ok) {
+                throw new Error(`Batch scan request failed with status ${scanResponse.status}`);
             }
 
-            const stockEntryResult = await stockEntryResponse.json();
-            if (stockEntryResult.data && stockEntryResult.data.length > 0) {
-                const stockEntry = stockEntryResult.data[0];
-                const itemCodeValue = stockEntry.item_code || "";
-                const batchNoValue = stockEntry.batch_no || "";
+            const scanResult = await scanResponse.json();
+            const scan = scanResult.message;
+            if (scan && scan.item_code) {
+                setItemCode(scan.item_code || "");
+                setBatchNo(scan.batch_no || "");
 
-                // Set these values immediately
-                setItemCode(itemCodeValue);
-                setBatchNo(batchNoValue);
+                if (scan.warehouse) {
+                    // Update warehouse and quantity from Item Batch Stock Balance
+                    setWarehouse(scan.warehouse);
+                    setQuantity(scan.qty?.toString() || "0");
 
-                // If we have both item code and batch number, fetch from Item Batch Stock Balance
-                if (itemCodeValue && batchNoValue) {
-                    try {
-                        // Second API call - Get Item Batch Stock Balance
-                        const batchStockUrl = `/api/resource/Item Batch Stock Balance/?fields=["warehouse","qty"]&filters=[["Item Batch Stock Balance","item_code","=","${encodeURIComponent(itemCodeValue)}"],["Item Batch Stock Balance","batch_no","=","${encodeURIComponent(batchNoValue)}"]]`;
-                        const batchStockResponse = await fetch(batchStockUrl, {
-                            method: 'GET',
-                            headers: {
-                                'Accept': 'application/json',
-                                'Content-Type': 'application/json',
-                            },
-                        });
-
-                        if (!batchStockResponse.ok) {
-                            throw new Error(`Batch Stock API request failed with status ${batchStockResponse.status}`);
-                        }
-
-                        const batchStockResult = await batchStockResponse.json();
-                        if (batchStockResult.data && batchStockResult.data.length > 0) {
-                            // Find the entry with the highest quantity
-                            const batchStock = batchStockResult.data.reduce((prev: { qty: number; }, current: { qty: number; }) =>
-                                (prev.qty > current.qty) ? prev : current
-                            );
-
-                            // Update warehouse and quantity from Item Batch Stock Balance
-                            setWarehouse(batchStock.warehouse || "");
-                            setQuantity(batchStock.qty?.toString() || "0");
-                            
-                            // Show confirmation dialog
-                            setShowBatchConfirmation(true);
-                        } else {
-                            setWarehouse("");
-                            setQuantity("0");
-                        }
-                    } catch (batchErr) {
-                        setWarehouse("");
-                        setQuantity("0");
-                    }
+                    // Show confirmation dialog
+                    setShowBatchConfirmation(true);
                 } else {
                     setWarehouse("");
                     setQuantity("0");
@@ -928,115 +893,98 @@ const handleScanEmployee = async () => {
             // Format the operations string from the BOM operations
             const operationsString = bomOperations.join(',');
 
-            // Calculate progress increment per operation
-            const progressIncrement = 100 / formData.operationDetails.length;
-
-            for (let i = 0; i < formData.operationDetails.length; i++) {
-                const operation = formData.operationDetails[i];
-
-                // Update status with current operation
-                setProcessingStatus(`Creating entry ${i+1} of ${formData.operationDetails.length}: ${operation.operation}`);
-
-                try {
-                    // Calculate rejected quantity based on rejection details
-                    const totalRejectionQty = formData.rejectionDetails
-                        .filter(r => parseFloat(r.quantity) > 0)
-                        .reduce((sum, item) => sum + (parseFloat(item.quantity) || 0), 0);
-
-                    // Calculate accepted quantity (inspection quantity minus rejection)
-                    const acceptedQty = Math.max(0, parseFloat(formData.inspectionInfo.inspectionQuantity || "0") - totalRejectionQty);
-
-                    const payload = {
-                        data: {
-                            // Required core fields
-                            scan_lot_no: formData.batchInfo.sppBatchId,
-                            scan_operator: operation.employeeCode,
-                            operation_type: operation.operation,
-                            operator_id: operation.employeeCode,
-                            operator_name: operation.employeeName || "", // Include employee name
-                            // BOM operations field
-                            operations: operationsString,
-                            // Pass all validation data fields
-                            batch_no: validationData.batch_no || formData.batchInfo.batchNo || formData.batchInfo.sppBatchId,
-                            bom_no: validationData.bom_no || "",
-                            product_ref: validationData.item_code || formData.batchInfo.itemCode,
-                            from_warehouse: validationData.from_warehouse || formData.batchInfo.warehouse || "",
-                            production_item: validationData.production_item || "",
-                            // Quantity information
-                            available_qty: validationData.qty_from_item_batch?.toString() ,
-                            qtynos:validationData.qty_from_item_batch?.toString() ,
-                            // Inspection and rejection information
-                            qty_after_rejection_nos: acceptedQty.toString(),
-                            // Include additional context fields
-                            job_card: validationData.name || "",
-                            spp_batch_number: validationData.spp_batch_number || formData.batchInfo.sppBatchId,
-                            moulding_lot_number: validationData.moulding_lot_number || null,
-                            // Default values for required fields
-                            posting_date: new Date().toISOString().split('T')[0],
-                        }
-                    };
-
-                    const response = await fetch("/api/method/spp.api.create_lot_resource_tagging", {
-                        method: "POST",
-                        headers: {
-                            "Content-Type": "application/json",
-                            "Accept": "application/json",
-                            "X-Frappe-CSRF-Token": csrfToken || "",
-                        },
-                        body: JSON.stringify(payload),
-                    });
-
-                    const result = await response.json();
-                    if (result.message && result.message.success) {
-                        creationResults.push({
-                            success: true,
-                            operation: operation.operation,
-                            employee: operation.employeeCode,
-                            name: result.message.name,
-                        });
-                    } else {
-                        let errorMessage = "Unknown error";
-
-                        // Try to extract the error message from the server response
-                        if (result.message && result.message.error) {
-                            errorMessage = result.message.error;
-                        } else if (result._server_messages) {
-                            try {
-                                // Server messages are often sent as a JSON string array
-                                const messages = JSON.parse(result._server_messages);
-                                if (messages && messages.length > 0) {
-                                    try {
-                                        const firstMessage = JSON.parse(messages[0]);
-                                        errorMessage = firstMessage.message || messages[0];
-                                    } catch {
-                                        errorMessage = messages[0].replace(/["\\{}$$]/g, '');
-                                    }
+            setProcessingStatus(`Creating ${formData.operationDetails.length} resource tagging entries`);
+
+            // Calculate rejected quantity based on rejection details
+            const totalRejectionQty = formData.rejectionDetails
+                .filter(r => parseFloat(r.quantity) > 0)
+                .reduce((sum, item) => sum + (parseFloat(item.quantity) || 0), 0);
+
+            // Calculate accepted quantity (inspection quantity minus rejection)
+            const acceptedQty = Math.max(0, parseFloat(formData.inspectionInfo.inspectionQuantity || "0") - totalRejectionQty);
+
+            // Fields shared by every operation are sent once; the server
+            // creates one entry per operator/operation row
+            const payload = {
+                data: {
+                    scan_lot_no: formData.batchInfo.sppBatchId,
+                    // BOM operations field
+                    operations: operationsString,
+                    // Pass all validation data fields
+                    batch_no: validationData.batch_no || formData.batchInfo.batchNo || formData.batchInfo.sppBatchId,
+                    bom_no: validationData.bom_no || "",
+                    product_ref: validationData.item_code || formData.batchInfo.itemCode,
+                    from_warehouse: validationData.from_warehouse || formData.batchInfo.warehouse || "",
+                    production_item: validationData.production_item || "",
+                    // Quantity information
+                    available_qty: validationData.qty_from_item_batch?.toString(),
+                    // Inspection and rejection information
+                    qty_after_rejection_nos: acceptedQty.toString(),
+                    // Include additional context fields
+                    job_card: validationData.name || "",
+                    spp_batch_number: validationData.spp_batch_number || formData.batchInfo.sppBatchId,
+                    moulding_lot_number: validationData.moulding_lot_number || null,
+                    posting_date: new Date().toISOString().split('T')[0],
+                    rows: formData.operationDetails.map((operation) => ({
+                        operation_type: operation.operation,
+                        operator_id: operation.employeeCode,
+                    })),
+                }
+            };
+
+            try {
+                const response = await fetch("/api/method/spp.api.create_lot_resource_taggings", {
+                    method: "POST",
+                    headers: {
+                        "Content-Type": "application/json",
+                        "Accept": "application/json",
+                        "X-Frappe-CSRF-Token": csrfToken || "",
+                    },
+                    body: JSON.stringify(payload),
+                });
+
+                const result = await response.json();
+                if (result.message && Array.isArray(result.message.results) && result.message.results.length > 0) {
+                    creationResults.push(...result.message.results);
+                } else {
+                    let errorMessage = result.message?.message || "Unknown error";
+
+                    // Try to extract the error message from the server response
+                    if (result._server_messages) {
+                        try {
+                            // Server messages are often sent as a JSON string array
+                            const messages = JSON.parse(result._server_messages);
+                            if (messages && messages.length > 0) {
+                                try {
+                                    const firstMessage = JSON.parse(messages[0]);
+                                    errorMessage = firstMessage.message || messages[0];
+                                } catch {
+                                    errorMessage = messages[0].replace(/["\\{}$$]/g, '');
                                 }
-                            } catch {
-                                errorMessage = result._server_messages;
                             }
+                        } catch {
+                            errorMessage = result._server_messages;
                         }
-
-                        creationResults.push({
-                            success: false,
-                            operation: operation.operation,
-                            employee: operation.employeeCode,
-                            error: errorMessage,
-                        });
                     }
-                } catch (error) {
-                    creationResults.push({
+
+                    creationResults.push(...formData.operationDetails.map((operation) => ({
                         success: false,
                         operation: operation.operation,
                         employee: operation.employeeCode,
-                        error: error instanceof Error ? error.message : "Unknown error",
-                    });
+                        error: errorMessage,
+                    })));
                 }
-
-                // Update progress after each operation
-                setSaveProgress(Math.min(100, (i + 1) * progressIncrement));
+            } catch (error) {
+                creationResults.push(...formData.operationDetails.map((operation) => ({
+                    success: false,
+                    operation: operation.operation,
+                    employee: operation.employeeCode,
+                    error: error instanceof Error ? error.message : "Unknown error",
+                })));
             }
 
+            setSaveProgress(100);
+
             const allSuccessful = creationResults.every((result) => result.success);
             if (allSuccessful) {
                 setProcessingStatus("All entries created successfully!");